@@ -0,0 +1,174 @@
+import os, sys, json, time, argparse, platform, statistics, tempfile
+from datetime import timedelta
+
+# directory containing the application's source code
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+import productivity_graphs as graph
+import automated_report as report
+import data_cache, rollup_store, report_cache
+import synthetic_data
+
+# amount of data generated for each benchmark size, in days
+SIZES = {'1_week': 7, '1_year': 365, '10_years': 3650}
+SUCCESS = "PDF report generated successfully!"
+
+# Function: calls a function several times and measures how long each call took, the first call
+#           is reported on its own since it is the one paying for cold caches
+# Inputs: func - function taking no arguments, repeat - int
+# Returns: dict with first, median and min (seconds) and runs keys
+# Side Effects: whatever func does
+def time_calls(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'first': times[0], 'median': statistics.median(times), 'min': min(times), 'runs': repeat}
+
+# Function: points the parsed data cache and the rollups at an empty directory so every
+#           benchmark starts cold and the user's own cache is left alone
+# Inputs: cache_dir - str
+# Returns: none
+# Side Effects: modifies data_cache/rollup_store module settings
+def isolate_caches(cache_dir):
+    data_cache.CACHE_DIR = cache_dir
+    rollup_store.ROLLUP_DIR = os.path.join(cache_dir, "rollups")
+    rollup_store.rollups.clear()
+    report_cache.REPORT_DIR = os.path.join(cache_dir, "reports")
+
+# Function: plots one of the report's figures and closes it again
+# Inputs: data - dataframe, name - str (key of graph.FIGURE_PLOTS), renderer - str
+# Returns: none
+# Side Effects: none
+def plot_and_close(data, name, renderer):
+    fig, _ = graph.plot_figure(data.copy(), name, renderer)
+    plt.close(fig)
+
+# Function: times every stage of the report for one generated dataset, the report covers the
+#           last week of the data
+# Inputs: paths - dict of format to (productivity path, goal path), days - int, repeat - int,
+#         renderer - str, out_dir - str (where reports are saved), cache_dir - str
+# Returns: dict of results
+# Side Effects: reads the data files, writes cache files and pdf reports
+def bench_dataset(paths, days, repeat, renderer, out_dir, cache_dir):
+    isolate_caches(cache_dir)
+    stages = {}
+
+    for fmt, (prod_path, goal_path) in paths.items():
+        stages[f'datetime_preprocessing:{fmt}'] = time_calls(
+            lambda: graph.datetime_preprocessing(prod_path, use_cache=False), repeat)
+        stages[f'datetime_preprocessing_cached:{fmt}'] = time_calls(
+            lambda: graph.datetime_preprocessing(prod_path), repeat)
+
+    prod_path, goal_path = paths['csv'] if 'csv' in paths else next(iter(paths.values()))
+    prod, goal = graph.load_data(prod_path, goal_path)
+    end_date = prod['Date'].max().to_pydatetime()
+    start_date = end_date - timedelta(days=min(days, 7) - 1)
+
+    stages['get_heatmap'] = time_calls(lambda: graph.get_heatmap(prod, start_date, end_date), repeat)
+    p_heatmap = graph.get_heatmap(prod, start_date, end_date)
+    g_heatmap = graph.get_heatmap(goal, start_date, end_date)
+    stages['delta_categorization'] = time_calls(lambda: graph.delta_categorization(g_heatmap, p_heatmap), repeat)
+    stages['calc_summary_df'] = time_calls(lambda: graph.calc_summary_df(prod, goal, start_date, end_date), repeat)
+
+    figure_data = {
+        'productivity_graph': p_heatmap,
+        'performance_graph': graph.delta_categorization(g_heatmap, p_heatmap),
+        'totals_graph': graph.calc_summary_df(prod, goal, start_date, end_date),
+    }
+    for name, data in figure_data.items():
+        stages[f'plot:{name}'] = time_calls(lambda: plot_and_close(data, name, renderer), repeat)
+
+    errors = []
+    for fmt, (prod_path, goal_path) in paths.items():
+        def generate(use_cache):
+            status = report.generate_report(start_date.date(), end_date.date(), '1', out_dir, prod_path,
+                                            goal_path, f"benchmark_{days}d_{fmt}_wX.pdf", renderer=renderer,
+                                            use_cache=use_cache)
+            if status != SUCCESS:
+                errors.append(f"generate_report ({fmt}): {status}")
+        stages[f'generate_report:{fmt}'] = time_calls(lambda: generate(False), repeat)
+        stages[f'generate_report_cached:{fmt}'] = time_calls(lambda: generate(True), repeat)
+
+    return {'days': days, 'rows': len(prod), 'goal_rows': len(goal),
+            'range': [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')],
+            'stages': stages, 'errors': sorted(set(errors))}
+
+# Function: compares the median stage times against a saved benchmark run
+# Inputs: results - dict, baseline - dict, tolerance - float (allowed slow down, 0.25 = 25%)
+# Returns: list of str describing the stages that got slower
+# Side Effects: none
+def compare_results(results, baseline, tolerance):
+    regressions = []
+    for size, size_results in results.items():
+        base_stages = baseline.get('results', {}).get(size, {}).get('stages', {})
+        for stage, timing in size_results['stages'].items():
+            if stage not in base_stages:
+                continue
+            before, after = base_stages[stage]['median'], timing['median']
+            if before > 0 and after > before * (1 + tolerance):
+                regressions.append(f"{size} {stage}: {before:.4f}s -> {after:.4f}s (+{after / before - 1:.0%})")
+    return regressions
+
+# Function: reads the command line arguments
+# Inputs: argv - list of str
+# Returns: argparse.Namespace
+# Side Effects: none
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Times every report stage on synthetic data of increasing size.")
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES), help="dataset sizes to run")
+    parser.add_argument('--formats', nargs='+', default=['csv', 'xlsx'], choices=['csv', 'xlsx'])
+    parser.add_argument('--repeat', type=int, default=3, help="number of timed calls per stage")
+    parser.add_argument('--sessions', type=float, default=6, help="average number of sessions per day")
+    parser.add_argument('--renderer', default=graph.DEFAULT_RENDERER, choices=list(graph.RENDERERS))
+    parser.add_argument('--data-dir', help="directory for the generated data, reports and caches (default: temporary)")
+    parser.add_argument('--json', help="path to save the results to as json")
+    parser.add_argument('--compare', help="json file of an earlier run to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slow down before --compare fails")
+    return parser.parse_args(argv)
+
+# Function: generates the datasets, runs the benchmarks, prints them and optionally saves/compares them
+# Inputs: argv - list of str
+# Returns: int - exit status (0 success, 1 a stage failed or got slower than the baseline)
+# Side Effects: creates data files, caches and reports, prints results, may write json file
+def main(argv):
+    args = parse_args(argv)
+    work_dir = args.data_dir or tempfile.mkdtemp(prefix="report_benchmark_")
+
+    results = {}
+    for size in args.sizes:
+        days = SIZES[size]
+        size_dir = os.path.join(work_dir, size)
+        paths = synthetic_data.write_dataset(size_dir, days, args.sessions, formats=args.formats)
+        results[size] = bench_dataset(paths, days, args.repeat, args.renderer, size_dir,
+                                      os.path.join(size_dir, "cache"))
+
+        print(f"{size} ({results[size]['rows']} sessions, report range {' to '.join(results[size]['range'])})")
+        for stage, timing in results[size]['stages'].items():
+            print(f"  {stage:<40} first {timing['first']:8.4f}s  median {timing['median']:8.4f}s")
+        for error in results[size]['errors']:
+            print(f"  ERROR {error}")
+
+    failures = [error for size_results in results.values() for error in size_results['errors']]
+    if args.compare:
+        with open(args.compare) as my_file:
+            failures += [f"slower: {line}" for line in compare_results(results, json.load(my_file), args.tolerance)]
+
+    if args.json:
+        meta = {'python': platform.python_version(), 'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'repeat': args.repeat, 'renderer': args.renderer,
+                'sessions_per_day': args.sessions}
+        with open(args.json, "w") as my_file:
+            json.dump({'meta': meta, 'results': results, 'failures': failures}, my_file, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,112 @@
+import os, sys, json, argparse, statistics, subprocess
+
+# directory containing the application's source code
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# modules that have to stay out of the gui's startup path, they are loaded on first use
+HEAVY_MODULES = ["pandas", "numpy", "seaborn", "matplotlib.pyplot", "fpdf"]
+
+# measures how long importing the gui module takes and which heavy modules it pulled in
+IMPORT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import gui
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+# measures how long it takes from interpreter start up to the first drawn window
+WINDOW_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import gui
+settings = {'starting_week': '2025-01-13', 'prod_path': '', 'goal_path': '', 'save_path': '',
+            'naming_pattern': 'report_wX.pdf'}
+try:
+    root = gui.build_gui(settings)
+except Exception as e:  # no display available
+    print(json.dumps({'seconds': None, 'error': str(e)}))
+    sys.exit(0)
+root.update()
+elapsed = time.perf_counter() - start
+root.destroy()
+print(json.dumps({'seconds': elapsed}))
+"""
+
+# measures the deferred cost of loading the report generation modules
+REPORT_SCRIPT = """
+import time, json
+import matplotlib
+matplotlib.use('Agg')
+start = time.perf_counter()
+import automated_report
+print(json.dumps({'seconds': time.perf_counter() - start}))
+"""
+
+# Function: runs a measurement script in a fresh interpreter so nothing is already imported
+# Inputs: script - str
+# Returns: dict - the json printed by the script
+# Side Effects: starts a python process
+def run_script(script):
+    output = subprocess.run([sys.executable, "-c", script], cwd=SRC_DIR, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+# Function: runs a measurement several times and returns the median time
+# Inputs: script - str, runs - int
+# Returns: tuple (median seconds or None, last result dict)
+# Side Effects: starts python processes
+def measure(script, runs):
+    results = [run_script(script) for _ in range(runs)]
+    times = [result['seconds'] for result in results if result['seconds'] is not None]
+    return (statistics.median(times) if times else None), results[-1]
+
+# Function: reads the command line arguments
+# Inputs: argv - list of str
+# Returns: argparse.Namespace
+# Side Effects: none
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Measures the gui's cold start time against a budget.")
+    parser.add_argument('--runs', type=int, default=5, help="number of runs per measurement")
+    parser.add_argument('--import-budget', type=float, default=0.75, help="max seconds for importing gui")
+    parser.add_argument('--window-budget', type=float, default=2.0, help="max seconds until the first window is drawn")
+    parser.add_argument('--json', help="path to save the results to as json")
+    return parser.parse_args(argv)
+
+# Function: measures the startup times, prints them and checks them against the budgets
+# Inputs: argv - list of str
+# Returns: int - exit status (0 within budget, 1 over budget or heavy modules imported at startup)
+# Side Effects: starts python processes, prints results, may write json file
+def main(argv):
+    args = parse_args(argv)
+    failures = []
+
+    import_time, import_result = measure(IMPORT_SCRIPT, args.runs)
+    window_time, window_result = measure(WINDOW_SCRIPT, args.runs)
+    report_time, _ = measure(REPORT_SCRIPT, args.runs)
+
+    print(f"import gui:          {import_time:.3f}s (budget {args.import_budget:.3f}s)")
+    if window_time is None:
+        print(f"time to first window: skipped ({window_result.get('error')})")
+    else:
+        print(f"time to first window: {window_time:.3f}s (budget {args.window_budget:.3f}s)")
+    print(f"import report stack:  {report_time:.3f}s (deferred until first use)")
+
+    if import_result['loaded']:
+        failures.append(f"gui imports heavy modules at startup: {', '.join(import_result['loaded'])}")
+    if import_time > args.import_budget:
+        failures.append("gui import time is over budget")
+    if window_time is not None and window_time > args.window_budget:
+        failures.append("time to first window is over budget")
+
+    if args.json:
+        with open(args.json, "w") as my_file:
+            json.dump({'import_gui': import_time, 'first_window': window_time, 'import_report': report_time,
+                       'heavy_modules_loaded': import_result['loaded'], 'failures': failures}, my_file, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,162 @@
+import os, sys, argparse
+from datetime import date, datetime, time, timedelta
+import numpy as np
+import pandas as pd
+
+# values picked from for the optional text columns of the generated sessions
+SUBJECTS = {
+    'School': ['Homework', 'Project', 'Quiz', 'Lecture'],
+    'Career': ['Applications', 'Interview Prep', 'Networking'],
+    'Productivity': ['Planning', 'Project'],
+    'Life': ['Errands', 'Exercise'],
+}
+ACTIVITIES = ['Read chapter', 'Write report', 'Practice problems', 'Review notes', 'Fix bugs', 'Plan week']
+
+# Function: converts a number of minutes since midnight into a time of day
+# Inputs: minutes - int
+# Returns: datetime.time
+# Side Effects: none
+def minutes_to_time(minutes):
+    minutes = int(minutes) % (24 * 60)
+    return time(minutes // 60, minutes % 60)
+
+# Function: generates the sessions of a single day, sessions normally follow each other with
+#           gaps in between but some are started before the previous one ends (overlaps) and
+#           some days end with a session running past midnight
+# Inputs: rng - numpy Generator, day - datetime.date, sessions - float (average sessions per day),
+#         midnight_rate - float, overlap_rate - float, round_to - int (minutes, 1 for no rounding)
+# Returns: list of dicts, one per session
+# Side Effects: none
+def generate_day(rng, day, sessions, midnight_rate, overlap_rate, round_to):
+    rows = []
+    cursor = rng.integers(6 * 60, 10 * 60)
+    prev_start = prev_end = None
+
+    for _ in range(rng.poisson(sessions)):
+        duration = max(round_to, int(rng.integers(10, 121)) // round_to * round_to)
+        if prev_end is not None and rng.random() < overlap_rate:
+            start = rng.integers(prev_start, prev_end)  # starts while the previous session is running
+        else:
+            start = cursor + rng.integers(0, 91)
+        start = start // round_to * round_to
+        if start + duration >= 24 * 60:
+            break
+
+        rows.append((start, duration))
+        prev_start, prev_end = start, start + duration
+        cursor = max(cursor, start + duration)
+
+    if rng.random() < midnight_rate:
+        start = rng.integers(22 * 60, 24 * 60 - 10) // round_to * round_to
+        past_midnight = int(rng.integers(10, 121)) // round_to * round_to or round_to
+        rows.append((start, 24 * 60 - start + past_midnight))
+
+    sessions = []
+    for start, duration in rows:
+        subject = rng.choice(list(SUBJECTS))
+        sessions.append({
+            'Date': day,
+            'Subject': subject,
+            'Type': rng.choice(SUBJECTS[subject]),
+            'Activity': rng.choice(ACTIVITIES),
+            'Start': minutes_to_time(start),
+            'End': minutes_to_time(start + duration),
+            'Time': float(duration),
+        })
+    return sessions
+
+# Function: generates a data file's worth of sessions in the schema described in the README
+#           (Date, Subject, Type, Activity, Start, End, Time)
+# Inputs: days - int, sessions - float (average sessions per day), start_date - datetime.date,
+#         seed - int, midnight_rate - float (share of days with a session crossing midnight),
+#         overlap_rate - float (share of sessions overlapping the previous one),
+#         round_to - int (session start/length are rounded to this many minutes)
+# Returns: dataframe
+# Side Effects: none
+def generate_sessions(days, sessions=6, start_date=date(2024, 1, 1), seed=0, midnight_rate=0.1,
+                      overlap_rate=0.05, round_to=1):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for offset in range(days):
+        rows.extend(generate_day(rng, start_date + timedelta(days=offset), sessions, midnight_rate,
+                                 overlap_rate, round_to))
+
+    return pd.DataFrame(rows, columns=['Date', 'Subject', 'Type', 'Activity', 'Start', 'End', 'Time'])
+
+# Function: generates matching productivity and goal sessions, goals are planned in 30 minute
+#           blocks and don't overlap. With more than one owner every person gets their own sessions
+#           and both files get an Owner column, as in a log shared by a team
+# Inputs: days - int, sessions - float, start_date - datetime.date, seed - int, owners - int
+# Returns: tuple of dataframes (productivity data, goal data)
+# Side Effects: none
+def generate_dataset(days, sessions=6, start_date=date(2024, 1, 1), seed=0, owners=1):
+    prods, goals = [], []
+    for owner in range(owners):
+        owner_seed = seed + 2 * owner
+        prods.append(generate_sessions(days, sessions, start_date, owner_seed))
+        goals.append(generate_sessions(days, max(1, sessions // 2), start_date, owner_seed + 1,
+                                       midnight_rate=0.02, overlap_rate=0, round_to=30))
+    if owners == 1:
+        return prods[0], goals[0]
+
+    # Function: merges everyone's sessions into one log ordered by date
+    def merge(frames):
+        frames = [df.assign(Owner=f"Person {owner + 1}") for owner, df in enumerate(frames)]
+        return pd.concat(frames).sort_values('Date', kind='stable', ignore_index=True)
+    return merge(prods), merge(goals)
+
+# Function: writes sessions to a csv or xlsx file in the formats the report expects, csv files
+#           use YYYY-MM-DD dates and HH:MM AM/PM times while xlsx files store date/time cells
+# Inputs: df - dataframe (see generate_sessions), path - str
+# Returns: none
+# Side Effects: creates/overwrites the file
+def write_data(df, path):
+    if path.endswith(".csv"):
+        df = df.assign(Date=[day.strftime('%Y-%m-%d') for day in df['Date']],
+                       Start=[value.strftime('%I:%M %p') for value in df['Start']],
+                       End=[value.strftime('%I:%M %p') for value in df['End']])
+        df.to_csv(path, index=False)
+    elif path.endswith(".xlsx"):
+        df = df.assign(Date=[datetime.combine(day, time()) for day in df['Date']])
+        df.to_excel(path, index=False)
+    else:
+        raise ValueError(f"Unsupported data file type: {path}")
+
+# Function: generates a productivity/goal dataset and writes it in every requested format
+# Inputs: out_dir - str, days - int, sessions - float, start_date - datetime.date, seed - int,
+#         formats - list of str ('csv' and/or 'xlsx'), owners - int
+# Returns: dict of format to tuple (productivity path, goal path)
+# Side Effects: creates the output directory and data files
+def write_dataset(out_dir, days, sessions=6, start_date=date(2024, 1, 1), seed=0, formats=('csv', 'xlsx'),
+                  owners=1):
+    os.makedirs(out_dir, exist_ok=True)
+    prod, goal = generate_dataset(days, sessions, start_date, seed, owners)
+
+    paths = {}
+    for fmt in formats:
+        paths[fmt] = (os.path.join(out_dir, f"productivity_{days}d.{fmt}"), os.path.join(out_dir, f"goal_{days}d.{fmt}"))
+        write_data(prod, paths[fmt][0])
+        write_data(goal, paths[fmt][1])
+    return paths
+
+# Function: reads the command line arguments
+# Inputs: argv - list of str
+# Returns: argparse.Namespace
+# Side Effects: none
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Generates synthetic productivity and goal data files.")
+    parser.add_argument('--days', type=int, default=365, help="number of days of data")
+    parser.add_argument('--sessions', type=float, default=6, help="average number of sessions per day")
+    parser.add_argument('--start', default='2024-01-01', help="first date of the data (YYYY-MM-DD)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed, the same seed gives the same data")
+    parser.add_argument('--formats', nargs='+', default=['csv', 'xlsx'], choices=['csv', 'xlsx'])
+    parser.add_argument('--owners', type=int, default=1, help="number of people sharing the files (adds an Owner column)")
+    parser.add_argument('--out', default='synthetic_data', help="directory to write the files to")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    start_date = datetime.strptime(args.start, '%Y-%m-%d').date()
+    for fmt, (prod_path, goal_path) in write_dataset(args.out, args.days, args.sessions, start_date,
+                                                      args.seed, args.formats, args.owners).items():
+        print(f"{fmt}: {prod_path}, {goal_path}")
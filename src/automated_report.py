@@ -1,61 +1,121 @@
-from fpdf import FPDF
+import os, tempfile
+from fpdf import FPDF, FPDF_VERSION
 import productivity_graphs as graph
 from datetime import datetime
-import matplotlib.pyplot as plt
-import io, tempfile, os
+import report_pipeline as pipeline
+import report_profiler as profiler
+import report_cache
+import report_export as export
+import font_registry
+
+# Class: raised from a progress callback to stop a report that is being generated
+class ReportCancelled(Exception):
+    pass
+
+# Function: reports the stage the report generation has reached to the progress callback
+# Inputs: progress - function taking a str or None, stage - str
+# Returns: none
+# Side Effects: calls the progress callback, which may raise ReportCancelled
+def notify(progress, stage):
+    if progress:
+        progress(stage)
+
+# the fpdf version whose private image table embed_image writes to, other versions get the figures
+# through pdf.image instead (see place_image)
+IMAGE_TABLE_FPDF_VERSION = '1.7.2'
+
+# Function: adds an already rendered figure straight to the pdf's image table in the encoding it
+#           was rendered with (compressed RGB, a color palette or jpeg), so the figure never goes
+#           through a png file or a temporary file on disk. The entry is laid out the way fpdf==1.7.2's
+#           image() and _putimage() read it: i (the /I<i> resource number), w and h (pixels), cs,
+#           bpc, f, data, pal (when cs is Indexed) and trns (only used when it is a list), _putimage
+#           adds n itself. Check them against fpdf's image parsers before bumping fpdf
+# Inputs: pdf - fpdf.fpdf.FPDF, image - dict with w, h, cs, f, pal and data keys (see graph.rasterize_figure)
+# Returns: str - name the image is registered under in the pdf
+# Side Effects: modifies the pdf object
+def embed_image(pdf, image):
+    name = f"figure{len(pdf.images) + 1}"
+    pdf.images[name] = {
+        'i': len(pdf.images) + 1,
+        'w': image['w'], 'h': image['h'],
+        'cs': image.get('cs', 'DeviceRGB'), 'bpc': 8, 'f': image.get('f', 'FlateDecode'),
+        'data': image['data'],
+        'pal': image.get('pal') or '', 'trns': '',
+    }
+    return name
+
+# Function: draws a rendered figure on the current page, with fpdf==1.7.2 it is embedded from memory
+#           (see embed_image), any other fpdf version parses it from a temporary png file with pdf.image
+#           so a changed image table can't produce a broken pdf
+# Inputs: pdf - fpdf.fpdf.FPDF, image - dict (see graph.rasterize_figure), x - float, y - float,
+#         w - float, h - float
+# Returns: none
+# Side Effects: modifies the pdf object, may write and remove a temporary png file
+def place_image(pdf, image, x, y, w, h):
+    if FPDF_VERSION == IMAGE_TABLE_FPDF_VERSION:
+        pdf.image(embed_image(pdf, image), x=x, y=y, w=w, h=h)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, f"figure{len(pdf.images) + 1}.png")
+        export.decode_image(image).save(path)
+        pdf.image(path, x=x, y=y, w=w, h=h)
 
 # Function: adds a graph to the pdf file with a title and description
 # Inputs: pdf - fpdf.fpdf.FPDF, graph_dict - dict, title_dict - dict, desc_dict - dict
-# Returns: r_dict - dict
+# Returns: none
 # Side Effects: modifies the pdf object
 def add_graph(pdf, graph_dict, title_dict, desc_dict):
-    fig = graph_dict['fig']
-    ax = graph_dict['ax']
-
-    img_stream = io.BytesIO()
-    fig.savefig(img_stream, format='png')
-    img_stream.seek(0)  # Reset the stream position to the beginning
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-        # Write the BytesIO content to the temp file
-        temp_file.write(img_stream.getvalue())
-        temp_file_path = temp_file.name
-    
     pdf.set_font("Tahoma", size=title_dict['size'], style="")
     pdf.set_xy(title_dict['x'], title_dict['y'])  # Set x to 10 and y to 20 (adjust as needed)
     pdf.cell(0, 0, title_dict['title'], ln=True, align="L")
     
-    pdf.image(temp_file_path, x=graph_dict['x'], y=graph_dict['y'],
-    w=graph_dict['w'], h=graph_dict['h'])
-    plt.close(fig)
+    place_image(pdf, graph_dict['image'], x=graph_dict['x'], y=graph_dict['y'],
+                w=graph_dict['w'], h=graph_dict['h'])
 
     pdf.set_font("Times", size=desc_dict['size'])
     pdf.set_xy(desc_dict['x'], desc_dict['y'])
     pdf.cell(0, 0, desc_dict['description'], ln=True, align="L")
 
-    r_dict = {'tpath': temp_file_path, 'height': 185}
-    return r_dict
-
-# Function: adds fonts to be used in the pdf file
+# Function: adds fonts to be used in the pdf file, the font files are found on whichever operating
+#           system the report runs on and their metrics are parsed once per machine (see font_registry)
 # Inputs: pdf - fpdf.fpdf.FPDF
 # Returns: none
-# Side Effects: modifies the pdf object
+# Side Effects: modifies the pdf object, may read the font files and the font cache
 def load_fonts(pdf):
-    pdf.add_font('Tahoma', '', 'C:/Windows/Fonts/tahoma.ttf', uni=True)  # Regular
-    pdf.add_font('Tahoma', 'B', 'C:/Windows/Fonts/tahomabd.ttf', uni=True)  # Bold (Optional)
-    pdf.add_font('Times', '', 'C:/Windows/Fonts/times.ttf', uni=True)  # Regular
-    pdf.add_font('Times', 'B', 'C:/Windows/Fonts/times.ttf', uni=True)  # Bold (Optional)
+    font_registry.add_fonts(pdf)
+
+# title of each kind of report, keyed by period (see report_dates.PERIODS)
+REPORT_TITLES = {
+    'week': "Weekly Productivity Report",
+    'month': "Monthly Productivity Report",
+    'quarter': "Quarterly Productivity Report",
+    'year': "Yearly Productivity Report",
+}
+
+# Function: gets the title and the date range heading of a report
+# Inputs: start_date - str, end_date - str, week_no - str (week number, or the period's label for
+#         longer reports, see report_dates.calc_period_label), owner - str or None, period - str
+# Returns: tuple of str (title, date range heading)
+# Side Effects: none
+def get_headings(start_date, end_date, week_no, owner=None, period='week'):
+    title = REPORT_TITLES[period] if owner is None else f"{REPORT_TITLES[period]}: {owner}"
+    label = "Week #" + week_no if period == 'week' else period.capitalize() + " " + week_no
+    return title, label + ": " + start_date + " --- " + end_date
 
 # Function: adds the title of the document and details the date range the calcs are based on
-# Inputs: pdf - fpdf.fpdf.FPDF, start_date - str, end_date - str, week_no - str
+# Inputs: pdf - fpdf.fpdf.FPDF, start_date - str, end_date - str, week_no - str,
+#         owner - str or None (person the report is for when the data is shared by a team),
+#         period - str (one of report_dates.PERIODS)
 # Returns: none
 # Side Effects: modifies pdf object
-def add_title(pdf, start_date, end_date, week_no):
+def add_title(pdf, start_date, end_date, week_no, owner=None, period='week'):
+    title, week_str = get_headings(start_date, end_date, week_no, owner, period)
     pdf.set_font("Tahoma", size=14, style="B")
     pdf.set_xy(0, 10)  # Set x to 10 and y to 20 (adjust as needed)
-    pdf.cell(0, 0, "Weekly Productivity Report", ln=True, align="C")
+    pdf.cell(0, 0, title, ln=True, align="C")
 
     pdf.set_font("Times", size=12)
-    week_str = "Week #" + week_no + ": " + start_date + " --- " + end_date
     pdf.set_xy(0, 18)  # Set x to 10 and y to 20 (adjust as needed)
     pdf.cell(0, 0, week_str, ln=True, align="C")
 
@@ -64,87 +124,304 @@ def add_title(pdf, start_date, end_date, week_no):
     # time_12_hour = time_obj.strftime("%I:%M %p")
     pdf.cell(0, 0, f"Generated On: {datetime.now().strftime('%A, %B %d, %Y at %I:%M %p')}", ln=True, align="C")
 
-# Function: removes temp files created to save graph images
-# Inputs: lst - list of str containing paths of files to remove
+# titles and descriptions of the three figures of each kind of report followed by the breakdown
+# page's two figures and activity table, the descriptions of the second and third figures continue
+# on a second line
+CAPTIONS = {
+    'week': [
+        ('Productive Time Heatmap',
+         "Figure #1: Total time spent working by each hour of the day for the week.", None),
+        ('Productivitiy/Goal Differential Heatmap',
+         "Figure #2: Summed productive time – goal productive time by the hour displaying how close my work",
+         "performance was to the planned schedule."),
+        ('Performance Totals Bar Chart',
+         "Figure #3: Alternative view to performance heatmap where the total goal and productive times are",
+         "visualized alongside the difference between the two for each day of the week."),
+        ('Time by Subject',
+         "Figure #4: Hours worked on each subject every day of the week, smaller subjects are summed up as Other.",
+         None),
+        ('Time by Type and Hour of the Day',
+         "Figure #5: Minutes worked on each type of work within every hour of the day over the week.", None),
+        ('Top Activities', None, None),
+    ],
+    'period': [
+        ('Average Work Time by Weekday and Hour',
+         "Figure #1: Average time spent working within each hour of the day for every day of the week.", None),
+        ('Daily Work Time Calendar',
+         "Figure #2: Total hours worked on every day of the period, laid out by week so that busy and quiet",
+         "stretches stand out."),
+        ('Performance Totals Bar Chart',
+         "Figure #3: Total productive and goal hours for each week/month of the period, along with the",
+         "difference between the two."),
+        ('Time by Subject',
+         "Figure #4: Hours worked on each subject every week/month, smaller subjects are summed up as Other.",
+         None),
+        ('Time by Type and Hour of the Day',
+         "Figure #5: Minutes worked on each type of work within every hour of the day over the period.", None),
+        ('Top Activities', None, None),
+    ],
+}
+
+# width (mm) each of the three figures and the two breakdown figures is placed at on the page,
+# figures are downsampled to it by the output profiles that ask for it (see graph.OUTPUT_PROFILES)
+FIGURE_WIDTHS = [190, 190, 180, 180, 180]
+# heading, width (mm) and alignment of the activity table's columns, together as wide as the
+# breakdown figures
+ACTIVITY_COLUMNS = [('Activity', 75, "L"), ('Subject', 35, "L"), ('Type', 35, "L"), ('Hours', 17, "R"),
+                    ('Share (%)', 18, "R")]
+
+# Function: shortens a text with ... until it fits within a table cell
+# Inputs: pdf - fpdf.fpdf.FPDF (with the cell's font set), text - str, width - float (mm)
+# Returns: str
+# Side Effects: none
+def fit_text(pdf, text, width):
+    if pdf.get_string_width(text) <= width:
+        return text
+    while text and pdf.get_string_width(text + "...") > width:
+        text = text[:-1]
+    return text + "..."
+
+# Function: adds the table of the activities with the most time to the pdf
+# Inputs: pdf - fpdf.fpdf.FPDF, table - dataframe (see graph.activity_table), x - float, y - float (mm)
 # Returns: none
-# Side Effects: deletes temporary files
-def remove_temp_files(lst):
-    for path in lst:
-        os.remove(path)
+# Side Effects: modifies the pdf object
+def add_activity_table(pdf, table, x, y):
+    pdf.set_font("Tahoma", size=10, style="B")
+    pdf.set_xy(x, y)
+    for heading, width, align in ACTIVITY_COLUMNS:
+        pdf.cell(width, 6, heading, border='B', align=align)
+
+    pdf.set_font("Times", size=10)
+    if table.empty:
+        pdf.set_xy(x, y + 6)
+        pdf.cell(0, 6, "No sessions within the date range", align="L")
+    for i, row in enumerate(table.itertuples(index=False)):
+        pdf.set_xy(x, y + 6 * (i + 1))
+        for (_, width, align), value in zip(ACTIVITY_COLUMNS, row):
+            pdf.cell(width, 6, fit_text(pdf, str(value), width - 1), align=align)
+
+# Function: adds the Subject/Type breakdown page with its two figures and the activity table
+# Inputs: pdf - fpdf.fpdf.FPDF, subject_image - dict, type_image - dict (see graph.rasterize_figure),
+#         activities - dataframe (see graph.activity_table), captions - list (see CAPTIONS)
+# Returns: none
+# Side Effects: modifies the pdf object
+def layout_breakdown(pdf, subject_image, type_image, activities, captions):
+    pdf.add_page()
+    title_dict = {'title': captions[3][0], 'x': 16, 'y': 16, 'size': 12}
+    graph_dict = {'x': 20, 'y': 20, 'w': FIGURE_WIDTHS[3], 'h': 81, 'image': subject_image}
+    desc_dict = {'description': captions[3][1], 'x': 16, 'y': 104, 'size': 12}
+    add_graph(pdf, graph_dict, title_dict, desc_dict)
+
+    title_dict = {'title': captions[4][0], 'x': 16, 'y': 113, 'size': 12}
+    graph_dict = {'x': 20, 'y': 117, 'w': FIGURE_WIDTHS[4], 'h': 72, 'image': type_image}
+    desc_dict = {'description': captions[4][1], 'x': 16, 'y': 192, 'size': 12}
+    add_graph(pdf, graph_dict, title_dict, desc_dict)
+
+    pdf.set_font("Tahoma", size=12, style="")
+    pdf.set_xy(16, 201)
+    pdf.cell(0, 0, captions[5][0], ln=True, align="L")
+    add_activity_table(pdf, activities, 20, 205)
+
+# Function: lays out the rendered figures with their titles and descriptions, followed by the
+#           breakdown page, and saves the pdf file
+# Inputs: prod_image - dict, perf_image - dict, totals_image - dict, subject_image - dict,
+#         type_image - dict (see graph.rasterize_figure), activities - dataframe (see graph.activity_table),
+#         pdf - fpdf.fpdf.FPDF, week_no - str, save_loc - str, naming_pattern - str,
+#         progress - function taking a str or None, captions - list of (title, description, second
+#         description line) tuples, one per figure and table (see CAPTIONS)
+# Returns: str - path of the saved pdf file
+# Side Effects: modifies the pdf object, creates pdf file and saves to save location
+def layout_report(prod_image, perf_image, totals_image, subject_image, type_image, activities, pdf, week_no,
+                  save_loc, naming_pattern, progress, captions=CAPTIONS['week']):
+    height = 125
+
+    notify(progress, "Adding graph 1/3 to PDF...")
+    title_dict = {'title': captions[0][0], 'x':16, 'y':35, 'size':12}
+    graph_dict = {'x': 20, 'y': 38, 'w':FIGURE_WIDTHS[0], 'h':height,
+                  'image': prod_image
+    }
+
+    ypos = 38 + height
+    desc_dict = {'description': captions[0][1], 'x': 16, 'y':ypos, 'size':12}
+    add_graph(pdf, graph_dict, title_dict, desc_dict)
+
+    notify(progress, "Adding graph 2/3 to PDF...")
+    ypos += 8
+    title_dict = {'title': captions[1][0], 'x':16, 'y':ypos, 'size':12}
+    ypos += height + 3
+    graph_dict = {'x': 20, 'y': 175, 'w':FIGURE_WIDTHS[1], 'h':height-15,
+                  'image': perf_image
+    }
+    ypos += height + 8
+    desc_dict = {'description': captions[1][1], 'x': 16, 'y':375, 'size':12}
+    add_graph(pdf, graph_dict, title_dict, desc_dict)
+
+    pdf.set_xy(16, 16)
+    pdf.cell(0, 0, captions[1][2], ln=True, align="L")
+
+
+    notify(progress, "Adding graph 3/3 to PDF...")
+    title_dict = {'title': captions[2][0], 'x':16, 'y':24, 'size':12}
+    graph_dict = {'x': 20, 'y': 28, 'w':FIGURE_WIDTHS[2], 'h':height,
+                  'image': totals_image
+    }
+    desc_dict = {'description': captions[2][1], 'x': 16, 'y':155, 'size':12}
+    add_graph(pdf, graph_dict, title_dict, desc_dict)
+
+    pdf.set_xy(16, 161)
+    pdf.cell(0, 0, captions[2][2], ln=True, align="L")
+
+    notify(progress, "Adding breakdown page to PDF...")
+    layout_breakdown(pdf, subject_image, type_image, activities, captions)
+
+    notify(progress, "Saving PDF...")
+    file_name = naming_pattern.replace('X', week_no)
+    path = save_loc + "/" + file_name
+    with profiler.span('output_pdf'):
+        pdf.output(path)
+    return path
+
+# Function: formats the dates of a report's range the way its headings show them
+# Inputs: start_date - datetime, end_date - datetime
+# Returns: tuple of str
+# Side Effects: none
+def format_range(start_date, end_date):
+    return start_date.strftime("%A, %B %d, %Y"), end_date.strftime("%A, %B %d, %Y")
+
+# Function: creates the pdf with its fonts and the title page header, the week and date range
+#           are also set as the document's title (which report_cache keys finished reports by)
+# Inputs: start_date - datetime, end_date - datetime, week_no - str, owner - str or None, period - str
+# Returns: fpdf.fpdf.FPDF
+# Side Effects: reads the font files
+def setup_pdf(start_date, end_date, week_no, owner=None, period='week'):
+    pdf = FPDF()
+    pdf.add_page()
+    load_fonts(pdf)
+
+    sd, ed = format_range(start_date, end_date)
+    pdf.set_title(" ".join(get_headings(sd, ed, week_no, owner, period)))
+    add_title(pdf, sd, ed, week_no, owner, period)
+    return pdf
+
+# Function: runs the report pipeline, which loads/prepares the data, renders the figures and lays
+#           them out in a new pdf file. The same results can be exported to other formats in the same
+#           run, every format is written concurrently from the data and figures computed once
+# Inputs: stages - dict of extra pipeline stages (e.g. loading the data files), initial - dict of
+#         already known pipeline results, start_date - datetime.date, end_date - datetime.date,
+#         week_no - str, save_loc - str, naming_pattern - str, progress - function taking a str or None,
+#         parallel - bool, timings - dict or None (filled with the timing of every stage),
+#         renderer - str (heatmap renderer, one of graph.RENDERERS), trace_path - str or None (saves a
+#         profiling trace of the stages and the steps within them, see report_profiler.write_trace),
+#         trace_format - str ('json' or 'chrome'), use_cache - bool (reuse figures and reports already
+#         generated from the same data, see report_cache. A reused report keeps its "Generated On" time),
+#         owner - str or None (person named in the title), period - str (one of report_dates.PERIODS,
+#         month/quarter/year reports show longer range figures and week_no is the period's label),
+#         profile - str (key of graph.OUTPUT_PROFILES, the dpi and encoding of the figures), stats - dict
+#         or None (filled with the pdf's size in bytes when one is made, the seconds spent encoding its
+#         figures, the paths written for every format under outputs and, when the report is made from
+#         the loaded data files, their validation reports under prod_issues and goal_issues, see data_validator),
+#         formats - list of str (see report_export.EXPORT_FORMATS, the files of the other formats are
+#         named after the pdf with their own extension)
+# Returns: str - path of the saved pdf file, or of the first file written when no pdf is asked for
+# Side Effects: creates pdf file (and the files of the other formats) and saves to save location, may
+#               start worker processes, may write the trace file, reads/writes the report cache
+def render_report(stages, initial, start_date, end_date, week_no, save_loc, naming_pattern, progress,
+                  parallel, timings, renderer=graph.DEFAULT_RENDERER, trace_path=None, trace_format='json',
+                  use_cache=True, owner=None, period='week', profile=graph.DEFAULT_PROFILE, stats=None,
+                  formats=('pdf',)):
+    unknown = [fmt for fmt in formats if fmt not in export.EXPORT_FORMATS]
+    if unknown or not formats:
+        raise ValueError(f"Unknown report formats: {', '.join(unknown)}, expected {', '.join(export.EXPORT_FORMATS)}")
+    start_date = datetime.combine(start_date, datetime.min.time())
+    end_date = datetime.combine(end_date, datetime.min.time())
+
+    figures = list(graph.FIGURE_PLOTS) if period == 'week' else list(graph.PERIOD_PLOTS)
+    figures += list(graph.BREAKDOWN_PLOTS)
+    outputs = {name: dict(graph.OUTPUT_PROFILES[profile], width=width) for name, width in zip(figures, FIGURE_WIDTHS)}
+    if period == 'week':
+        captions = CAPTIONS['week']
+        stages = dict(stages, **pipeline.graph_stages(start_date, end_date, renderer, use_cache, outputs))
+    else:
+        captions = CAPTIONS['period']
+        stages = dict(stages, **pipeline.period_stages(start_date, end_date, period, renderer, use_cache, outputs))
+    stages.update(pipeline.breakdown_stages(start_date, end_date, period, renderer, use_cache, outputs))
+    if 'prod' in stages or 'prod' in initial:
+        stages.update(pipeline.validation_stages(start_date, end_date))
+
+    figure_data = {name: stages[name]['deps'][0] for name in figures}
+    if not {'pdf', 'html', 'png'} & set(formats):
+        for name in figures:
+            del stages[name]  # only the svg drawings are needed, the data is still computed for them
+    if 'pdf' in formats:
+        stages['pdf'] = {'func': setup_pdf, 'deps': [], 'args': (start_date, end_date, week_no, owner, period)}
+        stages['write_pdf'] = {'func': layout_report, 'deps': figures + ['activity_table', 'pdf'],
+                               'args': (week_no, save_loc, naming_pattern, progress, captions)}
+        if use_cache:
+            stages['write_pdf'].update(lookup=report_cache.load_report, store=report_cache.store_report)
+    headings = get_headings(*format_range(start_date, end_date), week_no, owner, period)
+    stages.update(pipeline.export_stages(formats, figure_data, list(figure_data.values()) + ['activity_table'],
+                                         headings, captions, export.get_export_base(week_no, save_loc, naming_pattern),
+                                         renderer))
+    results, stage_timings = pipeline.run_stages(stages, initial, parallel, progress,
+                                                 profile=trace_path is not None)
+
+    if trace_path is not None:
+        profiler.write_trace(stage_timings, trace_path, trace_format)
+    if timings is not None:
+        timings.update(stage_timings)
+    outputs = {fmt: [results['write_pdf']] if fmt == 'pdf' else results['export_' + fmt] for fmt in formats}
+    if stats is not None:
+        stats.update(profile=profile, outputs=outputs,
+                     encode_seconds=sum(results[name].get('encode_seconds', 0.0) for name in figures if name in results))
+        if 'pdf' in formats:
+            stats['bytes'] = os.path.getsize(results['write_pdf'])
+        stats.update({name: results[name] for name in ('prod_issues', 'goal_issues') if name in results})
+    return results['write_pdf'] if 'pdf' in formats else outputs[formats[0]][0]
+
+# Function: creates and saves the file after generating the graphs from already loaded data
+# Inputs: prod_df - dataframe, goal_df - dataframe, start_date - datetime.date, end_date - datetime.date,
+#         week_no - str, save_loc - str, naming_pattern - str, progress - function taking a str or None,
+#         parallel - bool (False runs every stage in this process), timings - dict or None,
+#         renderer - str (one of graph.RENDERERS), trace_path - str or None, trace_format - str,
+#         use_cache - bool, period - str, profile - str, stats - dict or None, formats - list of str
+#         (see render_report)
+# Returns: str - path of the saved pdf file
+# Side Effects: creates pdf file (and the other formats' files) and saves to save location, may write the trace file
+def write_report(prod_df, goal_df, start_date, end_date, week_no, save_loc, naming_pattern, progress=None,
+                 parallel=True, timings=None, renderer=graph.DEFAULT_RENDERER, trace_path=None, trace_format='json',
+                 use_cache=True, period='week', profile=graph.DEFAULT_PROFILE, stats=None, formats=('pdf',)):
+    return render_report({}, {'prod': prod_df, 'goal': goal_df}, start_date, end_date, week_no, save_loc,
+                         naming_pattern, progress, parallel, timings, renderer, trace_path, trace_format, use_cache,
+                         period=period, profile=profile, stats=stats, formats=formats)
+
+# Function: gets the status message of a report saved in the given formats, e.g. "PDF and HTML
+#           report generated successfully!"
+# Inputs: formats - list of str (see report_export.EXPORT_FORMATS)
+# Returns: str
+# Side Effects: none
+def get_success_message(formats):
+    names = [fmt.upper() for fmt in dict.fromkeys(formats)]
+    listed = names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
+    return f"{listed} report generated successfully!"
 
 # Function: creates and saves the file after generating the graphs created from the data files
 # Inputs: start_date - datetime.date, end_date - datetime.date, week_no - str, save_loc - str, prod_path - str
-#         goal_path - str, naming_pattern - str
+#         goal_path - str, naming_pattern - str, progress - function taking a str or None,
+#         timings - dict or None (filled with the timing of every stage), renderer - str (one of graph.RENDERERS),
+#         trace_path - str or None, trace_format - str, use_cache - bool, period - str, profile - str,
+#         stats - dict or None, formats - list of str (see render_report)
 # Returns: str - status of report generation (success or the error produced)
-# Side Effects: creates pdf file and saves to save location
-def generate_report(start_date, end_date, week_no, save_loc, prod_path, goal_path, naming_pattern):
+# Side Effects: creates pdf file (and the other formats' files) and saves to save location, may write the trace file,
+#               lets ReportCancelled raised by the progress callback through
+def generate_report(start_date, end_date, week_no, save_loc, prod_path, goal_path, naming_pattern, progress=None,
+                    timings=None, renderer=graph.DEFAULT_RENDERER, trace_path=None, trace_format='json',
+                    use_cache=True, period='week', profile=graph.DEFAULT_PROFILE, stats=None, formats=('pdf',)):
     try:
-        # Create PDF instance
-        pdf = FPDF()
-        pdf.add_page()
-        load_fonts(pdf)
-
-        start_date = datetime.combine(start_date, datetime.min.time())
-        end_date = datetime.combine(end_date, datetime.min.time())
-
-        sd = start_date.strftime("%A, %B %d, %Y")
-        ed = end_date.strftime("%A, %B %d, %Y")
-        add_title(pdf, sd, ed, week_no)
-
-        graphs = graph.prepare_graphs(prod_path, goal_path, start_date, end_date)
-        temp_paths = []
-        height = 125
-
-        title_dict = {'title': 'Productive Time Heatmap', 'x':16, 'y':35, 'size':12}
-        graph_dict = {'x': 20, 'y': 38, 'w':190, 'h':height,
-                      'fig': graphs['productivity_graph'][0],
-                      'ax':graphs['productivity_graph'][1]
-        }
-
-        ypos = 38 + height
-        description = "Figure #1: Total time spent working by each hour of the day for the week."
-        desc_dict = {'description': description, 'x': 16, 'y':ypos, 'size':12}
-        r_dict = add_graph(pdf, graph_dict, title_dict, desc_dict)
-        temp_paths.append(r_dict['tpath'])
-
-        ypos += 8
-        title_dict = {'title': 'Productivitiy/Goal Differential Heatmap', 'x':16, 'y':ypos, 'size':12}
-        ypos += height + 3
-        graph_dict = {'x': 20, 'y': 175, 'w':190, 'h':height-15,
-                      'fig': graphs['performance_graph'][0],
-                      'ax':graphs['performance_graph'][1]
-        }
-        description = "Figure #2: Summed productive time – goal productive time by the hour"
-        description += " displaying how close my work"
-        ypos += height + 8
-        desc_dict = {'description': description, 'x': 16, 'y':375, 'size':12}
-        r_dict = add_graph(pdf, graph_dict, title_dict, desc_dict)
-        temp_paths.append(r_dict['tpath'])
-
-        desc2 = "performance was to the planned schedule."
-        pdf.set_xy(16, 16)
-        pdf.cell(0, 0, desc2, ln=True, align="L")
-
-
-        title_dict = {'title': 'Performance Totals Bar Chart', 'x':16, 'y':24, 'size':12}
-        graph_dict = {'x': 20, 'y': 28, 'w':180, 'h':height,
-                      'fig': graphs['totals_graph'][0],
-                      'ax':graphs['totals_graph'][1]
-        }
-        description = "Figure #3: Alternative view to performance heatmap where the total goal and productive times are"
-        desc_dict = {'description': description, 'x': 16, 'y':155, 'size':12}
-        r_dict = add_graph(pdf, graph_dict, title_dict, desc_dict)
-        temp_paths.append(r_dict['tpath'])
-
-        desc2 = "visualized alongside the difference between the two for each day of the week."
-        pdf.set_xy(16, 161)
-        pdf.cell(0, 0, desc2, ln=True, align="L")
-        
-        file_name = naming_pattern.replace('X', week_no)
-        path = save_loc + "/" + file_name
-        pdf.output(path)
-
-        remove_temp_files(temp_paths)
-        return "PDF report generated successfully!"
+        stages = pipeline.load_stages(prod_path, goal_path, start_date, end_date)
+        render_report(stages, {}, start_date, end_date, week_no, save_loc, naming_pattern, progress, True,
+                      timings, renderer, trace_path, trace_format, use_cache, period=period, profile=profile,
+                      stats=stats, formats=formats)
+        return get_success_message(formats)
 
+    except ReportCancelled: raise
     except Exception as e: return(str(e))
@@ -0,0 +1,98 @@
+import matplotlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import productivity_graphs as graph
+import automated_report as report
+import report_dates
+
+# preprocessed data shared by every report rendered within a worker process, it is set
+# once per process by init_worker so the dataframes aren't pickled again for every week
+worker_data = {}
+
+# Function: splits a date range into week long ranges that line up with the starting_week
+#           date, the first/last ranges are cut short if the date range starts/ends mid week
+# Inputs: starting_week - str, start_date - datetime.date, end_date - datetime.date
+# Returns: list of dicts with week_no (str), start (datetime.date) and end (datetime.date) keys
+# Side Effects: none
+def split_weeks(starting_week, start_date, end_date):
+    first_day = datetime.strptime(starting_week, '%Y-%m-%d').date()
+
+    weeks = []
+    current = start_date
+    while current <= end_date:
+        days_left = 6 - (current - first_day).days % 7
+        week_end = min(current + timedelta(days=days_left), end_date)
+        weeks.append({
+            'week_no': report_dates.calc_week_num(starting_week, current),
+            'start': current,
+            'end': week_end
+        })
+        current = week_end + timedelta(days=1)
+
+    return weeks
+
+# Function: sets up a worker process with a headless matplotlib backend and the shared data
+# Inputs: prod_df - dataframe, goal_df - dataframe
+# Returns: none
+# Side Effects: switches the matplotlib backend, modifies worker_data
+def init_worker(prod_df, goal_df):
+    matplotlib.use('Agg', force=True)
+    worker_data['prod'] = prod_df
+    worker_data['goal'] = goal_df
+
+# Function: renders the report for a single week within a worker process
+# Inputs: week - dict, save_loc - str, naming_pattern - str, renderer - str (one of graph.RENDERERS),
+#         use_cache - bool (reuse an identical week's figures/pdf, see report_cache), profile - str (key
+#         of graph.OUTPUT_PROFILES)
+# Returns: dict - the week dict with the saved path and the error produced (if any)
+# Side Effects: creates pdf file and saves to save location
+def render_week(week, save_loc, naming_pattern, renderer=graph.DEFAULT_RENDERER, use_cache=True,
+                profile=graph.DEFAULT_PROFILE):
+    result = dict(week, path=None, error=None)
+    try:
+        result['path'] = report.write_report(worker_data['prod'], worker_data['goal'], week['start'],
+                                             week['end'], week['week_no'], save_loc, naming_pattern, parallel=False,
+                                             renderer=renderer, use_cache=use_cache, profile=profile)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+# Function: loads the data files once and generates one report per week of the date range,
+#           rendering the weeks in parallel across a pool of processes
+# Inputs: start_date - datetime.date, end_date - datetime.date, starting_week - str, save_loc - str,
+#         prod_path - str, goal_path - str, naming_pattern - str, max_workers - int or None,
+#         progress - function called with (finished count, total count, result dict) or None,
+#         renderer - str (one of graph.RENDERERS), use_cache - bool, profile - str (key of graph.OUTPUT_PROFILES)
+# Returns: list of result dicts (see render_week) ordered by week
+# Side Effects: opens data files, creates and saves pdf files, starts worker processes, raises
+#               ValueError if two weeks of the range would get the same week number
+def generate_batch(start_date, end_date, starting_week, save_loc, prod_path, goal_path, naming_pattern,
+                   max_workers=None, progress=None, renderer=graph.DEFAULT_RENDERER, use_cache=True,
+                   profile=graph.DEFAULT_PROFILE):
+    weeks = split_weeks(starting_week, start_date, end_date)
+    # every week is saved under its week number, two weeks sharing one would write to the same pdf
+    week_nos = [week['week_no'] for week in weeks]
+    repeated = sorted({week_no for week_no in week_nos if week_nos.count(week_no) > 1}, key=int)
+    if repeated:
+        raise ValueError(f"Weeks with the same week number: {', '.join(repeated)}")
+
+    prod_df, goal_df = graph.load_data(prod_path, goal_path, start_date, end_date)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(prod_df, goal_df)) as executor:
+        futures = {executor.submit(render_week, week, save_loc, naming_pattern, renderer, use_cache, profile): week
+                   for week in weeks}
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:  # the worker process itself failed
+                result = dict(futures[future], path=None, error=str(e))
+
+            results.append(result)
+            if progress:
+                progress(len(results), len(weeks), result)
+
+    results.sort(key=lambda result: result['start'])
+    return results
@@ -0,0 +1,245 @@
+import os, json, hashlib, shutil, uuid, weakref
+import numpy as np
+import pandas as pd
+import report_profiler as profiler
+
+# location of the columnar sidecar files, one sub directory per source data file
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".productivity_report_cache")
+CACHE_VERSION = 4
+MANIFEST_NAME = "manifest.json"
+
+# Function: gets the cache directory used for a specific source data file
+# Inputs: path - str
+# Returns: str
+# Side Effects: none
+def get_entry_dir(path):
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, key)
+
+# Function: calculates the sha256 hash of a file's contents
+# Inputs: path - str
+# Returns: str
+# Side Effects: reads the file
+def hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as my_file:
+        for block in iter(lambda: my_file.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+# Function: reads the manifest describing a cached entry
+# Inputs: entry_dir - str
+# Returns: dict or None if the entry does not exist or can't be read
+# Side Effects: reads manifest file
+def read_manifest(entry_dir):
+    try:
+        with open(os.path.join(entry_dir, MANIFEST_NAME)) as my_file:
+            manifest = json.load(my_file)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("version") != CACHE_VERSION:
+        return None
+    return manifest
+
+# Function: writes the manifest describing a cached entry
+# Inputs: entry_dir - str, manifest - dict
+# Returns: none
+# Side Effects: creates/overwrites manifest file
+def write_manifest(entry_dir, manifest):
+    tmp_path = os.path.join(entry_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as my_file:
+        json.dump(manifest, my_file)
+    os.replace(tmp_path, os.path.join(entry_dir, MANIFEST_NAME))
+
+# Function: checks whether the cached entry still matches the source file. The mtime and
+#           size are checked first and the content hash is only calculated when they differ,
+#           so a file that was touched but not changed keeps its cache entry
+# Inputs: path - str, entry_dir - str, manifest - dict
+# Returns: bool
+# Side Effects: may rewrite the manifest with the new mtime
+def is_valid(path, entry_dir, manifest):
+    stat = os.stat(path)
+    if manifest["path"] != os.path.abspath(path) or manifest["size"] != stat.st_size:
+        return False
+    if manifest["mtime"] == stat.st_mtime_ns:
+        return True
+
+    if manifest["sha256"] != hash_file(path):
+        return False
+
+    manifest["mtime"] = stat.st_mtime_ns
+    write_manifest(entry_dir, manifest)
+    return True
+
+# Function: checks whether a data file has a cache entry matching its current contents
+# Inputs: path - str
+# Returns: bool
+# Side Effects: may rewrite the manifest with the new mtime
+def is_cached(path):
+    manifest = read_manifest(get_entry_dir(path))
+    return manifest is not None and is_valid(path, get_entry_dir(path), manifest)
+
+# Function: saves every column of the dataframe as its own .npy file. Numeric and datetime
+#           columns are saved as is so they can later be memory mapped, text columns are saved as
+#           an array of codes (-1 marking the missing values) into a separate vocabulary of the
+#           distinct values, which is much smaller than the rows for Subject/Type/Activity/Day
+# Inputs: df - dataframe, entry_dir - str
+# Returns: list of dicts describing the stored columns
+# Side Effects: creates .npy files
+def save_columns(df, entry_dir):
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        file_name = f"col{i}.npy"
+
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            np.save(os.path.join(entry_dir, file_name), series.to_numpy())
+            columns.append({"name": col, "file": file_name, "kind": "array"})
+        else:
+            present = series.notna().to_numpy()
+            codes = np.full(len(series), -1, dtype=np.int32)
+            codes[present], vocab = pd.factorize(series[present].astype(str).to_numpy())
+            np.save(os.path.join(entry_dir, file_name), codes)
+            np.save(os.path.join(entry_dir, f"col{i}_vocab.npy"), np.asarray(vocab, dtype=str))
+            columns.append({"name": col, "file": file_name, "kind": "codes", "vocab": f"col{i}_vocab.npy"})
+
+    return columns
+
+# Function: rebuilds the dataframe from the column files. Numeric and datetime columns are memory
+#           mapped rather than read, text columns are rebuilt from their codes, which only creates
+#           one string per distinct value but still fills a new array with one entry per row
+# Inputs: entry_dir - str, columns - list of dicts
+# Returns: dataframe
+# Side Effects: reads .npy files
+def load_columns(entry_dir, columns):
+    data = {}
+    for col in columns:
+        values = np.load(os.path.join(entry_dir, col["file"]), mmap_mode="r")
+        if col["kind"] == "array":
+            data[col["name"]] = np.asarray(values)
+        else:
+            vocab = np.load(os.path.join(entry_dir, col["vocab"])).astype(object)
+            data[col["name"]] = pd.Series(np.append(vocab, np.nan)[values], dtype=object)  # -1 picks the nan
+
+    return pd.DataFrame(data, copy=False)
+
+# Function: writes a new cache entry for the source file
+# Inputs: path - str, df - dataframe
+# Returns: dict - the manifest of the new entry
+# Side Effects: replaces the cache entry directory for the path
+def store(path, df):
+    stat = os.stat(path)
+    entry_dir = get_entry_dir(path)
+    tmp_dir = entry_dir + f".tmp{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        "version": CACHE_VERSION,
+        "path": os.path.abspath(path),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": hash_file(path),
+        "columns": save_columns(df, tmp_dir),
+    }
+    write_manifest(tmp_dir, manifest)
+
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
+    return manifest
+
+# frames returned by load (and session_store.read_sessions), keyed by the token marked in their
+# attrs. pandas copies attrs onto every frame derived from a loaded one (e.g. a filtered, sorted or
+# concatenated frame, or one person's rows), so a frame only counts as loaded when the token maps
+# back to that very frame. Held weakly so frames that are no longer used are still freed
+loaded_frames = weakref.WeakValueDictionary()
+# the attrs keys describing where a frame's rows came from (see tag_source and session_store)
+LOADED_ATTRS = ('source', 'store')
+
+# Function: hashes the rows of a dataframe, the fingerprint of every row (the same one rollup_store
+#           uses) is sorted first so the hash doesn't depend on the row order
+# Inputs: df - dataframe
+# Returns: str
+# Side Effects: none
+def hash_rows(df):
+    columns = [col for col in ('Date', 'Start', 'End', 'Time') if col in df]
+    fingerprints = pd.util.hash_pandas_object(df[columns], index=False).to_numpy(dtype=np.uint64)
+    return hashlib.sha256(np.sort(fingerprints).tobytes()).hexdigest()
+
+# Function: marks a dataframe as holding every row described by one of its attrs (see LOADED_ATTRS),
+#           along with the hash of those rows so the frame being edited in place is noticed too.
+#           Call it again after changing the rows on purpose (e.g. calculating a column)
+# Inputs: df - dataframe, key - str (one of LOADED_ATTRS)
+# Returns: dataframe
+# Side Effects: modifies df.attrs and loaded_frames
+def mark_loaded(df, key):
+    token = uuid.uuid4().hex
+    df.attrs[key] = dict(df.attrs[key], token=token, rows=hash_rows(df))
+    loaded_frames[token] = df
+    return df
+
+# Function: checks whether a dataframe is the frame that was marked as loaded under one of its attrs
+#           and still holds the same rows
+# Inputs: df - dataframe, key - str (one of LOADED_ATTRS)
+# Returns: bool
+# Side Effects: none
+def is_loaded(df, key):
+    info = df.attrs.get(key)
+    if info is None or loaded_frames.get(info.get('token')) is not df:
+        return False
+    return info['rows'] == hash_rows(df)
+
+# Function: removes the loaded marks a frame derived from a loaded one was given by pandas, the
+#           rest of the attrs (which file the rows came from) are kept
+# Inputs: df - dataframe
+# Returns: dataframe
+# Side Effects: modifies df.attrs
+def clear_loaded(df):
+    for key in LOADED_ATTRS:
+        if key in df.attrs:
+            df.attrs[key] = {name: value for name, value in df.attrs[key].items() if name not in ('token', 'rows')}
+    return df
+
+# Function: records which file (and which version of it) a dataframe was parsed from, this is
+#           what lets rollup_store reuse its per day totals without looking at every row
+# Inputs: df - dataframe, manifest - dict
+# Returns: dataframe
+# Side Effects: modifies df.attrs and loaded_frames
+def tag_source(df, manifest):
+    df.attrs['source'] = {"path": manifest["path"], "sha256": manifest["sha256"]}
+    return mark_loaded(df, 'source')
+
+# Function: loads a parsed data file, using the columnar sidecar when it is still valid and
+#           otherwise parsing the file with the passed function and refreshing the sidecar
+# Inputs: path - str, parse_func - function taking a path and returning a dataframe
+# Returns: dataframe
+# Side Effects: may read/write files within the cache directory
+def load(path, parse_func):
+    entry_dir = get_entry_dir(path)
+    manifest = read_manifest(entry_dir)
+
+    if manifest is not None and is_valid(path, entry_dir, manifest):
+        try:
+            with profiler.span('read_cache') as record:
+                df = load_columns(entry_dir, manifest["columns"])
+                record['rows'] = len(df)
+            return tag_source(df, manifest)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    df = parse_func(path)
+    try:
+        with profiler.span('write_cache', len(df)):
+            tag_source(df, store(path, df))
+    except OSError:
+        pass  # caching is best effort, the parsed data is still usable
+    return df
+
+# Function: removes the cached entry for one data file, or every entry if no path is given
+# Inputs: path - str or None
+# Returns: none
+# Side Effects: deletes files within the cache directory
+def clear_cache(path=None):
+    target = get_entry_dir(path) if path else CACHE_DIR
+    shutil.rmtree(target, ignore_errors=True)
@@ -0,0 +1,186 @@
+import time
+import numpy as np
+import pandas as pd
+import report_profiler as profiler
+
+# column holding the row number every session had in its data file (see graph.parse_data_file),
+# the first data row is row 2 as row 1 is the header
+ROW_COLUMN = 'Row'
+# column naming who a session belongs to, overlaps are only looked for between one person's sessions
+OWNER_COLUMN = 'Owner'
+# weekday columns a data file may have next to its Date column, Day_Name isn't checked since it is
+# always calculated from the Date when the file is parsed
+WEEKDAY_COLUMNS = ('Day', 'Weekday')
+WEEKDAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+MINUTES_PER_DAY = 24 * 60
+# a session whose End is before its Start is treated as crossing midnight as long as it would be
+# at most this long, longer ones are more likely to have their times the wrong way around
+MAX_OVERNIGHT_MINUTES = 12 * 60
+# how far the Time column may be from the minutes between Start and End
+TIME_TOLERANCE_MINUTES = 1
+
+# every check the validator runs, the severity is 'error' for rows left out of or wrongly placed
+# on the report and 'warning' for rows that are graphed but look suspicious
+CHECKS = {
+    'missing_date': ('error', "sessions without a date are left out of the report"),
+    'missing_time': ('error', "sessions without a start or end time are left out of the heatmaps"),
+    'end_before_start': ('error', f"sessions end more than {MAX_OVERNIGHT_MINUTES // 60} hours before they start "
+                                  "and are graphed as crossing midnight"),
+    'weekday_mismatch': ('error', "sessions have a weekday that doesn't match their date"),
+    'crosses_midnight': ('warning', "sessions cross midnight and are continued on the next day"),
+    'zero_length': ('warning', "sessions start and end at the same time"),
+    'overlap': ('warning', "sessions start before the previous session ends"),
+    'time_mismatch': ('warning', "sessions have a Time that doesn't match their start and end times"),
+}
+
+NS_PER_MINUTE = 60 * 10**9
+
+# Function: converts a column of timestamps into minutes since midnight with integer math on the
+#           nanoseconds, missing values become 0
+# Inputs: values - numpy datetime64[ns] array
+# Returns: numpy int64 array
+# Side Effects: none
+def minutes_of_day(values):
+    minutes = values.view(np.int64) // NS_PER_MINUTE % MINUTES_PER_DAY
+    return np.where(np.isnat(values), 0, minutes)
+
+# Function: finds the sessions that start before an earlier session of the same person ends. The
+#           sessions are put on one minute timeline (one block per person) and compared against the
+#           latest end seen so far, the rows are only sorted when they aren't in order already
+# Inputs: start - numpy int64 array, end - numpy int64 array (minutes since the epoch, end >= start),
+#         groups - numpy int64 array (person of every session)
+# Returns: numpy bool array
+# Side Effects: none
+def find_overlaps(start, end, groups):
+    overlaps = np.zeros(len(start), dtype=bool)
+    if len(start) < 2:
+        return overlaps
+
+    origin, block = start.min(), end.max() - start.min() + 1
+    start, end = start - origin + groups * block, end - origin + groups * block
+    order = None
+    if (np.diff(start) < 0).any():
+        order = np.argsort(start, kind='stable')
+        start, end = start[order], end[order]
+
+    found = np.zeros(len(start), dtype=bool)
+    found[1:] = start[1:] < np.maximum.accumulate(end)[:-1]
+    overlaps[order if order is not None else slice(None)] = found
+    return overlaps
+
+# Function: finds the sessions whose weekday column disagrees with their date, the column's few
+#           distinct values are matched up with a weekday once rather than once per row
+# Inputs: values - series of weekday names (e.g. Monday or Mon), weekdays - numpy int64 array
+#         (0 for Monday to 6 for Sunday)
+# Returns: numpy bool array
+# Side Effects: none
+def find_weekday_mismatches(values, weekdays):
+    codes, names = pd.factorize(values)
+    name_days = np.array([WEEKDAY_NAMES.index(name) if name in WEEKDAY_NAMES else -1
+                          for name in (str(name).strip()[:3].lower() for name in names)] + [-1])
+    return (codes >= 0) & (name_days[codes] != weekdays)
+
+# Function: checks whether a Date column is in the order sort_by_date puts it in, dates increasing
+#           with the rows without a date last, so ranges can be found with a binary search
+# Inputs: dates - series of datetimes
+# Returns: bool
+# Side Effects: none
+def is_date_sorted(dates):
+    has_date = dates.notna().to_numpy()
+    dates_last = not (np.diff(has_date.astype(np.int8)) > 0).any()
+    return dates_last and dates[has_date].is_monotonic_increasing
+
+# Function: runs every check on the sessions of a loaded data frame in one batched pass over its
+#           columns. When a date range is passed only the sessions within it (and the sessions
+#           without a date, which every report leaves out) are checked, they are found with a binary
+#           search over the frame sorted by date with the undated rows last (it is sorted here if it isn't)
+# Inputs: df - dataframe, start_date - datetime or None, end_date -
+#         datetime or None, check_time - bool (compare the Time column with the start and end times,
+#         not needed for goal data whose Time is calculated from them)
+# Returns: dict with rows (int, sessions checked), seconds (float) and issues (list of dicts with
+#          check, severity, message and rows keys, rows being a numpy array of data file row numbers,
+#          only checks that found something are listed)
+# Side Effects: none
+def validate_sessions(df, start_date=None, end_date=None, check_time=True):
+    started = time.perf_counter()
+    if start_date is not None:
+        if not is_date_sorted(df['Date']):
+            df = df.sort_values('Date', kind='stable', na_position='last', ignore_index=True)
+        dates = df['Date'].to_numpy()
+        lo = int(dates.searchsorted(np.datetime64(pd.Timestamp(start_date)), 'left'))
+        hi = int(dates.searchsorted(np.datetime64(pd.Timestamp(end_date)), 'right'))
+        undated = len(dates) - int(np.isnat(dates).sum())
+        df = df.iloc[np.r_[lo:hi, undated:len(dates)]] if undated < len(dates) else df.iloc[lo:hi]
+
+    with profiler.span('validate', len(df)):
+        dates, starts, ends = (df[col].to_numpy(dtype='datetime64[ns]') for col in ('Date', 'Start', 'End'))
+        has_date = ~np.isnat(dates)
+        timed = has_date & ~np.isnat(starts) & ~np.isnat(ends)
+        days = np.where(has_date, dates.view(np.int64) // (NS_PER_MINUTE * MINUTES_PER_DAY), 0)
+
+        start_min, end_min = minutes_of_day(starts), minutes_of_day(ends)
+        length = end_min - start_min
+        wrapped = np.where(length < 0, length + MINUTES_PER_DAY, length)
+
+        found = {
+            'missing_date': ~has_date,
+            'missing_time': has_date & ~timed,
+            'end_before_start': timed & (length < 0) & (wrapped > MAX_OVERNIGHT_MINUTES),
+            'crosses_midnight': timed & (length < 0) & (wrapped <= MAX_OVERNIGHT_MINUTES),
+            'zero_length': timed & (length == 0),
+        }
+
+        weekdays = (days + 3) % 7  # 1970-01-01 was a Thursday
+        found['weekday_mismatch'] = np.zeros(len(df), dtype=bool)
+        for col in WEEKDAY_COLUMNS:
+            if col in df:
+                found['weekday_mismatch'] |= has_date & find_weekday_mismatches(df[col], weekdays)
+
+        groups = np.zeros(len(df), dtype=np.int64)
+        if OWNER_COLUMN in df:
+            groups = pd.factorize(df[OWNER_COLUMN])[0].astype(np.int64)
+        session_start = days * MINUTES_PER_DAY + start_min
+        overlaps = find_overlaps(session_start[timed], (session_start + wrapped)[timed], groups[timed])
+        found['overlap'] = np.zeros(len(df), dtype=bool)
+        found['overlap'][timed] = overlaps
+
+        found['time_mismatch'] = np.zeros(len(df), dtype=bool)
+        if check_time and 'Time' in df:
+            minutes = pd.to_numeric(df['Time'], errors='coerce').to_numpy(dtype=np.float64)
+            found['time_mismatch'] = timed & (np.abs(minutes - wrapped) > TIME_TOLERANCE_MINUTES)
+
+        if ROW_COLUMN in df:
+            row_numbers = df[ROW_COLUMN].to_numpy(dtype=np.int64)
+        else:  # e.g. frames built in memory, numbered the same way as a file would be
+            row_numbers = np.arange(len(df), dtype=np.int64) + 2
+
+        issues = []
+        for check, (severity, message) in CHECKS.items():
+            if found[check].any():
+                issues.append({'check': check, 'severity': severity, 'message': message,
+                               'rows': row_numbers[found[check]]})
+
+    return {'rows': len(df), 'issues': issues, 'seconds': time.perf_counter() - started}
+
+# Function: counts the sessions with errors and warnings within a validation report
+# Inputs: report - dict (see validate_sessions)
+# Returns: tuple of ints (errors, warnings)
+# Side Effects: none
+def count_issues(report):
+    counts = {'error': 0, 'warning': 0}
+    for issue in report['issues']:
+        counts[issue['severity']] += len(issue['rows'])
+    return counts['error'], counts['warning']
+
+# Function: describes the issues of a validation report, one line per check that found something
+# Inputs: report - dict (see validate_sessions), label - str (name of the data, e.g. productivity data),
+#         max_rows - int (row numbers listed per check)
+# Returns: list of str
+# Side Effects: none
+def format_issues(report, label, max_rows=5):
+    lines = []
+    for issue in report['issues']:
+        rows = ", ".join(map(str, issue['rows'][:max_rows]))
+        more = f" and {len(issue['rows']) - max_rows} more" if len(issue['rows']) > max_rows else ""
+        lines.append(f"{label} {issue['severity']}: {len(issue['rows'])} {issue['message']} (rows {rows}{more})")
+    return lines
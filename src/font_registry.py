@@ -0,0 +1,242 @@
+import os, re, sys, json, hashlib, shutil, subprocess, threading
+import numpy as np
+import matplotlib
+import fpdf
+from fpdf.ttfonts import TTFontFile
+import data_cache
+
+# the parsed font metrics and the font files found on this machine are kept next to the parsed
+# data cache, so they are only looked up and parsed once per machine instead of once per pdf
+FONT_DIR = os.path.join(data_cache.CACHE_DIR, "fonts")
+# bump when the stored metrics change so older entries stop matching
+FONT_VERSION = 1
+REGISTRY_NAME = "registry.json"
+
+# font files tried for every family/style the report uses, the fonts the report was designed with
+# (Windows) come first followed by close matches found on macOS and Linux
+FONT_FILES = {
+    ('Tahoma', ''): ['tahoma.ttf', 'Tahoma.ttf', 'Verdana.ttf', 'verdana.ttf'],
+    ('Tahoma', 'B'): ['tahomabd.ttf', 'Tahoma Bold.ttf', 'Verdana Bold.ttf', 'verdanab.ttf'],
+    ('Times', ''): ['times.ttf', 'Times New Roman.ttf', 'LiberationSerif-Regular.ttf'],
+    ('Times', 'B'): ['timesbd.ttf', 'Times New Roman Bold.ttf', 'LiberationSerif-Bold.ttf'],
+}
+# fontconfig patterns used when none of the files are in the usual font folders, only TrueType
+# (.ttf) matches can be embedded by fpdf
+FONTCONFIG_PATTERNS = {
+    ('Tahoma', ''): 'Tahoma', ('Tahoma', 'B'): 'Tahoma:bold',
+    ('Times', ''): 'Times New Roman', ('Times', 'B'): 'Times New Roman:bold',
+}
+# DejaVu ships with matplotlib, so these are always available when nothing else is found
+BUNDLED_FILES = {
+    ('Tahoma', ''): 'DejaVuSans.ttf', ('Tahoma', 'B'): 'DejaVuSans-Bold.ttf',
+    ('Times', ''): 'DejaVuSerif.ttf', ('Times', 'B'): 'DejaVuSerif-Bold.ttf',
+}
+
+# font paths and metrics already loaded by this process
+fonts = {}
+metrics = {}
+fonts_lock = threading.Lock()
+
+# Function: gets the folders fonts are installed in on this operating system
+# Inputs: none
+# Returns: list of str (existing folders only)
+# Side Effects: none
+def get_font_dirs():
+    if sys.platform == 'win32':
+        dirs = [os.path.join(os.environ.get('WINDIR', 'C:/Windows'), 'Fonts'),
+                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts')]
+    elif sys.platform == 'darwin':
+        dirs = ['/System/Library/Fonts/Supplemental', '/Library/Fonts', '/System/Library/Fonts',
+                os.path.expanduser('~/Library/Fonts')]
+    else:
+        dirs = [os.path.expanduser('~/.local/share/fonts'), os.path.expanduser('~/.fonts'),
+                '/usr/local/share/fonts', '/usr/share/fonts']
+    return [font_dir for font_dir in dirs if os.path.isdir(font_dir)]
+
+# Function: gets the folder of the fonts bundled with matplotlib
+# Inputs: none
+# Returns: str
+# Side Effects: none
+def get_bundled_dir():
+    return os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf')
+
+# Function: indexes the font files within the font folders (and their sub folders) by their lower
+#           case file name, the first folder wins when the same file is installed twice
+# Inputs: font_dirs - list of str
+# Returns: dict of str to str
+# Side Effects: lists the folders
+def index_font_files(font_dirs):
+    index = {}
+    for font_dir in font_dirs:
+        for root, _, files in os.walk(font_dir):
+            for name in files:
+                index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+# Function: asks fontconfig for the file of a font pattern
+# Inputs: pattern - str
+# Returns: str or None if fontconfig isn't installed or matched a font fpdf can't embed
+# Side Effects: runs fc-match
+def match_fontconfig(pattern):
+    if shutil.which('fc-match') is None:
+        return None
+    try:
+        path = subprocess.run(['fc-match', '-f', '%{file}', pattern], capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return path if path.lower().endswith('.ttf') and os.path.isfile(path) else None
+
+# Function: finds the files of every font the report uses, first within the operating system's
+#           font folders, then through fontconfig and finally the fonts bundled with matplotlib
+# Inputs: none
+# Returns: dict of (family, style) to str
+# Side Effects: lists the font folders, may run fc-match
+def find_fonts():
+    index = index_font_files(get_font_dirs())
+    found = {}
+    for key, names in FONT_FILES.items():
+        path = next((index[name.lower()] for name in names if name.lower() in index), None)
+        found[key] = path or match_fontconfig(FONTCONFIG_PATTERNS[key]) or \
+            os.path.join(get_bundled_dir(), BUNDLED_FILES[key])
+    return found
+
+# Function: gets the font files found on this machine, the stored registry is used as long as it
+#           has the current version and all of its files still exist
+# Inputs: none
+# Returns: dict of (family, style) to str
+# Side Effects: may list the font folders and write the registry file
+def get_fonts():
+    with fonts_lock:
+        if fonts:
+            return fonts
+
+        path = os.path.join(FONT_DIR, REGISTRY_NAME)
+        try:
+            with open(path) as my_file:
+                registry = json.load(my_file)
+            if registry['version'] != FONT_VERSION or not all(map(os.path.isfile, registry['fonts'].values())):
+                registry = None
+        except (OSError, ValueError, KeyError):
+            registry = None
+
+        if registry is not None:
+            found = {tuple(key.split("|")): font_path for key, font_path in registry['fonts'].items()}
+        else:
+            found = find_fonts()
+            try:
+                os.makedirs(FONT_DIR, exist_ok=True)
+                tmp_path = f"{path}.tmp{os.getpid()}"
+                with open(tmp_path, "w") as my_file:
+                    json.dump({'version': FONT_VERSION,
+                               'fonts': {"|".join(key): font_path for key, font_path in found.items()}}, my_file)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass  # the fonts are found again next time
+        fonts.update(found)
+        return fonts
+
+# Function: parses the metrics fpdf needs from a TrueType font file, the same values fpdf's
+#           add_font calculates
+# Inputs: path - str
+# Returns: dict
+# Side Effects: reads the font file
+def parse_metrics(path):
+    ttf = TTFontFile()
+    ttf.getMetrics(path)
+    return {
+        'name': re.sub('[ ()]', '', ttf.fullName),
+        'desc': {
+            'Ascent': int(round(ttf.ascent, 0)),
+            'Descent': int(round(ttf.descent, 0)),
+            'CapHeight': int(round(ttf.capHeight, 0)),
+            'Flags': ttf.flags,
+            'FontBBox': "[%s %s %s %s]" % tuple(int(round(value, 0)) for value in ttf.bbox),
+            'ItalicAngle': int(ttf.italicAngle),
+            'StemV': int(round(ttf.stemV, 0)),
+            'MissingWidth': int(round(ttf.defaultWidth, 0)),
+        },
+        'up': round(ttf.underlinePosition),
+        'ut': round(ttf.underlineThickness),
+        'originalsize': os.stat(path).st_size,
+        'cw': ttf.charWidths,
+    }
+
+# Function: gets the path of the stored metrics of a font file, which changes along with the file
+# Inputs: path - str
+# Returns: str
+# Side Effects: none
+def get_metrics_path(path):
+    stat = os.stat(path)
+    key = f"{FONT_VERSION}|{fpdf.FPDF_VERSION}|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(FONT_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npz")
+
+# Function: gets the metrics of a font file, parsing it only the first time it is used on this machine
+# Inputs: path - str
+# Returns: dict (see parse_metrics)
+# Side Effects: may read the font file and read/write the stored metrics
+def get_metrics(path):
+    with fonts_lock:
+        if path in metrics:
+            return metrics[path]
+
+        entry_path = get_metrics_path(path)
+        try:
+            with np.load(entry_path) as entry:
+                font_metrics = dict(json.loads(str(entry['meta'])), cw=entry['cw'].tolist())
+        except (OSError, ValueError, KeyError):
+            font_metrics = parse_metrics(path)
+            meta = {key: value for key, value in font_metrics.items() if key != 'cw'}
+            try:
+                os.makedirs(FONT_DIR, exist_ok=True)
+                tmp_path = f"{entry_path}.tmp{os.getpid()}.npz"
+                np.savez(tmp_path, meta=np.array(json.dumps(meta)), cw=np.array(font_metrics['cw'], dtype=np.int32))
+                os.replace(tmp_path, entry_path)
+            except OSError:
+                pass  # the font is parsed again next time
+
+        metrics[path] = font_metrics
+        return font_metrics
+
+# Function: adds a TrueType font to the pdf from already parsed metrics, this fills in the same
+#           font tables fpdf's add_font(..., uni=True) does without parsing the font file again.
+#           These are fpdf's private tables as laid out by fpdf==1.7.2 (see requirements.txt), check
+#           them against add_font before bumping fpdf or the pdf's font tables will come out broken
+# Inputs: pdf - fpdf.fpdf.FPDF, family - str, style - str, path - str, font_metrics - dict
+# Returns: none
+# Side Effects: modifies the pdf object
+def register_font(pdf, family, style, path, font_metrics):
+    fontkey = family.lower() + style
+    if fontkey in pdf.fonts:
+        return
+
+    pdf.fonts[fontkey] = {
+        'i': len(pdf.fonts) + 1, 'type': 'TTF',
+        'name': font_metrics['name'], 'desc': font_metrics['desc'],
+        'up': font_metrics['up'], 'ut': font_metrics['ut'],
+        'cw': font_metrics['cw'],
+        'ttffile': path, 'fontkey': fontkey,
+        # the subset starts with the digits when page numbers are aliased, str_alias_nb_pages is only
+        # set once pdf.alias_nb_pages() is called
+        'subset': list(range(0, 57 if getattr(pdf, 'str_alias_nb_pages', None) else 32)), 'unifilename': None,
+    }
+    pdf.font_files[fontkey] = {'length1': font_metrics['originalsize'], 'type': 'TTF', 'ttffile': path}
+    pdf.font_files[path] = {'type': 'TTF'}
+
+# Function: adds every font the report uses to the pdf
+# Inputs: pdf - fpdf.fpdf.FPDF
+# Returns: none
+# Side Effects: modifies the pdf object, may look up and parse the font files the first time
+def add_fonts(pdf):
+    for (family, style), path in get_fonts().items():
+        register_font(pdf, family, style, path, get_metrics(path))
+
+# Function: removes the stored font registry and metrics, e.g. after installing new fonts
+# Inputs: none
+# Returns: none
+# Side Effects: deletes the font cache directory, clears the fonts loaded by this process
+def clear_cache():
+    with fonts_lock:
+        fonts.clear()
+        metrics.clear()
+    shutil.rmtree(FONT_DIR, ignore_errors=True)
@@ -1,20 +1,30 @@
 import customtkinter as ctk
-from matplotlib import pyplot as plt
-from datetime import datetime, date, timedelta
+import threading
+import queue
+from datetime import date
 from tkinter import filedialog
 from tkcalendar import DateEntry
-import automated_report as report
+import report_dates
 
 
-# Function: calculates the number of weeks passed since the date
-#           stored within the starting_week argument
-# Inputs: starting_week - str, start_date - datetime.date
-# Returns: str
-# Side Effects: none
-def calc_week_num(starting_week, start_date):
-    starting_week = datetime.strptime(starting_week, '%Y-%m-%d').date()
-    delta = (start_date - starting_week).days
-    return str(int(delta / 7) + 1)
+# Function: imports the report generation module on first use, it pulls in pandas, numpy,
+#           matplotlib, seaborn and fpdf so it is kept out of the gui's startup path
+# Inputs: none
+# Returns: module - automated_report
+# Side Effects: imports the report generation modules the first time it is called
+def get_report_module():
+    import matplotlib
+    matplotlib.use('Agg')  # figures are only drawn into the pdf, never shown in a window
+    import automated_report
+    return automated_report
+
+# Function: imports the report generation modules on a background thread once the
+#           window is up so that they are usually loaded before the first report
+# Inputs: none
+# Returns: none
+# Side Effects: starts a daemon thread
+def start_warmup():
+    threading.Thread(target=get_report_module, daemon=True).start()
 
 # Function: extracts only the filename from a given path
 # Inputs: file_str - str
@@ -34,14 +44,7 @@ def format_file_text(file_str):
 # Returns: dictionary - contains start/end date values for the year, month, and day
 # Side Effects: none
 def get_default_dates():
-    today = date.today()
-    day_n = today.weekday()
-
-    s_days = 6 if day_n == 6 else day_n + 7
-    e_days = day_n + 1
-
-    start_date = today - timedelta(days=s_days)
-    end_date = today - timedelta(days=e_days)
+    start_date, end_date = report_dates.calc_default_range(date.today())
 
     dates = {}
     dates['start'] = {'y': start_date.year, 'm': start_date.month, 'd': start_date.day}
@@ -205,16 +208,108 @@ def setup_date_select(root, frow, fcol):
 
     # Inputs: sdate - 
     #         
+# Class: runs report generation on a background thread so the main window never freezes. Stage
+#        updates are passed back through a queue that the tkinter main thread polls with after(),
+#        and the report button turns into a cancel button while a report is being generated
+# Side Effects: starts threads, creates and saves pdf files, updates the report button and label
+class ReportWorker:
+    poll_ms = 100
+
+    # Function: instantiates the worker for a report button
+    # Inputs: root - CTk object, cbutton - CustomButton
+    # Returns: none
+    # Side Effects: instantiates ReportWorker object
+    def __init__(self, root, cbutton):
+        self.root = root
+        self.cbutton = cbutton
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.generate_command = None
+
+    # Function: starts generating a report on a background thread
+    # Inputs: args - the generate_report arguments (sdate, edate, wno, sloc, ppath, gpath, npattern)
+    # Returns: none
+    # Side Effects: starts a thread, switches the button to cancel, starts polling the queue
+    def start(self, *args):
+        self.cancel_event.clear()
+        self.generate_command = self.cbutton.button.cget("command")
+        self.cbutton.button.configure(text="Cancel", command=self.cancel)
+        self.cbutton.label.configure(text="Starting report generation...")
+
+        threading.Thread(target=self.run, args=args, daemon=True).start()
+        self.root.after(self.poll_ms, self.poll)
+
+    # Function: generates the report, runs on the background thread. A successful report is
+    #           followed by a one line summary of where the time went, a report that finished
+    #           before a cancel reached one of its stages keeps its status
+    # Inputs: args - the generate_report arguments
+    # Returns: none
+    # Side Effects: creates and saves pdf file, puts messages in the queue
+    def run(self, *args):
+        timings, stats = {}, {}
+        try:
+            report = get_report_module()
+            try:
+                update_str = report.generate_report(*args, progress=self.report_progress, timings=timings, stats=stats)
+            except report.ReportCancelled as e:
+                self.messages.put(("done", str(e)))
+                return
+            if timings and update_str.endswith("generated successfully!"):
+                update_str += "\n" + report.profiler.summarize(timings)
+                if 'bytes' in stats:
+                    update_str += f" | {stats['bytes'] / 1024:.0f} KB"
+                import data_validator
+                errors, warnings = map(sum, zip(*(data_validator.count_issues(stats[key])
+                                                  for key in ('prod_issues', 'goal_issues'))))
+                if errors or warnings:
+                    update_str += f"\nData check: {errors} rows with errors, {warnings} with warnings"
+        except Exception as e:
+            update_str = str(e)
+
+        self.messages.put(("done", update_str))
+
+    # Function: progress callback passed to generate_report, stops the report if cancel was pressed
+    # Inputs: stage - str
+    # Returns: none
+    # Side Effects: puts a message in the queue, raises ReportCancelled when cancelled
+    def report_progress(self, stage):
+        if self.cancel_event.is_set():
+            raise get_report_module().ReportCancelled("Report generation cancelled")
+        self.messages.put(("stage", stage))
+
+    # Function: asks the running report to stop at the next stage
+    # Inputs: none
+    # Returns: none
+    # Side Effects: sets the cancel event, updates button and label
+    def cancel(self):
+        self.cancel_event.set()
+        self.cbutton.button.configure(state="disabled")
+        self.cbutton.label.configure(text="Cancelling...")
+
+    # Function: shows queued stage updates on the label, runs on the tkinter main thread
+    # Inputs: none
+    # Returns: none
+    # Side Effects: updates label text, reschedules itself until the report is done
+    def poll(self):
+        try:
+            while True:
+                kind, text = self.messages.get_nowait()
+                self.cbutton.label.configure(text=text)
+                if kind == "done":
+                    self.cbutton.button.configure(text="Generate", state="normal", command=self.generate_command)
+                    return
+        except queue.Empty:
+            self.root.after(self.poll_ms, self.poll)
+
 # Function: Handles the automatic generation of the report. This function is needed so that the
 #           the input values from the buttons can be dynamically extracted and passed to the report
 #           generation function
 # Inputs: cbutton - CustomButton, sdate - datetime.date, edate - datetime.date, wno - str, sloc - str, 
 #         ppath - str, gpath - str, npattern - str
 # Returns: none
-# Side Effects: creates and saves new pdf file, updates label text
+# Side Effects: starts generating the pdf file on a background thread, updates label text
 def handle_report_gen(cbutton, sdate, edate, wno, sloc, ppath, gpath, npattern):
-    update_str = report.generate_report(sdate, edate, wno, sloc, ppath, gpath, npattern)
-    cbutton.label.configure(text=update_str)
+    cbutton.worker.start(sdate, edate, wno, sloc, ppath, gpath, npattern)
 
 # Function: sets up a CustomButton for report generation
 # Inputs: root - CTk object, settings - dict, date_sel - CustomDateEntry, paths - dict, frow - int,
@@ -234,19 +329,20 @@ def setup_report_button(root, settings, date_sel, buttons, frow, fcol):
         report_button,
         date_sel.start_ds.get_date(),
         date_sel.end_ds.get_date(),
-        calc_week_num(settings['starting_week'], date_sel.start_ds.get_date()),
+        report_dates.calc_week_num(settings['starting_week'], date_sel.start_ds.get_date()),
         buttons['save_button'].fpath,
         buttons['prod_button'].fpath,
         buttons['goal_button'].fpath,
         settings['naming_pattern'])
     )
+    report_button.worker = ReportWorker(root, report_button)
     return report_button
 
-# Function: launches gui where user can select productivity data, goal data, and a save location + generate a pdf file
+# Function: builds the main window where user can select productivity data, goal data, and a save location
 # Inputs: settings - dict
-# Returns: none
-# Side Effects: launches gui, creates pdf file, reads in data files 
-def launch_gui(settings):
+# Returns: CTk object
+# Side Effects: creates the main app window and its widgets
+def build_gui(settings):
     root = ctk.CTk()
     root.title("Automated Productivity Report GUI")
 
@@ -267,4 +363,13 @@ def launch_gui(settings):
     buttons = {'goal_button': gselButton, 'save_button': sselButton, 'prod_button': pselButton}
     report_button = setup_report_button(root, settings, date_sel, buttons, 12, 0)
 
+    return root
+
+# Function: launches gui where user can select productivity data, goal data, and a save location + generate a pdf file
+# Inputs: settings - dict
+# Returns: none
+# Side Effects: launches gui, creates pdf file, reads in data files 
+def launch_gui(settings):
+    root = build_gui(settings)
+    root.after_idle(start_warmup)  # load the report modules once the window is drawn
     root.mainloop()
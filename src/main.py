@@ -1,6 +1,8 @@
 import sys
 import os
-from gui import launch_gui
+import argparse
+import multiprocessing
+from datetime import datetime
 
 
 # Function: gets the full path of the filename located within
@@ -32,12 +34,237 @@ def import_settings(filename):
             settings[key] = value.replace('\n', '')
     return settings
 
+# Function: converts a command line date argument into a date
+# Inputs: text - str in the format YYYY-MM-DD
+# Returns: datetime.date
+# Side Effects: none
+def parse_date(text):
+    try:
+        return datetime.strptime(text, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{text}', expected YYYY-MM-DD")
+
+# the formats a report can be saved in, see report_export.EXPORT_FORMATS
+REPORT_FORMATS = ['pdf', 'html', 'png', 'svg', 'json', 'csv']
+
+# Function: converts a comma separated list of report formats into a list
+# Inputs: text - str (e.g. pdf,html,json)
+# Returns: list of str
+# Side Effects: none
+def parse_formats(text):
+    formats = [fmt.strip().lower() for fmt in text.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in REPORT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"invalid format '{text}', expected a comma separated list of "
+                                         f"{', '.join(REPORT_FORMATS)}")
+    return formats
+
+# Function: reads the command line arguments
+# Inputs: argv - list of str
+# Returns: argparse.Namespace
+# Side Effects: exits the program with status 2 if the arguments are invalid
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Generates productivity reports from productivity and goal data.")
+    parser.add_argument('--cli', action='store_true',
+                        help="generate the report from the command line without launching the GUI")
+    parser.add_argument('--start', type=parse_date, help="start date of the report (YYYY-MM-DD), defaults to last Monday")
+    parser.add_argument('--end', type=parse_date, help="end date of the report (YYYY-MM-DD), defaults to last Sunday")
+    parser.add_argument('--period', choices=['week', 'month', 'quarter', 'year'], default='week',
+                        help="length of the report, month/quarter/year reports default to the last full period "
+                             "(or the one containing --start) and show weekday and calendar heatmaps")
+    parser.add_argument('--batch', action='store_true', help="generate one report for every week of the date range")
+    parser.add_argument('--team', action='store_true',
+                        help="generate one report per person named in the data's Owner column")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and regenerate the current week's (or --period's) report whenever the "
+                             "data files change, --start picks a different period to watch")
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help="seconds the data files have to stay unchanged before --watch regenerates the report")
+    parser.add_argument('--workers', type=int, help="number of processes used by --batch (reports rendered at once by --team)")
+    parser.add_argument('--import', dest='import_data', nargs=2, metavar=('FILE', 'STORE'),
+                        help="imports the sessions of a csv/xlsx file into a sqlite session store (e.g. "
+                             "sqlite:///sessions.db, add ?table=goals for goal data) that prod_path/goal_path can "
+                             "point to, sessions imported before are skipped")
+    parser.add_argument('--settings', help="path of the settings file, defaults to default_settings.txt")
+    parser.add_argument('--renderer', choices=['seaborn', 'fast'],
+                        help="heatmap renderer, 'fast' draws large date ranges much quicker (defaults to the "
+                             "renderer setting or seaborn)")
+    parser.add_argument('--profile', choices=['standard', 'draft', 'archive', 'print'],
+                        help="dpi and image encoding of the figures, 'draft' is smallest and quickest, 'archive' "
+                             "palette encodes them for the smallest lossless file and 'print' renders them at 300 "
+                             "dpi (defaults to the profile setting or standard)")
+    parser.add_argument('--format', dest='formats', type=parse_formats,
+                        help="comma separated formats to save the report in, e.g. pdf,html,json. html is a single "
+                             "page with the figures embedded, png/svg save every figure and csv every table as its "
+                             "own file. All formats come from one run over the data (defaults to the formats "
+                             "setting or pdf, only used for single and --team reports)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="render the figures and pdf again even if the same report was generated before")
+    parser.add_argument('--trace', help="saves a json trace with the time, cpu time and rows of every report stage "
+                                        "(defaults to the trace_path setting, not used by --batch)")
+    parser.add_argument('--chrome-trace', action='store_true',
+                        help="saves the --trace file in Chrome's trace format (chrome://tracing or Perfetto)")
+    return parser.parse_args(argv)
+
+# Function: generates the report(s) without the GUI using the values from the settings
+#           file and the date range passed on the command line
+# Inputs: settings - dict, args - argparse.Namespace
+# Returns: int - exit status (0 success, 1 report generation failed, 2 invalid date range)
+# Side Effects: switches matplotlib to a headless backend, accesses data files,
+#               creates and saves pdf file(s), prints status messages
+def run_cli(settings, args):
+    import matplotlib
+    matplotlib.use('Agg')
+    import automated_report as report
+    import report_dates
+
+    renderer = args.renderer or settings.get('renderer', report.graph.DEFAULT_RENDERER)
+    profile = args.profile or settings.get('profile', report.graph.DEFAULT_PROFILE)
+    trace_path = args.trace or settings.get('trace_path') or None
+    try:
+        formats = args.formats or parse_formats(settings.get('formats', 'pdf'))
+    except argparse.ArgumentTypeError as e:
+        print(f"Invalid formats setting: {e}", file=sys.stderr)
+        return 2
+    if args.period != 'week' and args.start and not args.end:
+        default_start, default_end = report_dates.calc_period_range(args.period, args.start)
+    else:
+        default_start, default_end = report_dates.calc_default_period_range(args.period, datetime.now().date())
+    start_date = args.start or default_start
+    end_date = args.end or default_end
+    if start_date > end_date:
+        print("Start date must be before the end date", file=sys.stderr)
+        return 2
+    if args.batch and args.period != 'week':
+        print("--batch always generates weekly reports, it can't be combined with --period", file=sys.stderr)
+        return 2
+
+    if args.watch:
+        if args.batch or args.team or args.end:
+            print("--watch generates the report of a single period, it can't be combined with --batch, --team "
+                  "or --end", file=sys.stderr)
+            return 2
+        import watch_report
+
+        def print_watch_progress(result):
+            status = result['error'] or result['path'] or "up to date"
+            label = "Week #" + result['week_no'] if args.period == 'week' else result['week_no']
+            print(f"[{datetime.now():%H:%M:%S}] {label}: {status} ({result['seconds']:.2f}s)", flush=True)
+
+        print(f"Watching {settings['prod_path']} and {settings['goal_path']}, press Ctrl+C to stop", flush=True)
+        try:
+            watch_report.watch_reports(settings, args.period, args.start, renderer, not args.no_cache,
+                                       debounce=args.debounce, progress=print_watch_progress, profile=profile)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.batch:
+        import batch_report
+
+        def print_progress(done, total, result):
+            status = result['error'] or result['path']
+            print(f"[{done}/{total}] Week #{result['week_no']}: {status}")
+
+        try:
+            results = batch_report.generate_batch(start_date, end_date, settings['starting_week'],
+                                                  settings['save_path'], settings['prod_path'],
+                                                  settings['goal_path'], settings['naming_pattern'],
+                                                  max_workers=args.workers, progress=print_progress,
+                                                  renderer=renderer, use_cache=not args.no_cache,
+                                                  profile=profile)
+        except Exception as e:
+            print(f"Report generation failed: {e}", file=sys.stderr)
+            return 1
+        return 1 if any(result['error'] for result in results) else 0
+
+    if args.period == 'week':
+        week_no = report_dates.calc_week_num(settings['starting_week'], start_date)
+    else:
+        week_no = report_dates.calc_period_label(args.period, start_date)
+
+    if args.team:
+        import team_report
+
+        def print_team_progress(done, total, result):
+            status = result['error'] or result['path']
+            print(f"[{done}/{total}] {result['owner']}: {status}")
+
+        try:
+            results = team_report.generate_team(start_date, end_date, week_no, settings['save_path'],
+                                                settings['prod_path'], settings['goal_path'],
+                                                settings['naming_pattern'], max_workers=args.workers,
+                                                progress=print_team_progress, renderer=renderer,
+                                                use_cache=not args.no_cache, period=args.period,
+                                                profile=profile, formats=formats)
+        except Exception as e:
+            print(f"Report generation failed: {e}", file=sys.stderr)
+            return 1
+        return 1 if not results or any(result['error'] for result in results) else 0
+
+    stats = {}
+    try:
+        prod_df, goal_df = report.graph.load_data(settings['prod_path'], settings['goal_path'],
+                                                   start_date, end_date)
+        path = report.write_report(prod_df, goal_df, start_date, end_date, week_no,
+                                   settings['save_path'], settings['naming_pattern'], renderer=renderer,
+                                   trace_path=trace_path, trace_format='chrome' if args.chrome_trace else 'json',
+                                   use_cache=not args.no_cache, period=args.period, profile=profile,
+                                   stats=stats, formats=formats)
+    except Exception as e:
+        print(f"Report generation failed: {e}", file=sys.stderr)
+        return 1
+
+    if 'pdf' in formats:
+        print(f"PDF report generated successfully: {path}")
+        print(f"{stats['profile']} profile, {stats['bytes'] / 1024:.0f} KB, figures encoded in {stats['encode_seconds']:.2f}s")
+    for fmt in formats:
+        if fmt != 'pdf':
+            print(f"{fmt.upper()} saved: {', '.join(stats['outputs'][fmt])}")
+    import data_validator
+    for key, label in (('prod_issues', "Productivity data"), ('goal_issues', "Goal data")):
+        for line in data_validator.format_issues(stats[key], label):
+            print(line, file=sys.stderr)
+    if trace_path:
+        print(f"Trace saved: {trace_path}")
+    return 0
+
+# Function: imports the sessions of a data file into a sqlite session store
+# Inputs: data_path - str, store_path - str (sqlite:/// path)
+# Returns: int - exit status (0 success, 1 import failed, 2 invalid store path)
+# Side Effects: reads the data file, creates/updates the database, prints status messages
+def run_import(data_path, store_path):
+    import productivity_graphs as graph
+    import session_store
+
+    if not session_store.is_store_path(store_path):
+        print(f"The store must be a {session_store.SCHEME} path", file=sys.stderr)
+        return 2
+    try:
+        added, skipped = session_store.import_frame(store_path, graph.datetime_preprocessing(data_path))
+    except Exception as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Imported {added} new sessions into {store_path} ({skipped} already imported)")
+    return 0
+
 # Function: main function that runs the entire program
 # Inputs: none
 # Returns: none
 # Side Effects: accesses data files, creates a gui, creates graphs,
-#               creates and saves pdf file, reads from text file 
+#               creates and saves pdf file, reads from text file
 if __name__ == "__main__":
-    path = get_file_path("default_settings.txt")
+    multiprocessing.freeze_support()  # needed by the batch process pool in the pyinstaller build
+    args = parse_args(sys.argv[1:])
+    if args.import_data:
+        sys.exit(run_import(*args.import_data))
+
+    path = args.settings or get_file_path("default_settings.txt")
     settings = import_settings(path)
-    launch_gui(settings)
\ No newline at end of file
+
+    if args.cli:
+        sys.exit(run_cli(settings, args))
+
+    from gui import launch_gui
+    launch_gui(settings)
@@ -4,72 +4,172 @@ import numpy as np
 from datetime import datetime, timedelta
 from matplotlib import pyplot as plt
 import matplotlib.patches as mpatches
-from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.colors import LinearSegmentedColormap, to_rgba
+from matplotlib.collections import PathCollection
+from matplotlib.textpath import TextPath
+from matplotlib.transforms import Affine2D
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import os, io, time, zlib
+from PIL import Image
+from functools import lru_cache
+import data_cache
+import rollup_store
+import session_store
+import data_validator
+import session_breakdown
+import report_profiler as profiler
+
+# heatmap renderers, 'seaborn' draws with sns.heatmap and 'fast' draws the same figure directly
+# with pcolormesh and a single collection holding every cell label
+RENDERERS = ('seaborn', 'fast')
+DEFAULT_RENDERER = 'seaborn'
+
+# number of csv rows parsed at a time when only a date range of the file is read
+CSV_CHUNK_ROWS = 100000
+# optional column naming the person each session belongs to when a data file is shared by a team
+OWNER_COLUMN = 'Owner'
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+# the totals bar chart of the longer reports has one bar per week, or per month for a year
+PERIOD_BUCKETS = {'month': 'Week', 'quarter': 'Week', 'year': 'Month'}
+# the calendar heatmap only labels its cells while they are large enough to read
+CALENDAR_ANNOT_WEEKS = 14
+# subjects shown in the subject bar chart and types shown in the type heatmap, the rest are summed
+# up as Other, and the number of Subject/Type/Activity combinations listed in the activity table
+BREAKDOWN_SUBJECTS = 6
+BREAKDOWN_TYPES = 8
+ACTIVITY_ROWS = 10
+
+# Function: sorts a dataframe by its Date column so date ranges can be found with a binary
+#           search, sessions on the same day keep their file order and rows without a date go last.
+#           The order is checked on every call (one pass, cheap next to the slicing it allows) rather
+#           than remembered in attrs, which pandas passes on to reordered frames as well. A reordered
+#           copy of a loaded frame isn't marked as loaded (see data_cache.clear_loaded)
+# Inputs: df - dataframe
+# Returns: dataframe (df itself when it was already sorted)
+# Side Effects: none
+def sort_by_date(df):
+    if not data_validator.is_date_sorted(df['Date']):
+        df = data_cache.clear_loaded(df.sort_values('Date', kind='stable', na_position='last', ignore_index=True))
+    return df
 
-# Function: filters dataframe data with a date between the start and ending dates
+# Function: finds the positions of the first and one past the last row within the date range
+#           using a binary search over the sorted Date column
+# Inputs: df - dataframe sorted by date (see sort_by_date), start_date - datetime, end_date - datetime
+# Returns: tuple of ints
+# Side Effects: none
+def date_bounds(df, start_date, end_date):
+    dates = df['Date'].to_numpy()
+    return (int(dates.searchsorted(np.datetime64(pd.Timestamp(start_date)), 'left')),
+            int(dates.searchsorted(np.datetime64(pd.Timestamp(end_date)), 'right')))
+
+# Function: filters dataframe data with a date between the start and ending dates, the rows are
+#           selected as a slice of the date sorted frame rather than with a mask over every row. The
+#           slice isn't marked as loaded even when df was (see data_cache.clear_loaded)
 # Inputs: df - dataframe, col_list - list of str, start_date - datetime, end_date - datetime
 # Returns: dataframe
 # Side Effects: none
 def filter_by_daterange(df, col_list, start_date, end_date):
-    df = df[col_list]
-    return df[(df['Date'] >= start_date) & (df['Date'] <= end_date)]
-
-# Function: creates and formats data within dataframe for graphing a heatmap
+    df = sort_by_date(df)
+    start, end = date_bounds(df, start_date, end_date)
+    return data_cache.clear_loaded(df.iloc[start:end][col_list])
+
+# Function: gets the per day rollup used to graph the date range. Frames loaded from a data file
+#           use the file's stored rollup, frames read from a session store covering the range get
+#           their daily totals from sql, while other frames (including ones derived from a loaded
+#           frame, which keep its attrs) only roll up the slice of rows within the range (and the
+#           day before it for sessions crossing midnight)
+# Inputs: df - dataframe, start_date - datetime, end_date - datetime
+# Returns: dict (see rollup_store)
+# Side Effects: may update the rollup file of the data's source file, may read the session store
+def get_range_rollup(df, start_date, end_date):
+    if rollup_store.is_source_frame(df):
+        return rollup_store.get_rollup(df)
+    store = df.attrs.get('store')
+    covered = store and (store['start'] is None or store['start'] <= start_date and end_date <= store['end'])
+    if covered and session_store.is_store_frame(df):
+        columns = [col for col in ('Date', 'Start', 'End', 'Time') if col in df]
+        rows = filter_by_daterange(df, columns, start_date - timedelta(days=1), end_date)
+        return session_store.get_rollup(rows, store, start_date, end_date)
+    return rollup_store.get_rollup(filter_by_daterange(df, list(df.columns), start_date - timedelta(days=1), end_date))
+
+# Function: gets the people named in the Owner column within the date range, in order of first
+#           appearance. Data without an Owner column belongs to nobody in particular
+# Inputs: df - dataframe, start_date - datetime, end_date - datetime
+# Returns: list of str (empty if the data has no Owner column)
+# Side Effects: none
+def get_owners(df, start_date, end_date):
+    if OWNER_COLUMN not in df:
+        return []
+    owners = filter_by_daterange(df, [OWNER_COLUMN], start_date, end_date)[OWNER_COLUMN]
+    return list(owners.dropna().astype(str).unique())
+
+# Function: gets the per day rollup of every person within the date range in a single grouped
+#           pass over the rows, so the cost depends on the amount of data and not on how many
+#           people there are. Rows of people that aren't listed are skipped
+# Inputs: df - dataframe with an Owner column, owners - list of str, start_date - datetime, end_date - datetime
+# Returns: dict of owner to rollup dict (see rollup_store)
+# Side Effects: none
+def get_owner_rollups(df, owners, start_date, end_date):
+    df = filter_by_daterange(df, list(df.columns), start_date - timedelta(days=1), end_date)
+    groups = pd.Categorical(df[OWNER_COLUMN].astype('string'), categories=owners).codes
+    return dict(zip(owners, rollup_store.grouped_rollups(df, groups.astype(np.int64), len(owners))))
+
+# Function: breaks the time worked within the date range down by Subject, Type and Activity, by day
+#           and by hour of the day, from the rows of the range (and the day before it for sessions
+#           crossing midnight) in one pass (see session_breakdown)
 # Inputs: df - dataframe, start_date - datetime, end_date - datetime
+# Returns: dict (see session_breakdown.build_breakdowns)
+# Side Effects: none
+def get_breakdown(df, start_date, end_date):
+    columns = [col for col in ['Date', 'Start', 'End'] + session_breakdown.BREAKDOWN_COLUMNS if col in df]
+    rows = filter_by_daterange(df, columns, start_date - timedelta(days=1), end_date)
+    return session_breakdown.build_breakdowns(rows, start_date, end_date)[0]
+
+# Function: gets the breakdown of every person within the date range in the same single pass,
+#           rows of people that aren't listed are skipped
+# Inputs: df - dataframe with an Owner column, owners - list of str, start_date - datetime, end_date - datetime
+# Returns: dict of owner to breakdown dict (see session_breakdown.build_breakdowns)
+# Side Effects: none
+def get_owner_breakdowns(df, owners, start_date, end_date):
+    df = filter_by_daterange(df, list(df.columns), start_date - timedelta(days=1), end_date)
+    groups = pd.Categorical(df[OWNER_COLUMN].astype('string'), categories=owners).codes
+    return dict(zip(owners, session_breakdown.build_breakdowns(df, start_date, end_date, groups.astype(np.int64),
+                                                               len(owners))))
+
+# Function: creates and formats data within dataframe for graphing a heatmap from a per day rollup,
+#           every day's hours are looked up by its position so only the requested days are touched
+# Inputs: rollup - dict, start_date - datetime, end_date - datetime
 # Returns: dataframe
 # Side Effects: none
-def get_heatmap(df, start_date, end_date):
+def heatmap_from_rollup(rollup, start_date, end_date):
     date_range = pd.date_range(start=start_date, end=end_date, freq='D')
     heatmap = pd.DataFrame(date_range, columns=["Date"])
     heatmap['Day_Name'] = heatmap['Date'].dt.day_name()
-    heatmap['Work_Duration'] = [np.zeros(24, dtype=int) for _ in range(len(heatmap))]
-
-    col_list = ['Day_Name', 'Date', 'Start', 'End']
+    heatmap['Work_Duration'] = list(rollup_store.hour_bins(rollup, start_date, end_date))
 
-    df = filter_by_daterange(df, col_list, start_date, end_date)
-
-    for _, row in df.iterrows():
-        start = row['Start']
-        end = row['End']
-
-        if isinstance(start, pd.Timestamp) and isinstance(end, pd.Timestamp):
-            distribute_time_by_hour(heatmap, row, start, end)
-            
     return heatmap
 
-# Function: calculates the amount of time spent working within a strict 60 minute period
-#           and formats the data within the dataframe based on calculation
-# Inputs: heatmap - df, row - pandas series, start - pandas timestamp, end - pandas timestamp 
-# Returns: none
-# Side Effects: modifies the heatmap dataframe passed in
-def distribute_time_by_hour(heatmap, row, start, end):
-    day = row['Day_Name']
-    same_day = heatmap.index[heatmap['Day_Name'] == day][0]
-    time_list = heatmap.at[same_day, 'Work_Duration']
-
-    if end.hour == start.hour:
-        time_list[end.hour] += end.minute - start.minute
-    else:
-        time_list[start.hour] += 60 - start.minute
-        time_list[start.hour + 1:end.hour] += 60
-        time_list[end.hour] += end.minute
+# Function: creates and formats data within dataframe for graphing a heatmap
+# Inputs: df - dataframe, start_date - datetime, end_date - datetime
+# Returns: dataframe
+# Side Effects: may update the rollup file of the data's source file
+def get_heatmap(df, start_date, end_date):
+    return heatmap_from_rollup(get_range_rollup(df, start_date, end_date), start_date, end_date)
 
-    heatmap.at[same_day, 'Work_Duration'] = time_list
+# Function: gets the hour of the day labels used as the ytick values of the heatmap graphs
+# Inputs: none
+# Returns: list of str
+# Side Effects: none
+def get_hour_labels():
+    pattern = [12] + list(range(1, 12))
+    return [f"{hour} AM" for hour in pattern] + [f"{hour} PM" for hour in pattern]
 
 # Function: adds ytick values to heatmap graphs with hours of the day
 # Inputs: df - dataframe, col_name - str
 # Returns: dataframe
 # Side Effects: none
 def add_hour_labels(df, col_name):
-    hour_labels = []
-    pattern = [12] + list(range(1, 12))
-    for _ in range(2): hour_labels.extend(pattern)
-
-    for i in range(12):
-        hour_labels[i] = str(hour_labels[i]) + " AM"
-        hour_labels[i+12] = str(hour_labels[i+12]) + " PM"
-
-    return pd.DataFrame(df[col_name].tolist(), columns=hour_labels)
+    return pd.DataFrame(df[col_name].tolist(), columns=get_hour_labels())
 
 # Function: adds xtick values to heatmap graphs with days of the week
 # Inputs: df - dataframe, work_duration_df - dataframe
@@ -82,11 +182,112 @@ def add_date_labels(df, work_duration_df):
     work_duration_df.set_index('Day_Name', inplace=True) # Set Day_Name as the index
     return work_duration_df.transpose()
 
+# Function: gets the xtick values of the heatmap graphs, the short day name and date of every day
+# Inputs: df - dataframe
+# Returns: list of str
+# Side Effects: none
+def get_date_labels(df):
+    return (df['Day_Name'].str[:3] + ' ' + df['Date'].dt.strftime('%m-%d')).tolist()
+
+# Function: creates the outline of a cell label centered on the origin, the outlines are
+#           cached since the same few numbers are repeated across the heatmap cells
+# Inputs: text - str, size - float (font size in points)
+# Returns: matplotlib path in points
+# Side Effects: none
+@lru_cache(maxsize=512)
+def get_label_path(text, size):
+    path = TextPath((0, 0), text, size=size)
+    extents = path.get_extents()
+    return path.transformed(Affine2D().translate(-extents.x0 - extents.width / 2, -extents.y0 - extents.height / 2))
+
+# Function: calculates the relative luminance of colors, used to pick readable label colors
+# Inputs: rgba - numpy array of rgba colors (n x 4)
+# Returns: numpy array of floats
+# Side Effects: none
+def relative_luminance(rgba):
+    rgb = rgba[:, :3]
+    rgb = np.where(rgb <= .03928, rgb / 12.92, ((rgb + .055) / 1.055) ** 2.4)
+    return rgb @ np.array([.2126, .7152, .0722])
+
+# Function: writes the labels into the heatmap cells as a single collection of text outlines
+#           instead of one text artist per cell, the label colors match the seaborn annotations
+# Inputs: ax - matplotlib axes, annot - numpy array of str (rows x cols, "" for no label),
+#         cell_colors - numpy array of the rgba cell colors (rows * cols x 4), fontsize - float
+# Returns: none
+# Side Effects: modifies ax
+def annotate_cells(ax, annot, cell_colors, fontsize):
+    has_label = (annot != "").ravel()
+    if not has_label.any():
+        return
+
+    rows, cols = np.divmod(np.flatnonzero(has_label), annot.shape[1])
+    paths = [get_label_path(text, fontsize) for text in annot.ravel()[has_label]]
+    dark = relative_luminance(cell_colors[has_label]) > .408
+    colors = np.where(dark[:, None], to_rgba(".15"), to_rgba("w"))
+
+    # offsets are in data coordinates while the outlines are scaled from points to pixels
+    labels = PathCollection(paths, offsets=np.column_stack([cols + .5, rows + .5]),
+                            offset_transform=ax.transData,
+                            transform=Affine2D().scale(1 / 72) + ax.figure.dpi_scale_trans,
+                            facecolors=colors, edgecolors='none')
+    ax.add_collection(labels, autolim=False)
+
+# Function: chooses which tick labels to show so they don't overlap, the same way seaborn
+#           thins out the labels of large heatmaps
+# Inputs: ax - matplotlib axes, labels - list of str, axis - int (0 for x, 1 for y)
+# Returns: tuple (tick positions, tick labels)
+# Side Effects: none
+def get_auto_ticks(ax, labels, axis):
+    bbox = ax.get_window_extent().transformed(ax.figure.dpi_scale_trans.inverted())
+    size = [bbox.width, bbox.height][axis]
+    fontsize = [ax.xaxis, ax.yaxis][axis].get_ticklabels()[0].get_size() if labels else 10
+    max_ticks = int(size // (fontsize / 72))
+    if max_ticks < 1:
+        return [], []
+
+    step = len(labels) // max_ticks + 1
+    return np.arange(0, len(labels), step) + .5, labels[::step]
+
+# Function: draws an annotated heatmap with pcolormesh that looks the same as sns.heatmap
+# Inputs: ax - matplotlib axes, values - numpy array (rows x cols), annot - numpy array of str,
+#         cmap - str or colormap, xlabels - list of str, ylabels - list of str,
+#         cbar_label - str or None (no colorbar is drawn when None)
+# Returns: matplotlib QuadMesh
+# Side Effects: modifies ax and its figure
+def draw_fast_heatmap(ax, values, annot, cmap, xlabels, ylabels, cbar_label=None):
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+    values = values.astype(float)
+    mesh = ax.pcolormesh(values, cmap=cmap, vmin=np.nanmin(values), vmax=np.nanmax(values),
+                         linewidth=0.5, edgecolors='black')
+    ax.set(xlim=(0, values.shape[1]), ylim=(values.shape[0], 0))
+
+    if cbar_label is not None:
+        cbar = ax.figure.colorbar(mesh, ax=ax, label=cbar_label)
+        cbar.outline.set_linewidth(0)
+
+    xticks, xticklabels = get_auto_ticks(ax, xlabels, 0)
+    yticks, yticklabels = get_auto_ticks(ax, ylabels, 1)
+    ax.set_xticks(xticks, xticklabels)
+    ax.set_yticks(yticks, yticklabels, va='center')
+
+    mesh.update_scalarmappable()
+    annotate_cells(ax, annot, mesh.get_facecolors(), plt.rcParams['font.size'])
+    return mesh
+
 # Function: sets up configurations for the productivity heatmap graph
-# Inputs: df - dataframe, ax - matplotlib axes, cmap - list
+# Inputs: df - dataframe, ax - matplotlib axes, cmap - list, renderer - str (one of RENDERERS)
 # Returns: none
 # Side Effects: modifies fig and ax
-def setup_productivity_figure(df, ax, cmap):
+def setup_productivity_figure(df, ax, cmap, renderer=DEFAULT_RENDERER):
+    if renderer == 'fast':
+        values = to_hour_matrix(df['Work_Duration']).T
+        annot = np.where(values == 0, "", values.astype(str))
+        draw_fast_heatmap(ax, values, annot, cmap, get_date_labels(df), get_hour_labels(),
+                          cbar_label='Work Duration (minutes)')
+        return
+
     xtick_df = add_hour_labels(df, "Work_Duration")
     xytick_df = add_date_labels(df, xtick_df)
 
@@ -108,11 +309,11 @@ def setup_productivity_figure(df, ax, cmap):
     )
 
 # Function: plots the productivity heatmap figure
-# Inputs: fig - matplotlib fig, ax - matplotlib ax, df - dataframe
+# Inputs: fig - matplotlib fig, ax - matplotlib ax, df - dataframe, renderer - str (one of RENDERERS)
 # Returns: none
 # Side Effects: modifies fig and ax
-def plot_prod_fig(fig, ax, df):
-    setup_productivity_figure(df, ax, "YlGnBu")
+def plot_prod_fig(fig, ax, df, renderer=DEFAULT_RENDERER):
+    setup_productivity_figure(df, ax, "YlGnBu", renderer)
 
     # Customize the plot
     ax.set_title('Productivity Time Spread Heatmap')
@@ -124,108 +325,148 @@ def plot_prod_fig(fig, ax, df):
     fig.tight_layout()
 
 
-# Function: creates new dataframe that calculates the difference in time values between the
-#           passed dataframes
-# Inputs: df1 - dataframe, df2 - dataframe 
-# Returns: dataframe
+# Function: stacks a column of per-day 24 hour arrays into a single days x 24 matrix
+# Inputs: col - pandas series of numpy arrays
+# Returns: numpy array with shape (number of days, 24)
 # Side Effects: none
-def calc_delta_heatmap(df1, df2):
-    combined = pd.merge(df1, df2, on="Date")
-    combined['Work_Duration'] = combined['Work_Duration_x'] - combined['Work_Duration_y']
-
-    combined.drop(columns=['Work_Duration_x', 'Work_Duration_y', 'Day_Name_y'], inplace=True)
-    combined.rename(columns={'Day_Name_x':'Day_Name'}, inplace=True)
-
-    return combined
-
-# Function: modifies the color intensity/strength based on how close the time value
-#           for the hour was to 60 mins with stronger/lighter colors being closer/farther away
-#           from 60 mins
-# Inputs: color_value - float, delta_duration - int
-# Returns: float
+def to_hour_matrix(col):
+    if len(col) == 0:
+        return np.zeros((0, 24), dtype=int)
+    return np.stack(col.to_numpy())
+
+# Function: categorizes every heatmap cell and adjusts the color intensity/strength based on
+#           how close the time value for the hour was to 60 mins, with stronger/lighter colors
+#           being closer/farther away from 60 mins. Works on whole matrices at once
+#           1 - did not follow plan, 3 - followed plan, 5 - exceeded plan expectations,
+#           6 - no plan + no work
+# Inputs: goal - numpy array, prod - numpy array (same shape as goal)
+# Returns: numpy array of floats
 # Side Effects: none
-def normalize_color(color_value, delta_duration):
-    if color_value in [1, 5]:
-        return color_value + (0.45 - 0.45 * abs(delta_duration) / 60.0)
-    elif color_value == 3:
-        return color_value + (0.2 - 0.2 * abs(delta_duration) / 60.0)
-    else:
-        return color_value
-
-# Function: categorizes the heatmap cell and returns a float value corresponding to the
-#           category
-# Inputs: goal - int, prod - int
-# Returns: int
-# Side Effects: none 
-def calc_colorval(goal, prod):
-    color_val = 0
-
-    if goal > 0 and prod < goal:
-        color_val = 1 # Did not follow plan
-    elif goal > 0 and prod >= goal:
-        color_val = 3 # Followed plan
-    elif goal == 0 and prod > 0:
-        color_val = 5 # Exceeded plan expectations
-    elif goal == 0 and prod == 0:
-        color_val = 6 # No plan + no work
-
-    return color_val
-
-# Function: creates dataframe storing the category/color values for the
-#           delta heatmap
+def categorize_delta(goal, prod):
+    strength = np.abs(prod - goal) / 60.0
+
+    conditions = [
+        (goal > 0) & (prod < goal),
+        (goal > 0) & (prod >= goal),
+        (goal == 0) & (prod > 0),
+        (goal == 0) & (prod == 0),
+    ]
+    choices = [
+        1 + (0.45 - 0.45 * strength),
+        3 + (0.2 - 0.2 * strength),
+        5 + (0.45 - 0.45 * strength),
+        6.0,
+    ]
+    return np.select(conditions, choices, default=0.0)
+
+# Function: creates the performance heatmap dataframe by aligning the goal and productivity
+#           hour matrices once, then calculating the productive - goal time difference and the
+#           category/color values for the delta heatmap in single array operations
 # Inputs: g_df - dataframe, p_df - dataframe
-# Returns: dataframe
+# Returns: dataframe with Date, Day_Name, Work_Duration (delta) and Eval_Categories columns
 # Side Effects: none
 def delta_categorization(g_df, p_df):
-    combined = pd.merge(g_df, p_df, on="Date")
-    categories = g_df[['Date', 'Day_Name']]
-    categories['Eval_Categories'] = None
-
-    date_to_categories = {}
+    combined = pd.merge(g_df, p_df, on=['Date', 'Day_Name'], suffixes=('_goal', '_prod'))
 
-    for _, row in combined.iterrows():
-        goal_np = row['Work_Duration_x']
-        prod_np = row['Work_Duration_y']
-        date = row['Date']
+    goal = to_hour_matrix(combined['Work_Duration_goal'])
+    prod = to_hour_matrix(combined['Work_Duration_prod'])
 
-        category_np = np.zeros(goal_np.shape, dtype=float)
+    performance = combined[['Date', 'Day_Name']].copy()
+    performance['Work_Duration'] = list(prod - goal)
+    performance['Eval_Categories'] = list(categorize_delta(goal, prod))
 
-        for i in range(goal_np.shape[0]):
-            color_val = calc_colorval(goal_np[i], prod_np[i])
-            category_np[i] = normalize_color(color_val, prod_np[i] - goal_np[i])
-        
-        date_to_categories[date] = category_np
-        
-    categories['Eval_Categories'] = categories['Date'].map(date_to_categories)
-
-    return categories
+    return performance
 
 # Function: extracts data from csv or xlsx file and puts into dataframe
 # Inputs: path - str
 # Returns: dataframe
 # Side Effects: opens csv/xlsx file
-def datetime_preprocessing(path):
-    if ".csv" in path:
-        df = pd.read_csv(path)
+def parse_data_file(path):
+    with profiler.span('read_file') as record:
+        if ".csv" in path:
+            df, time_format = pd.read_csv(path), '%I:%M %p'
+        elif ".xlsx" in path:
+            df, time_format = pd.read_excel(path), '%H:%M:%S'
+        else:
+            raise ValueError(f"Unsupported data file {path}, expected a .csv, .xlsx or {session_store.SCHEME} path")
+        record['rows'] = len(df)
+        df[data_validator.ROW_COLUMN] = np.arange(len(df)) + 2  # row 1 is the header
+
+    with profiler.span('parse_times', len(df)):
+        df['Start'] = pd.to_datetime(df['Start'], format=time_format)
+        df['End'] = pd.to_datetime(df['End'], format=time_format)
+        df['Date'] = pd.to_datetime(df['Date'])
+        df['Day_Name'] = df['Date'].dt.day_name()
+
+    return sort_by_date(df)
+
+# Function: streams a csv file in chunks and only keeps the sessions within the date range, the
+#           Date column is checked first and the Start/End times are only parsed for the rows that
+#           are kept, so memory and parsing time depend on the range rather than the file's size.
+#           The day before start_date is kept as well for sessions crossing midnight into the range
+# Inputs: path - str, start_date - datetime, end_date - datetime, chunksize - int (rows per chunk)
+# Returns: dataframe
+# Side Effects: opens csv file
+def parse_csv_range(path, start_date, end_date, chunksize=CSV_CHUNK_ROWS):
+    first_day = pd.Timestamp(start_date) - timedelta(days=1)
+    last_day = pd.Timestamp(end_date)
+
+    with profiler.span('read_file') as record:
+        parts = []
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            dates = pd.to_datetime(chunk['Date'])
+            in_range = (dates >= first_day) & (dates <= last_day)
+            part = chunk[in_range].copy()
+            part['Date'] = dates[in_range]
+            part[data_validator.ROW_COLUMN] = part.index + 2  # the chunks carry on the file's row index
+            parts.append(part)
+
+        df = pd.concat(parts, ignore_index=True) if parts else pd.read_csv(path, nrows=0).assign(
+            **{data_validator.ROW_COLUMN: np.zeros(0, dtype=np.int64)})
+        record['rows'] = len(df)
+
+    with profiler.span('parse_times', len(df)):
         df['Start'] = pd.to_datetime(df['Start'], format='%I:%M %p')
         df['End'] = pd.to_datetime(df['End'], format='%I:%M %p')
-    elif ".xlsx" in path:
-        df = pd.read_excel(path)
-        df['Start'] = pd.to_datetime(df['Start'], format='%H:%M:%S')
-        df['End'] = pd.to_datetime(df['End'], format='%H:%M:%S')
-    else:
-        df = pd.DataFrame()
-
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['Day_Name'] = df['Date'].dt.day_name()
-
-    return df
+        df['Date'] = pd.to_datetime(df['Date'])
+        df['Day_Name'] = df['Date'].dt.day_name()
+
+    return sort_by_date(df)
+
+# Function: loads the data from a csv or xlsx file, reusing the parsed columnar sidecar
+#           stored by data_cache when the file hasn't changed since it was last parsed. When a
+#           date range is passed and a csv file has no valid sidecar, only the rows within the
+#           range are read (see parse_csv_range) instead of parsing the whole file. The rows are
+#           sorted by date so the date ranges of later stages are found with a binary search.
+#           sqlite:/// paths are read from a session store, fetching only the range's rows
+# Inputs: path - str, use_cache - bool, start_date - datetime or None, end_date - datetime or None
+# Returns: dataframe
+# Side Effects: opens csv/xlsx file or sqlite database, reads/writes cache files
+def datetime_preprocessing(path, use_cache=True, start_date=None, end_date=None):
+    if session_store.is_store_path(path):
+        return session_store.read_sessions(path, start_date, end_date)
+    cached = use_cache and os.path.isfile(path)
+    if start_date is not None and ".csv" in path and not (cached and data_cache.is_cached(path)):
+        return parse_csv_range(path, start_date, end_date)
+    if cached:
+        return sort_by_date(data_cache.load(path, parse_data_file))
+    return parse_data_file(path)
 
 # Function: sets up the deltaheatmap figure
-# Inputs: ax - matplotlib axes, df - dataframe
+# Inputs: ax - matplotlib axes, df - dataframe, renderer - str (one of RENDERERS)
 # Returns: none
 # Side Effects: modifies ax 
-def setup_performance_figure(ax, df):
+def setup_performance_figure(ax, df, renderer=DEFAULT_RENDERER):
+    colors = ["#a10202", "white", "green", "white", "orange", "white"]
+    cmap = LinearSegmentedColormap.from_list("custom_cmap", colors)
+
+    if renderer == 'fast':
+        categories = to_hour_matrix(df['Eval_Categories']).T
+        work = to_hour_matrix(df['Work_Duration']).T
+        annot = np.where((work == 0) & (categories == 6), "", work.astype(str))
+        draw_fast_heatmap(ax, categories, annot, cmap, get_date_labels(df), get_hour_labels())
+        return
+
     color_xtick_df = add_hour_labels(df, 'Eval_Categories')
     color_xytick_df = add_date_labels(df, color_xtick_df)
 
@@ -236,9 +477,6 @@ def setup_performance_figure(ax, df):
     annot_array = work_xytick_df.to_numpy()
     annot_mask = np.where((annot_array == 0) & (color_xytick_df.to_numpy() == 6), "", annot_array)
 
-    colors = ["#a10202", "white", "green", "white", "orange", "white"]
-    cmap = LinearSegmentedColormap.from_list("custom_cmap", colors)
-
     sns.heatmap(
         color_xytick_df,  # Use masked DataFrame for visualization
         ax=ax,
@@ -251,12 +489,13 @@ def setup_performance_figure(ax, df):
     )
 
 # Function: plots the performance heatmap
-# Inputs: fig - matplotlib figure, ax - matplotlib axes, performance_heatmap - dataframe
+# Inputs: fig - matplotlib figure, ax - matplotlib axes, performance_heatmap - dataframe,
+#         renderer - str (one of RENDERERS)
 # Returns: none
 # Side Effects: modifies fig, ax
-def plot_performance_heatmap(fig, ax, performance_heatmap):
+def plot_performance_heatmap(fig, ax, performance_heatmap, renderer=DEFAULT_RENDERER):
     # setup figure for plotting
-    setup_performance_figure(ax, performance_heatmap)
+    setup_performance_figure(ax, performance_heatmap, renderer)
 
     # Create custom legend labels
     legend_labels = [
@@ -277,30 +516,134 @@ def plot_performance_heatmap(fig, ax, performance_heatmap):
 
     fig.tight_layout()
 
+# Function: calculates summed up productive and goal time for plotting bar chart from the per day
+#           rollups. Only days with both productivity and goal entries are included
+# Inputs: prod_rollup - dict, goal_rollup - dict, start_date - datetime, end_date - datetime
+# Returns: dataframe
+# Side Effects: none
+def summary_from_rollups(prod_rollup, goal_rollup, start_date, end_date):
+    prod_time, prod_count = rollup_store.daily_totals(prod_rollup, start_date, end_date)
+    goal_time, goal_count = rollup_store.daily_totals(goal_rollup, start_date, end_date)
+
+    has_both = (prod_count > 0) & (goal_count > 0)
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')[has_both]
+    combined = pd.DataFrame({'Date': dates, 'Day_Name': dates.day_name(),
+                             'Prod_Time': prod_time[has_both], 'Goal_Time': goal_time[has_both]})
+
+    combined['Delta_Time'] = combined['Prod_Time'] - combined['Goal_Time']
+
+    return combined
+
 # Function: calculates summed up productive and goal time for plotting bar chart
 # Inputs: prod_df - dataframe, goal_df - dataframe, start_date - datetime, end_date - datetime
 # Returns: dataframe 
-# Side Effects: none
+# Side Effects: may update the rollup files of the data's source files
 def calc_summary_df(prod_df, goal_df, start_date, end_date):
-    filter_cols = ['Day_Name', 'Date', 'Start', 'End', 'Time']
-    prod_df = filter_by_daterange(prod_df, filter_cols, start_date, end_date)
-    goal_df = filter_by_daterange(goal_df, filter_cols, start_date, end_date)
+    return summary_from_rollups(get_range_rollup(prod_df, start_date, end_date),
+                                get_range_rollup(goal_df, start_date, end_date), start_date, end_date)
 
-    total_prod_time = prod_df.groupby(['Date', 'Day_Name']).agg({'Time':'sum'}).reset_index()
-    total_goal_time = goal_df.groupby(['Date', 'Day_Name']).agg({'Time':'sum'}).reset_index()
-    
-    combined = pd.merge(total_prod_time, total_goal_time, on=['Date','Day_Name'])
-    combined.rename(columns={'Time_x':'Prod_Time', 'Time_y':'Goal_Time'}, inplace=True)
+# Function: gets the minutes worked within every hour of every day of the date range as one
+#           contiguous days x 24 integer matrix, which is what the longer reports are built from
+# Inputs: rollup - dict, start_date - datetime, end_date - datetime
+# Returns: numpy array with shape (number of days, 24)
+# Side Effects: none
+def hours_from_rollup(rollup, start_date, end_date):
+    return rollup_store.hour_bins(rollup, start_date, end_date)
 
-    combined['Delta_Time'] = combined['Prod_Time'] - combined['Goal_Time']
+# Function: averages the minutes worked within every hour over all the days falling on the same
+#           weekday, which shrinks any date range down to a week long heatmap
+# Inputs: hours - numpy array (days x 24, see hours_from_rollup), start_date - datetime (first day of hours)
+# Returns: dataframe with the hours of the day as rows and the weekdays as columns
+# Side Effects: none
+def weekday_hour_average(hours, start_date):
+    weekdays = (np.arange(len(hours)) + start_date.weekday()) % 7
+    totals = np.zeros((7, 24))
+    np.add.at(totals, weekdays, hours)
+    average = totals / np.maximum(np.bincount(weekdays, minlength=7), 1)[:, None]
+    return pd.DataFrame(average.T, index=get_hour_labels(), columns=WEEKDAY_NAMES)
+
+# Function: lays out the hours worked on every day as a calendar, one column per week (starting
+#           on Monday) and one row per weekday. Days outside of the date range are NaN
+# Inputs: hours - numpy array (days x 24, see hours_from_rollup), start_date - datetime (first day of hours)
+# Returns: dataframe with the weekdays as rows and the week start dates (MM-DD) as columns
+# Side Effects: none
+def calendar_frame(hours, start_date):
+    offset = start_date.weekday()
+    n_weeks = -(-(offset + len(hours)) // 7)
+    grid = np.full(n_weeks * 7, np.nan)
+    grid[offset:offset + len(hours)] = hours.sum(axis=1) / 60
+
+    week_starts = pd.date_range(start_date - timedelta(days=offset), periods=n_weeks, freq='7D')
+    return pd.DataFrame(grid.reshape(n_weeks, 7).T, index=WEEKDAY_NAMES, columns=week_starts.strftime('%m-%d'))
+
+# Function: groups the days of a date range into the weeks (starting on Monday) or months they fall in
+# Inputs: dates - pandas DatetimeIndex, bucket - str ('Week' or 'Month')
+# Returns: tuple (numpy array with the bucket of every day, labels of the buckets)
+# Side Effects: none
+def get_buckets(dates, bucket):
+    codes, periods = pd.factorize(dates.to_period('M' if bucket == 'Month' else 'W-SUN'))
+    return codes, periods.strftime('%b') if bucket == 'Month' else periods.start_time.strftime('%m-%d')
+
+# Function: gets the hours spent on the subjects with the most time for every day of a week long
+#           report, or every week/month of a longer one
+# Inputs: breakdown - dict (see get_breakdown), period - str (one of report_dates.PERIODS)
+# Returns: dataframe with the days (or weeks/months) as rows and the subjects as columns
+# Side Effects: none
+def subject_hours(breakdown, period='week'):
+    names, values = session_breakdown.top_rows(breakdown['Subject'], 'by_day', BREAKDOWN_SUBJECTS, breakdown['n_days'])
 
-    return combined
+    dates = pd.date_range(start=breakdown['start_date'], end=breakdown['end_date'], freq='D')
+    if period == 'week':
+        codes, labels = np.arange(len(dates)), dates.strftime('%a %m-%d')
+    else:
+        codes, labels = get_buckets(dates, PERIOD_BUCKETS[period])
+    totals = np.zeros((len(names), len(labels)))
+    np.add.at(totals, (slice(None), codes), values)
+    return pd.DataFrame(totals.T / 60, index=list(labels), columns=names).round(2)
+
+# Function: gets the minutes spent on the types with the most time within every hour of the day
+# Inputs: breakdown - dict (see get_breakdown)
+# Returns: dataframe with the types as rows and the hours of the day as columns
+# Side Effects: none
+def type_hours(breakdown):
+    names, values = session_breakdown.top_rows(breakdown['Type'], 'by_hour', BREAKDOWN_TYPES, 24)
+    return pd.DataFrame(values, index=names, columns=get_hour_labels())
+
+# Function: lists the Subject/Type/Activity combinations with the most time, along with their
+#           share of all the time worked within the date range
+# Inputs: breakdown - dict (see get_breakdown)
+# Returns: dataframe with Activity, Subject, Type, Hours and Share (%) columns
+# Side Effects: none
+def activity_table(breakdown):
+    combos = breakdown['combos']
+    table = combos.head(ACTIVITY_ROWS)[['Activity', 'Subject', 'Type']].copy()
+    table['Hours'] = (combos['Minutes'].head(ACTIVITY_ROWS) / 60).round(1)
+    table['Share'] = (combos['Minutes'].head(ACTIVITY_ROWS) / max(combos['Minutes'].sum(), 1) * 100).round(1)
+    return table
+
+# Function: sums the productive and goal time of every week or month within the date range
+# Inputs: prod_rollup - dict, goal_rollup - dict, start_date - datetime, end_date - datetime,
+#         bucket - str ('Week' or 'Month')
+# Returns: dataframe with bucket (label), Prod_Time, Goal_Time and Delta_Time (hours) columns
+# Side Effects: none
+def period_totals(prod_rollup, goal_rollup, start_date, end_date, bucket):
+    prod_time, _ = rollup_store.daily_totals(prod_rollup, start_date, end_date)
+    goal_time, _ = rollup_store.daily_totals(goal_rollup, start_date, end_date)
+
+    codes, labels = get_buckets(pd.date_range(start=start_date, end=end_date, freq='D'), bucket)
+
+    totals = pd.DataFrame({bucket: labels,
+                           'Prod_Time': np.bincount(codes, weights=prod_time) / 60,
+                           'Goal_Time': np.bincount(codes, weights=goal_time) / 60})
+    totals['Delta_Time'] = totals['Prod_Time'] - totals['Goal_Time']
+    return totals.round(1)
 
 # Function: plots the bar chart detailing the time sums based on the day
-# Inputs: fig - matplotlib figure, matplotlib - axes, sum_data - dataframe 
+# Inputs: fig - matplotlib figure, matplotlib - axes, sum_data - dataframe,
+#         renderer - str (unused, the bar chart looks the same for every renderer)
 # Returns: none
 # Side Effects: modifies fig and ax 
-def plot_sum_data(fig, ax, sum_data):
+def plot_sum_data(fig, ax, sum_data, renderer=DEFAULT_RENDERER):
     sum_data['Short_Date'] = sum_data['Date'].dt.strftime('%m-%d') # Extract only the month and day
     sum_data['Short_Date'] = sum_data['Day_Name'] + ' ' + sum_data['Short_Date']
     sum_data.set_index('Short_Date', inplace=True)
@@ -324,46 +667,313 @@ def plot_sum_data(fig, ax, sum_data):
 
     fig.tight_layout()
 
-# Function: prepares graphs and returns a dictionary containing the fig/ax data
-# Inputs: prod_path - str, goal_path - datetime, start_date - datetime, end_date - datetime
-# Returns: dict
+# Function: plots the average minutes worked by weekday and hour heatmap of the longer reports
+# Inputs: fig - matplotlib figure, ax - matplotlib axes, df - dataframe (see weekday_hour_average),
+#         renderer - str (unused, the heatmap is always 7 days wide so it is drawn with pcolormesh)
+# Returns: none
+# Side Effects: modifies fig and ax
+def plot_weekday_hours(fig, ax, df, renderer=DEFAULT_RENDERER):
+    values = df.to_numpy().round().astype(int)
+    annot = np.where(values == 0, "", values.astype(str))
+    draw_fast_heatmap(ax, values, annot, "YlGnBu", list(df.columns), list(df.index),
+                      cbar_label='Average Work Duration (minutes)')
+
+    ax.set_title('Average Work Time by Weekday and Hour')
+    ax.set_xlabel('Day of the Week')
+    ax.set_ylabel('Hour of the Day')
+    fig.tight_layout()
+
+# Function: plots the calendar heatmap of the hours worked on every day of the longer reports
+# Inputs: fig - matplotlib figure, ax - matplotlib axes, df - dataframe (see calendar_frame),
+#         renderer - str (unused)
+# Returns: none
+# Side Effects: modifies fig and ax
+def plot_calendar(fig, ax, df, renderer=DEFAULT_RENDERER):
+    values = df.to_numpy()
+    annot = np.full(values.shape, "", dtype=object)
+    if values.shape[1] <= CALENDAR_ANNOT_WEEKS:
+        annot = np.where(np.isnan(values), "", np.char.mod('%.1f', np.nan_to_num(values))).astype(object)
+    draw_fast_heatmap(ax, values, annot, "YlGnBu", list(df.columns), list(df.index), cbar_label='Hours Worked')
+
+    ax.set_title('Daily Work Time Calendar')
+    ax.set_xlabel('Week Starting')
+    plt.setp(ax.get_xticklabels(), rotation=90 if values.shape[1] > CALENDAR_ANNOT_WEEKS else 0)
+    fig.tight_layout()
+
+# Function: plots the weekly/monthly totals bar chart of the longer reports
+# Inputs: fig - matplotlib figure, ax - matplotlib axes, totals - dataframe (see period_totals),
+#         renderer - str (unused)
+# Returns: none
+# Side Effects: modifies fig and ax
+def plot_period_totals(fig, ax, totals, renderer=DEFAULT_RENDERER):
+    bucket = totals.columns[0]
+    totals = totals.set_index(bucket)
+
+    colors = ['#12263a', '#06bcc1', '#c5d8d1']
+    bars = totals.plot(kind='bar', ax=ax, color=colors)
+    fontsize = 10 if len(totals) <= 6 else 7
+    for bar in bars.patches:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2, height + 0.1, str(round(height, 1)),
+                ha='center', va='bottom', fontsize=fontsize, rotation=0 if len(totals) <= 6 else 90)
+
+    ax.set_title('Performance Totals Bar Chart')
+    ax.set_xlabel(bucket)
+    ax.set_ylabel('Time (hours)')
+    ax.set_xticklabels(totals.index, rotation=0)
+
+    fig.tight_layout()
+
+# Function: writes a message in the middle of an empty figure, e.g. when no sessions have a Subject
+# Inputs: ax - matplotlib axes, title - str
+# Returns: none
+# Side Effects: modifies ax
+def plot_no_data(ax, title):
+    ax.set_axis_off()
+    ax.set_title(title)
+    ax.text(0.5, 0.5, "No sessions within the date range", ha='center', va='center', transform=ax.transAxes)
+
+# Function: plots the hours spent on every subject as bars stacked by subject for every day (or
+#           week/month of the longer reports)
+# Inputs: fig - matplotlib figure, ax - matplotlib axes, df - dataframe (see subject_hours),
+#         renderer - str (unused)
+# Returns: none
+# Side Effects: modifies fig and ax
+def plot_subject_hours(fig, ax, df, renderer=DEFAULT_RENDERER):
+    if df.empty or df.shape[1] == 0:
+        plot_no_data(ax, 'Time by Subject')
+        return
+
+    df.plot(kind='bar', stacked=True, ax=ax, colormap='tab10', width=0.8)
+    ax.set_title('Time by Subject')
+    ax.set_ylabel('Time (hours)')
+    ax.set_xticklabels(df.index, rotation=0 if len(df) <= 7 else 90)
+    ax.legend(loc='upper left', bbox_to_anchor=(1.0, 1.0), frameon=False)
+    fig.tight_layout()
+
+# Function: plots the minutes spent on every type within every hour of the day as a heatmap
+# Inputs: fig - matplotlib figure, ax - matplotlib axes, df - dataframe (see type_hours),
+#         renderer - str (unused, the heatmap is always 24 hours wide so it is drawn with pcolormesh)
+# Returns: none
+# Side Effects: modifies fig and ax
+def plot_type_hours(fig, ax, df, renderer=DEFAULT_RENDERER):
+    if df.empty:
+        plot_no_data(ax, 'Time by Type and Hour of the Day')
+        return
+
+    values = df.to_numpy().round().astype(int)
+    annot = np.where(values == 0, "", values.astype(str))
+    draw_fast_heatmap(ax, values, annot, "YlGnBu", list(df.columns), list(df.index),
+                      cbar_label='Work Duration (minutes)')
+
+    ax.set_title('Time by Type and Hour of the Day')
+    ax.set_xlabel('Hour of the Day')
+    plt.setp(ax.get_xticklabels(), rotation=90)
+    fig.tight_layout()
+
+# figure size and plotting function used for each of the report's graphs
+FIGURE_PLOTS = {
+    'productivity_graph': ((8, 6), plot_prod_fig),
+    'performance_graph': ((10, 8), plot_performance_heatmap),
+    'totals_graph': ((9, 7), plot_sum_data),
+}
+
+# the graphs of the month/quarter/year reports, in the same order (and page slots) as FIGURE_PLOTS
+PERIOD_PLOTS = {
+    'weekday_graph': ((8, 6), plot_weekday_hours),
+    'calendar_graph': ((10, 8), plot_calendar),
+    'period_totals_graph': ((9, 7), plot_period_totals),
+}
+
+# the Subject/Type breakdown graphs added to the last page of every report
+BREAKDOWN_PLOTS = {
+    'subject_graph': ((10, 4.5), plot_subject_hours),
+    'type_graph': ((10, 4), plot_type_hours),
+}
+
+# Function: gets the figure size and plotting function of one of the report's graphs
+# Inputs: name - str (key of FIGURE_PLOTS, PERIOD_PLOTS or BREAKDOWN_PLOTS)
+# Returns: tuple (figure size in inches, plotting function)
+# Side Effects: raises KeyError for an unknown graph
+def get_plot(name):
+    for plots in (FIGURE_PLOTS, PERIOD_PLOTS, BREAKDOWN_PLOTS):
+        if name in plots:
+            return plots[name]
+    raise KeyError(name)
+
+# how the figures are rendered and stored in the pdf for each output profile: dpi - pixels per inch
+# of the figure (per inch of the space it takes up in the pdf when downsample is set), encoding -
+# 'flate' (zlib compressed RGB at compression level 0-9), 'indexed' (a 256 color palette, zlib
+# compressed at level) or 'jpeg' (at quality 1-95). standard is what the report always used
+OUTPUT_PROFILES = {
+    'standard': {'dpi': 100, 'encoding': 'flate', 'level': 6, 'downsample': False},
+    'draft': {'dpi': 72, 'encoding': 'flate', 'level': 1, 'downsample': True},
+    'archive': {'dpi': 100, 'encoding': 'indexed', 'level': 9, 'downsample': True},
+    'print': {'dpi': 300, 'encoding': 'flate', 'level': 6, 'downsample': True},
+}
+DEFAULT_PROFILE = 'standard'
+
+# Function: gets the dpi a figure is rendered at, figures that are downsampled get the profile's
+#           dpi per inch of the width they're placed at in the pdf rather than of their own width
+# Inputs: name - str (see get_plot), output - dict (an OUTPUT_PROFILES entry,
+#         with the placed width in mm under width when downsampling)
+# Returns: float
+# Side Effects: none
+def get_figure_dpi(name, output):
+    figsize, _ = get_plot(name)
+    if output['downsample'] and output.get('width'):
+        return min(output['dpi'], output['dpi'] * output['width'] / 25.4 / figsize[0])
+    return output['dpi']
+
+# Function: creates a new figure and plots one of the report's graphs on it, the figure is
+#           closed again if plotting fails
+# Inputs: data - dataframe, name - str (see get_plot), renderer - str (one of RENDERERS),
+#         dpi - float
+# Returns: list [fig, ax]
+# Side Effects: creates a matplotlib figure
+def plot_figure(data, name, renderer=DEFAULT_RENDERER, dpi=OUTPUT_PROFILES[DEFAULT_PROFILE]['dpi']):
+    figsize, plot_func = get_plot(name)
+    fig, ax = plt.subplots(figsize=figsize, dpi=dpi)
+    try:
+        plot_func(fig, ax, data, renderer)
+    except BaseException:
+        plt.close(fig)
+        raise
+    return [fig, ax]
+
+# Function: encodes the RGB pixels of a figure the way the pdf stores them
+# Inputs: rgb - numpy array (height x width x 3 uint8), output - dict (an OUTPUT_PROFILES entry)
+# Returns: dict with cs (pdf color space), f (pdf filter), pal (palette bytes) and data (bytes) keys
+# Side Effects: none
+def encode_image(rgb, output):
+    if output['encoding'] == 'jpeg':
+        buffer = io.BytesIO()
+        Image.fromarray(rgb).save(buffer, format='JPEG', quality=output['quality'])
+        return {'cs': 'DeviceRGB', 'f': 'DCTDecode', 'pal': b'', 'data': buffer.getvalue()}
+    if output['encoding'] == 'indexed':
+        image = Image.fromarray(rgb).quantize(256, method=Image.Quantize.FASTOCTREE)
+        return {'cs': 'Indexed', 'f': 'FlateDecode', 'pal': bytes(image.getpalette()),
+                'data': zlib.compress(np.asarray(image).tobytes(), output['level'])}
+    return {'cs': 'DeviceRGB', 'f': 'FlateDecode', 'pal': b'', 'data': zlib.compress(rgb, output['level'])}
+
+# Function: draws a figure and returns its pixels encoded for the pdf
+# Inputs: fig - matplotlib figure, output - dict (an OUTPUT_PROFILES entry)
+# Returns: dict with w (int), h (int), encode_seconds (float) and the encode_image keys
+# Side Effects: attaches an Agg canvas to the figure
+def rasterize_figure(fig, output=OUTPUT_PROFILES[DEFAULT_PROFILE]):
+    canvas = FigureCanvasAgg(fig)
+    with profiler.span('draw'):
+        canvas.draw()
+    rgba = np.asarray(canvas.buffer_rgba())  # view of the rendered pixels, no copy
+
+    started = time.perf_counter()
+    with profiler.span('encode_image', rgba.shape[0]):
+        image = encode_image(np.ascontiguousarray(rgba[:, :, :3]), output)
+    return dict(image, w=rgba.shape[1], h=rgba.shape[0], encode_seconds=time.perf_counter() - started)
+
+# Function: plots one of the report's graphs and returns it as an encoded image, this is
+#           what the report pipeline runs in its worker processes. The plotting functions add
+#           label columns to their dataframe so a copy is plotted to leave the input untouched
+# Inputs: data - dataframe, name - str (see get_plot), renderer - str (one of RENDERERS),
+#         output - dict or None (an OUTPUT_PROFILES entry, see get_figure_dpi, defaults to the standard profile)
+# Returns: dict (see rasterize_figure)
+# Side Effects: none, the figure is closed before returning
+def render_figure(data, name, renderer=DEFAULT_RENDERER, output=None):
+    output = output or OUTPUT_PROFILES[DEFAULT_PROFILE]
+    with profiler.span('plot', len(data)):
+        fig, _ = plot_figure(data.copy(), name, renderer, get_figure_dpi(name, output))
+    try:
+        return rasterize_figure(fig, output)
+    finally:
+        plt.close(fig)
+
+# Function: plots one of the report's graphs as an svg drawing, used when the figures are exported
+#           on their own (see report_export) so they can be scaled to any size
+# Inputs: data - dataframe, name - str (see get_plot), renderer - str (one of RENDERERS)
+# Returns: bytes
+# Side Effects: none, the figure is closed before returning
+def render_svg(data, name, renderer=DEFAULT_RENDERER):
+    with profiler.span('plot', len(data)):
+        fig, _ = plot_figure(data.copy(), name, renderer)
+    try:
+        buffer = io.BytesIO()
+        with profiler.span('draw'):
+            fig.savefig(buffer, format='svg')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+# Function: loads the goal data file and calculates the planned time of every session
+# Inputs: goal_path - str, start_date - datetime or None, end_date - datetime or None
+#         (when given only the rows within the range are needed, see datetime_preprocessing)
+# Returns: dataframe
+# Side Effects: opens csv/xlsx file or sqlite database
+def load_goal_data(goal_path, start_date=None, end_date=None):
+    goal = datetime_preprocessing(goal_path, start_date=start_date, end_date=end_date)
+    loaded = [key for key in data_cache.LOADED_ATTRS if data_cache.is_loaded(goal, key)]
+    goal['Time'] = (goal['End'] - goal['Start']).dt.total_seconds() / 60
+    if 'source' in goal.attrs:  # Time is calculated here so keep this rollup apart from the file's own
+        goal.attrs['source'] = dict(goal.attrs['source'], variant='goal')
+    if 'store' in goal.attrs:  # the session store sums the same Start/End difference
+        goal.attrs['store'] = dict(goal.attrs['store'], variant='goal')
+    for key in loaded:  # still every loaded row, only with the Time column added
+        data_cache.mark_loaded(goal, key)
+    return goal
+
+# Function: loads the productivity and goal data files and calculates the goal time totals
+# Inputs: prod_path - str, goal_path - str, start_date - datetime or None, end_date - datetime or None
+#         (when given only the rows within the range are needed, see datetime_preprocessing)
+# Returns: tuple of dataframes (productivity data, goal data)
 # Side Effects: opens csv/xlsx file
-def prepare_graphs(prod_path, goal_path, start_date, end_date):
-    # import data from csv files into dataframes
+def load_data(prod_path, goal_path, start_date=None, end_date=None):
     # productivity data is the recorded data that I take when I work
     # goal data is the time periods when I want to work given a series of specific dates
-    productivity_event = datetime_preprocessing(prod_path)
-    goal = datetime_preprocessing(goal_path)
+    productivity_event = datetime_preprocessing(prod_path, start_date=start_date, end_date=end_date)
+    goal = load_goal_data(goal_path, start_date, end_date)
 
-    goal['Time'] = (goal['End'] - goal['Start']).dt.total_seconds() / 60
+    return productivity_event, goal
 
+# Function: prepares graphs from already loaded data and returns a dictionary containing the fig/ax data
+# Inputs: productivity_event - dataframe, goal - dataframe, start_date - datetime, end_date - datetime,
+#         progress - function taking a str or None, called with the name of each stage,
+#         renderer - str (one of RENDERERS)
+# Returns: dict
+# Side Effects: none
+def build_graphs(productivity_event, goal, start_date, end_date, progress=None, renderer=DEFAULT_RENDERER):
     # format dataframes for creating a heatmap graph for goal and prod data
-    p_heatmap = get_heatmap(productivity_event, start_date, end_date)
-    g_heatmap = get_heatmap(goal, start_date, end_date)
+    if progress: progress("Building heatmaps...")
+    prod_rollup = get_range_rollup(productivity_event, start_date, end_date)
+    goal_rollup = get_range_rollup(goal, start_date, end_date)
+    p_heatmap = heatmap_from_rollup(prod_rollup, start_date, end_date)
+    g_heatmap = heatmap_from_rollup(goal_rollup, start_date, end_date)
 
     # create performance heatmap that is calculated by subtracting goal data from prod data
     # and categorize datapoints for coloring
-    pg_df = calc_delta_heatmap(p_heatmap, g_heatmap)
-    delta_categories = delta_categorization(g_heatmap, p_heatmap)
-    performance_heatmap = pd.merge(pg_df, delta_categories, on=['Date','Day_Name'])
-
-    # some plotting prep
-    figs = {}
-    figs['productivity_figure'], ax1 = plt.subplots(figsize=(8,6))
-    figs['performance_figure'], ax2 = plt.subplots(figsize=(10,8))
-    figs['totals_figure'], ax3 = plt.subplots(figsize=(9,7))
+    performance_heatmap = delta_categorization(g_heatmap, p_heatmap)
 
     graphs = {}
-    graphs['productivity_graph'] = [figs['productivity_figure'], ax1]
-    graphs['performance_graph'] = [figs['performance_figure'], ax2]
-    graphs['totals_graph'] = [figs['totals_figure'], ax3]
+    try:
+        if progress: progress("Plotting productivity heatmap...")
+        graphs['productivity_graph'] = plot_figure(p_heatmap, 'productivity_graph', renderer)
 
-    plot_prod_fig(figs['productivity_figure'], ax1, p_heatmap)
+        # plot performance graphs
+        if progress: progress("Plotting performance heatmap...")
+        graphs['performance_graph'] = plot_figure(performance_heatmap, 'performance_graph', renderer)
 
-    # plot performance graphs
-    plot_performance_heatmap(figs['performance_figure'], ax2, performance_heatmap)
+        if progress: progress("Plotting totals bar chart...")
+        sum_data = summary_from_rollups(prod_rollup, goal_rollup, start_date, end_date)
+        graphs['totals_graph'] = plot_figure(sum_data, 'totals_graph', renderer)
+    except BaseException:
+        for fig, _ in graphs.values():
+            plt.close(fig)
+        raise
 
-    sum_data = calc_summary_df(productivity_event, goal, start_date, end_date)
-    plot_sum_data(figs['totals_figure'], ax3, sum_data)
+    return graphs
 
-    return graphs
\ No newline at end of file
+# Function: prepares graphs and returns a dictionary containing the fig/ax data
+# Inputs: prod_path - str, goal_path - datetime, start_date - datetime, end_date - datetime
+# Returns: dict
+# Side Effects: opens csv/xlsx file
+def prepare_graphs(prod_path, goal_path, start_date, end_date):
+    productivity_event, goal = load_data(prod_path, goal_path, start_date, end_date)
+    return build_graphs(productivity_event, goal, start_date, end_date)
@@ -0,0 +1,188 @@
+import os, json, hashlib, shutil
+import numpy as np
+import matplotlib
+import fpdf
+import data_cache
+
+# rendered figures and finished reports are kept next to the parsed data cache, one file per
+# content hash so identical inputs always map to the same entry
+REPORT_DIR = os.path.join(data_cache.CACHE_DIR, "reports")
+# bump when the figures or the pdf layout change so older entries stop matching
+REPORT_VERSION = 3
+# the least recently used entries are removed once the directory grows past this size
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Function: hashes the contents of a dataframe, including its column names and types and its index
+#           (which holds the row labels of e.g. the subject/type breakdowns). Columns of python objects
+#           (e.g. the hour lists of the heatmaps) are hashed by their repr
+# Inputs: sha - hashlib hash object, df - dataframe
+# Returns: none
+# Side Effects: updates sha
+def hash_frame(sha, df):
+    sha.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode("utf-8"))
+    sha.update(f"{df.index.dtype}|{df.index.tolist()!r}".encode("utf-8"))
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            sha.update(repr(values.tolist()).encode("utf-8"))
+        else:
+            sha.update(np.ascontiguousarray(values).tobytes())
+
+# Function: creates the cache key of a rendered figure from the data it plots and how it is encoded
+# Inputs: data - dataframe, name - str (see graph.get_plot), renderer - str, output - dict or None
+#         (see graph.render_figure)
+# Returns: str
+# Side Effects: none
+def figure_key(data, name, renderer, output=None):
+    settings = json.dumps(output, sort_keys=True)
+    sha = hashlib.sha256(f"{REPORT_VERSION}|{matplotlib.__version__}|{name}|{renderer}|{settings}".encode("utf-8"))
+    hash_frame(sha, data)
+    return sha.hexdigest()
+
+# Function: creates the cache key of a finished report from its figures, its tables and the pdf's
+#           title, which holds the week number and the date range. The "Generated On" line and the
+#           pdf's creation date are left out so the same figures for the same week always match
+# Inputs: images - list of dicts (see graph.rasterize_figure), pdf - fpdf.fpdf.FPDF, tables - list of dataframes
+# Returns: str
+# Side Effects: none
+def report_key(images, pdf, tables=()):
+    sha = hashlib.sha256(f"{REPORT_VERSION}|{fpdf.FPDF_VERSION}|{getattr(pdf, 'title', '')}".encode("utf-8"))
+    for image in images:
+        sha.update(f"|{image['w']}x{image['h']}|{image.get('cs')}|{image.get('f')}|".encode("utf-8"))
+        sha.update(image.get('pal', b''))
+        sha.update(image['data'])
+    for table in tables:
+        hash_frame(sha, table)
+    return sha.hexdigest()
+
+# Function: gets the path of a cache entry
+# Inputs: key - str, ext - str ('.npz' for figures, '.pdf' for reports)
+# Returns: str
+# Side Effects: none
+def get_entry_path(key, ext):
+    return os.path.join(REPORT_DIR, key + ext)
+
+# Function: marks a cache entry as just used, the modification time is what the eviction orders by
+# Inputs: path - str
+# Returns: none
+# Side Effects: updates the file's times
+def touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+# Function: removes the least recently used entries until the cache fits within max_bytes
+# Inputs: max_bytes - int
+# Returns: int - number of entries removed
+# Side Effects: deletes files within the cache directory
+def evict(max_bytes=None):
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    try:
+        entries = [(stat.st_mtime, stat.st_size, entry.path) for entry in os.scandir(REPORT_DIR)
+                   if ".tmp" not in entry.name and entry.is_file() for stat in [entry.stat()]]
+    except OSError:
+        return 0
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue  # already removed by another report
+        total -= size
+        removed += 1
+    return removed
+
+# Function: writes a cache entry, the file is replaced in one step so readers never see half of it
+# Inputs: path - str, write_func - function taking the temporary path to write to
+# Returns: none
+# Side Effects: creates the cache directory and file, may evict older entries
+def write_entry(path, write_func):
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}{os.path.splitext(path)[1]}"
+    write_func(tmp_path)
+    os.replace(tmp_path, path)
+    evict()
+
+# Function: pipeline lookup for the figure stages, gets a previously rendered figure. Nothing is
+#           encoded for a cached figure so its encode_seconds is 0
+# Inputs: data - dataframe, name - str, renderer - str, output - dict or None (the render_figure arguments)
+# Returns: dict (see graph.rasterize_figure) or None on a cache miss
+# Side Effects: reads the cache file, updates its times
+def load_figure(data, name, renderer, output=None):
+    path = get_entry_path(figure_key(data, name, renderer, output), ".npz")
+    try:
+        with np.load(path) as entry:
+            image = {'w': int(entry['w']), 'h': int(entry['h']), 'cs': str(entry['cs']), 'f': str(entry['f']),
+                     'pal': entry['pal'].tobytes(), 'data': entry['data'].tobytes(), 'encode_seconds': 0.0}
+    except (OSError, ValueError, KeyError):
+        return None
+    touch(path)
+    return image
+
+# Function: pipeline store for the figure stages, saves a rendered figure
+# Inputs: data - dataframe, name - str, renderer - str, output - dict or None, image - dict (the render_figure result)
+# Returns: none
+# Side Effects: writes the cache file
+def store_figure(data, name, renderer, output, image):
+    path = get_entry_path(figure_key(data, name, renderer, output), ".npz")
+    arrays = {'w': image['w'], 'h': image['h'], 'cs': image['cs'], 'f': image['f'],
+              'pal': np.frombuffer(image['pal'], dtype=np.uint8), 'data': np.frombuffer(image['data'], dtype=np.uint8)}
+    try:
+        write_entry(path, lambda tmp_path: np.savez(tmp_path, **arrays))
+    except OSError:
+        pass  # caching is best effort, the figure is still usable
+
+# Function: gets the path the report is saved to (see automated_report.layout_report)
+# Inputs: week_no - str, save_loc - str, naming_pattern - str
+# Returns: str
+# Side Effects: none
+def get_report_path(week_no, save_loc, naming_pattern):
+    return save_loc + "/" + naming_pattern.replace('X', week_no)
+
+# Function: pipeline lookup for the pdf stage, copies a previously generated report with the
+#           same figures and title to the save location
+# Inputs: prod_image, perf_image, totals_image, subject_image, type_image - dicts, activities -
+#         dataframe, pdf - fpdf.fpdf.FPDF, week_no - str, save_loc - str, naming_pattern - str,
+#         progress - function, captions - list (the layout_report arguments, the captions follow
+#         from the report's title)
+# Returns: str - path of the saved pdf file or None on a cache miss
+# Side Effects: creates pdf file and saves to save location, updates the cache file's times
+def load_report(prod_image, perf_image, totals_image, subject_image, type_image, activities, pdf, week_no,
+                save_loc, naming_pattern, progress, captions=None):
+    entry_path = get_entry_path(report_key([prod_image, perf_image, totals_image, subject_image, type_image], pdf,
+                                           [activities]), ".pdf")
+    if not os.path.isfile(entry_path):
+        return None
+
+    path = get_report_path(week_no, save_loc, naming_pattern)
+    try:
+        shutil.copyfile(entry_path, path)
+    except FileNotFoundError:
+        return None  # evicted since it was checked
+    touch(entry_path)
+    return path
+
+# Function: pipeline store for the pdf stage, keeps a copy of the saved report
+# Inputs: the layout_report arguments followed by path - str (its result)
+# Returns: none
+# Side Effects: writes the cache file
+def store_report(prod_image, perf_image, totals_image, subject_image, type_image, activities, pdf, week_no,
+                 save_loc, naming_pattern, progress, captions, path):
+    entry_path = get_entry_path(report_key([prod_image, perf_image, totals_image, subject_image, type_image], pdf,
+                                           [activities]), ".pdf")
+    try:
+        write_entry(entry_path, lambda tmp_path: shutil.copyfile(path, tmp_path))
+    except OSError:
+        pass
+
+# Function: removes every cached figure and report
+# Inputs: none
+# Returns: none
+# Side Effects: deletes the report cache directory
+def clear_cache():
+    shutil.rmtree(REPORT_DIR, ignore_errors=True)
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+# Function: calculates the number of weeks passed since the date
+#           stored within the starting_week argument, days before it
+#           count back into week 0, -1 and so on
+# Inputs: starting_week - str, start_date - datetime.date
+# Returns: str
+# Side Effects: none
+def calc_week_num(starting_week, start_date):
+    starting_week = datetime.strptime(starting_week, '%Y-%m-%d').date()
+    delta = (start_date - starting_week).days
+    return str(delta // 7 + 1)
+
+# Function: calculates the default date range used for a report, which is always the
+#           last full week from Monday to Sunday
+# Inputs: today - datetime.date
+# Returns: tuple of datetime.date (start date, end date)
+# Side Effects: none
+def calc_default_range(today):
+    day_n = today.weekday()
+
+    s_days = 6 if day_n == 6 else day_n + 7
+    e_days = day_n + 1
+
+    return today - timedelta(days=s_days), today - timedelta(days=e_days)
+
+# kinds of report, every kind but week covers a calendar month, quarter or year
+PERIODS = ('week', 'month', 'quarter', 'year')
+
+# Function: calculates the first and last day of the week (Monday to Sunday), month, quarter or
+#           year that contains a date
+# Inputs: period - str (one of PERIODS), day - datetime.date
+# Returns: tuple of datetime.date (start date, end date)
+# Side Effects: none
+def calc_period_range(period, day):
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+
+    months = {'month': 1, 'quarter': 3, 'year': 12}[period]
+    first_month = (day.month - 1) // months * months + 1
+    start = day.replace(month=first_month, day=1)
+    next_month = first_month + months
+    next_start = start.replace(year=start.year + 1, month=1) if next_month > 12 else start.replace(month=next_month)
+    return start, next_start - timedelta(days=1)
+
+# Function: calculates the default date range of a report, the last full period before today
+# Inputs: period - str (one of PERIODS), today - datetime.date
+# Returns: tuple of datetime.date (start date, end date)
+# Side Effects: none
+def calc_default_period_range(period, today):
+    if period == 'week':
+        return calc_default_range(today)
+    current_start, _ = calc_period_range(period, today)
+    return calc_period_range(period, current_start - timedelta(days=1))
+
+# Function: creates the label of a month/quarter/year report used in its heading and file name
+#           (in place of the week number), e.g. 2025-01, 2025-Q1 or 2025
+# Inputs: period - str ('month', 'quarter' or 'year'), start_date - datetime.date
+# Returns: str
+# Side Effects: none
+def calc_period_label(period, start_date):
+    if period == 'month':
+        return start_date.strftime('%Y-%m')
+    if period == 'quarter':
+        return f"{start_date.year}-Q{(start_date.month - 1) // 3 + 1}"
+    return str(start_date.year)
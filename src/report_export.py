@@ -0,0 +1,176 @@
+import os, io, json, zlib, base64, html
+import numpy as np
+import pandas as pd
+from PIL import Image
+from datetime import datetime
+import productivity_graphs as graph
+import report_profiler as profiler
+
+# the outputs a report can be rendered to, every output is made from the same pipeline results so
+# asking for several of them doesn't compute the report's data again. png/svg write one file per
+# figure and csv one file per table, named after the report with the figure/table name appended
+EXPORT_FORMATS = ['pdf', 'html', 'png', 'svg', 'json', 'csv']
+# the pipeline stages whose dataframes are exported to json/csv, keyed by stage name with the name
+# they are exported under and the name given to their index (None when the index is just row numbers)
+EXPORT_TABLES = {
+    'p_heatmap': ('productivity_minutes', None),
+    'performance': ('goal_differential', None),
+    'summary': ('daily_totals', None),
+    'weekday_hours': ('weekday_hours', 'Hour'),
+    'calendar': ('calendar_hours', 'Weekday'),
+    'period_totals': ('period_totals', None),
+    'subject_hours': ('subject_hours', 'Date'),
+    'type_hours': ('type_minutes', 'Type'),
+    'activity_table': ('top_activities', None),
+}
+
+# Function: gets the path every exported file starts with, the pdf's path without its extension
+# Inputs: week_no - str, save_loc - str, naming_pattern - str
+# Returns: str
+# Side Effects: none
+def get_export_base(week_no, save_loc, naming_pattern):
+    return save_loc + "/" + os.path.splitext(naming_pattern.replace('X', week_no))[0]
+
+# Function: gathers the results of several stages into one list, so a stage can depend on
+#           however many figures or tables a report has
+# Inputs: any number of stage results
+# Returns: list
+# Side Effects: none
+def gather(*results):
+    return list(results)
+
+# Function: decodes a rendered figure from the encoding the pdf stores it in
+# Inputs: image - dict (see graph.rasterize_figure)
+# Returns: PIL.Image.Image
+# Side Effects: none
+def decode_image(image):
+    if image['f'] == 'DCTDecode':
+        return Image.open(io.BytesIO(image['data']))
+    pixels = zlib.decompress(image['data'])
+    if image['cs'] == 'Indexed':
+        decoded = Image.frombytes('P', (image['w'], image['h']), pixels)
+        decoded.putpalette(image['pal'])
+        return decoded
+    return Image.frombytes('RGB', (image['w'], image['h']), pixels)
+
+# Function: converts the figures already rendered for the pdf into png files, the figures aren't
+#           plotted again so the png/html outputs match the pdf pixel for pixel
+# Inputs: images - list of dicts (see graph.rasterize_figure)
+# Returns: list of bytes
+# Side Effects: none
+def encode_pngs(images):
+    pngs = []
+    for image in images:
+        with profiler.span('encode_png', image['h']):
+            buffer = io.BytesIO()
+            decode_image(image).save(buffer, format='PNG')
+            pngs.append(buffer.getvalue())
+    return pngs
+
+# Function: turns a pipeline dataframe into a flat table for json/csv, the index is made a column,
+#           columns holding a list per row (e.g. the minutes of every hour of a heatmap) are split
+#           into one column per hour and dates are written as YYYY-MM-DD
+# Inputs: df - dataframe, index_name - str or None (see EXPORT_TABLES)
+# Returns: dataframe
+# Side Effects: none
+def flatten_table(df, index_name=None):
+    df = df.reset_index(names=index_name) if index_name else df.reset_index(drop=True)
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == object and len(values) and isinstance(values.iloc[0], (list, tuple, np.ndarray)):
+            hours = np.array(values.tolist())
+            labels = graph.get_hour_labels() if hours.shape[1] == 24 else range(hours.shape[1])
+            columns.update({f"{col} {label}": hours[:, i] for i, label in enumerate(labels)})
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            columns[col] = values.dt.strftime('%Y-%m-%d')
+        else:
+            columns[col] = values.to_numpy()
+    return pd.DataFrame(columns)
+
+# Function: flattens the report's tables and names them the way they are exported
+# Inputs: frames - list of dataframes, stage_names - list of str (the stages they came from, keys of EXPORT_TABLES)
+# Returns: dict of export name to dataframe
+# Side Effects: none
+def collect_tables(frames, stage_names):
+    return {EXPORT_TABLES[name][0]: flatten_table(frame, EXPORT_TABLES[name][1])
+            for name, frame in zip(stage_names, frames)}
+
+# Function: saves the report's tables as one json document along with its title and date range
+# Inputs: tables - dict (see collect_tables), headings - tuple of str (see automated_report.get_headings),
+#         path - str
+# Returns: list of str - path of the saved file
+# Side Effects: creates the json file
+def write_json(tables, headings, path):
+    document = {'title': headings[0], 'date_range': headings[1],
+                'generated_on': datetime.now().isoformat(timespec='seconds'),
+                'tables': {name: json.loads(table.to_json(orient='records')) for name, table in tables.items()}}
+    with profiler.span('output_json'):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(document, file, indent=1)
+    return [path]
+
+# Function: saves each of the report's tables as a csv file
+# Inputs: tables - dict (see collect_tables), base_path - str (see get_export_base)
+# Returns: list of str - paths of the saved files
+# Side Effects: creates the csv files
+def write_csv(tables, base_path):
+    paths = []
+    with profiler.span('output_csv'):
+        for name, table in tables.items():
+            paths.append(f"{base_path}_{name}.csv")
+            table.to_csv(paths[-1], index=False)
+    return paths
+
+# Function: saves each figure as a png file
+# Inputs: pngs - list of bytes (see encode_pngs), names - list of str (figure names), base_path - str
+# Returns: list of str - paths of the saved files
+# Side Effects: creates the png files
+def write_pngs(pngs, names, base_path):
+    paths = []
+    for name, png in zip(names, pngs):
+        paths.append(f"{base_path}_{name}.png")
+        with open(paths[-1], 'wb') as file:
+            file.write(png)
+    return paths
+
+# Function: plots a figure as an svg drawing and saves it, this runs in the pipeline's process pool
+#           alongside the figures rendered for the pdf
+# Inputs: data - dataframe, name - str (see graph.get_plot), renderer - str, path - str
+# Returns: str - path of the saved file
+# Side Effects: creates the svg file
+def write_svg(data, name, renderer, path):
+    svg = graph.render_svg(data, name, renderer)
+    with open(path, 'wb') as file:
+        file.write(svg)
+    return path
+
+# Function: saves the report as a single html page, the figures are embedded as png data so the
+#           page can be opened or sent on its own
+# Inputs: pngs - list of bytes (see encode_pngs), activities - dataframe (see graph.activity_table),
+#         headings - tuple of str (see automated_report.get_headings), captions - list (see
+#         automated_report.CAPTIONS, one per figure followed by the activity table's), path - str
+# Returns: list of str - path of the saved file
+# Side Effects: creates the html file
+def write_html(pngs, activities, headings, captions, path):
+    title = html.escape(headings[0])
+    parts = [f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{title}</title>\n"
+             "<style>body{font-family:Tahoma,sans-serif;max-width:1000px;margin:auto}"
+             "img{max-width:100%}p{font-family:'Times New Roman',serif}"
+             "table{border-collapse:collapse}th,td{border:1px solid #999;padding:2px 6px}</style>\n</head>\n<body>\n",
+             f"<h1>{title}</h1>\n<p>{html.escape(headings[1])}</p>\n",
+             f"<p>Generated On: {datetime.now().strftime('%A, %B %d, %Y at %I:%M %p')}</p>\n"]
+
+    for png, (heading, *description) in zip(pngs, captions):
+        parts.append(f"<h2>{html.escape(heading)}</h2>\n"
+                     f"<img src=\"data:image/png;base64,{base64.b64encode(png).decode('ascii')}\" alt=\"{html.escape(heading)}\">\n"
+                     f"<p>{html.escape(' '.join(line for line in description if line))}</p>\n")
+
+    parts.append(f"<h2>{html.escape(captions[len(pngs)][0])}</h2>\n")
+    parts.append(activities.rename(columns={'Share': 'Share (%)'}).to_html(index=False, border=0))
+    parts.append("\n</body>\n</html>\n")
+
+    with profiler.span('output_html'):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write("".join(parts))
+    return [path]
@@ -0,0 +1,323 @@
+import os, time, atexit, signal, threading
+import multiprocessing
+import matplotlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import productivity_graphs as graph
+import report_profiler as profiler
+import report_cache
+import report_export as export
+import data_validator
+
+# process pool that renders the figures, it is created on first use and kept alive so the
+# worker processes (and their imported plotting libraries) are reused by later reports
+process_pool = None
+# guards creating/stopping process_pool, team reports and the watch loop run pipelines from
+# several threads at once and each of them would otherwise start its own pool
+process_pool_lock = threading.Lock()
+# the pool is sized once, when it is created, to one worker per figure of a report or the cpu
+# count capped at this, whichever is larger. It doesn't grow with the number of reports rendered
+# at once (see team_report), those reports queue their figures on the same workers. Workers are
+# only started when there are figures waiting, so a single report never starts more than it needs
+MAX_PROCESS_WORKERS = 8
+
+# Function: sets up a figure rendering process with a headless matplotlib backend, Ctrl+C is left
+#           to the main process (e.g. to stop watch_report) which shuts the pool down itself
+# Inputs: none
+# Returns: none
+# Side Effects: switches the matplotlib backend, ignores SIGINT
+def init_render_worker():
+    matplotlib.use('Agg', force=True)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+# Function: gets the shared process pool, creating it the first time it is needed. The pool is
+#           created while other stages are running on threads, so workers are started from a
+#           forkserver (or spawned) rather than forked from this process, which could copy a lock
+#           held by one of those threads and deadlock
+# Inputs: none
+# Returns: ProcessPoolExecutor
+# Side Effects: may start the pool and register its shutdown at exit
+def get_process_pool():
+    global process_pool
+    with process_pool_lock:
+        if process_pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['report_pipeline'])  # workers start with the plotting modules loaded
+            else:
+                context = multiprocessing.get_context('spawn')
+            workers = max(len(graph.FIGURE_PLOTS), min(os.cpu_count() or 1, MAX_PROCESS_WORKERS))
+            process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                               initializer=init_render_worker)
+            atexit.register(shutdown_pool)
+        return process_pool
+
+# Function: stops the shared process pool
+# Inputs: none
+# Returns: none
+# Side Effects: shuts down the worker processes
+def shutdown_pool():
+    global process_pool
+    with process_pool_lock:
+        if process_pool is not None:
+            process_pool.shutdown(cancel_futures=True)
+            process_pool = None
+
+# Function: calls a stage's function and measures its wall/cpu time and the rows it produced, when
+#           profiling the spans recorded within the stage are collected too. This runs wherever the
+#           stage runs (thread or worker process) so the cpu time is the stage's own
+# Inputs: func - function, args - list, profile - bool
+# Returns: tuple (result, timing dict with start as a unix timestamp)
+# Side Effects: whatever the stage function does
+def timed_call(func, args, profile=False):
+    if profile:
+        profiler.start_collecting()
+    start = time.time()
+    clock, cpu = time.perf_counter(), time.thread_time()
+    try:
+        result = func(*args)
+    finally:
+        spans = profiler.stop_collecting() if profile else []
+
+    return result, {'start': start, 'seconds': time.perf_counter() - clock, 'cpu': time.thread_time() - cpu,
+                    'rows': profiler.count_rows(result), 'pid': os.getpid(), 'tid': threading.get_ident(),
+                    'spans': spans}
+
+# Function: runs a graph of named stages, each stage starts as soon as the stages it depends on
+#           are finished so independent stages overlap. Stages are dicts with the keys
+#             func  - function called with the results of deps followed by args
+#             deps  - list of stage names (or names within initial) the stage needs
+#             args  - tuple of extra arguments (optional)
+#             mode  - 'thread' or 'process', where the stage runs when parallel (optional)
+#             label - progress message shown when the stage starts (optional)
+#             lookup - function called with the stage's arguments before it runs, a result other
+#                      than None is used instead of running the stage (optional)
+#             store  - function called with the stage's arguments and its result after it ran (optional)
+# Inputs: stages - dict of stage name to stage dict, initial - dict of already known results (stages
+#         with the same name are skipped),
+#         parallel - bool (False runs every stage in order on the calling thread),
+#         progress - function taking a str or None, profile - bool (also time the spans within stages)
+# Returns: tuple (dict of stage name to result, dict of stage name to timing dict). Timing dicts hold
+#          start (seconds since the run started), seconds, cpu, rows, mode ('cache' when the stage
+#          was looked up), pid, tid and spans
+# Side Effects: runs the stage functions on threads/processes, calls progress, lookup and store
+def run_stages(stages, initial=None, parallel=True, progress=None, profile=False):
+    results = dict(initial or {})
+    timings = {}
+    pending = {name: stage for name, stage in stages.items() if name not in results}
+    running = {}
+    stage_args = {}
+    run_start = time.time()
+    threads = ThreadPoolExecutor(max_workers=4) if parallel else None
+
+    # Function: stores the result and timing of a finished stage, times are made relative to the run
+    def finish(name, result, timing, mode=None):
+        results[name] = result
+        timing['start'] -= run_start
+        for record in timing['spans']:
+            record['start'] -= run_start
+        timing['mode'] = mode or (stages[name].get('mode', 'thread') if parallel else 'main')
+        timings[name] = timing
+        if mode is None and stages[name].get('store'):
+            stages[name]['store'](*stage_args[name], result)
+
+    try:
+        while pending or running:
+            ready = [name for name, stage in pending.items() if all(dep in results for dep in stage['deps'])]
+            if not ready and not running:
+                raise ValueError(f"Stages with missing dependencies: {', '.join(pending)}")
+
+            for name in ready:
+                stage = pending.pop(name)
+                if progress and stage.get('label'):
+                    progress(stage['label'])
+
+                args = stage_args[name] = [results[dep] for dep in stage['deps']] + list(stage.get('args', ()))
+                if stage.get('lookup'):
+                    result, timing = timed_call(stage['lookup'], args, profile)
+                    if result is not None:
+                        finish(name, result, timing, 'cache')
+                        continue
+
+                if not parallel:
+                    finish(name, *timed_call(stage['func'], args, profile))
+                    continue
+
+                executor = get_process_pool() if stage.get('mode') == 'process' else threads
+                running[executor.submit(timed_call, stage['func'], args, profile)] = name
+
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(running.pop(future), *future.result())
+    finally:
+        for future in running:
+            future.cancel()
+        if threads:
+            threads.shutdown(wait=True, cancel_futures=True)
+
+    return results, timings
+
+# Function: creates the stages that load the productivity and goal data files in parallel
+# Inputs: prod_path - str, goal_path - str, start_date - datetime or None, end_date - datetime or None
+#         (when given only the rows within the range are needed)
+# Returns: dict of stages producing the 'prod' and 'goal' dataframes
+# Side Effects: none
+def load_stages(prod_path, goal_path, start_date=None, end_date=None):
+    return {
+        'prod': {'func': graph.datetime_preprocessing, 'deps': [], 'args': (prod_path, True, start_date, end_date),
+                 'label': "Loading productivity data..."},
+        'goal': {'func': graph.load_goal_data, 'deps': [], 'args': (goal_path, start_date, end_date),
+                 'label': "Loading goal data..."},
+    }
+
+# Function: creates the stages that roll up the date range of the 'prod' and 'goal' dataframes
+# Inputs: start_date - datetime, end_date - datetime
+# Returns: dict of stages producing the 'prod_rollup' and 'goal_rollup' rollups
+# Side Effects: none
+def rollup_stages(start_date, end_date):
+    return {
+        'prod_rollup': {'func': graph.get_range_rollup, 'deps': ['prod'], 'args': (start_date, end_date),
+                        'label': "Building heatmaps..."},
+        'goal_rollup': {'func': graph.get_range_rollup, 'deps': ['goal'], 'args': (start_date, end_date)},
+    }
+
+# Function: creates the stages of the Subject/Type/Activity breakdown page, the time worked is broken
+#           down once from the 'prod' dataframe (or taken from a 'breakdown' passed in, e.g. by
+#           team_report) and shared by the subject/type graphs and the activity table
+# Inputs: start_date - datetime, end_date - datetime, period - str (one of report_dates.PERIODS),
+#         renderer - str, use_cache - bool, outputs - dict or None (see graph_stages)
+# Returns: dict of stages, the figure stages are named after the keys of graph.BREAKDOWN_PLOTS and
+#          the table stage is 'activity_table'
+# Side Effects: none
+def breakdown_stages(start_date, end_date, period='week', renderer=graph.DEFAULT_RENDERER, use_cache=True,
+                     outputs=None):
+    outputs = outputs or {}
+    return {
+        'breakdown': {'func': graph.get_breakdown, 'deps': ['prod'], 'args': (start_date, end_date),
+                      'label': "Breaking down time by subject..."},
+        'subject_hours': {'func': graph.subject_hours, 'deps': ['breakdown'], 'args': (period,)},
+        'type_hours': {'func': graph.type_hours, 'deps': ['breakdown']},
+        'activity_table': {'func': graph.activity_table, 'deps': ['breakdown']},
+        'subject_graph': figure_stage('subject_graph', 'subject_hours', renderer, use_cache,
+                                      "Plotting subject bar chart...", outputs.get('subject_graph')),
+        'type_graph': figure_stage('type_graph', 'type_hours', renderer, use_cache,
+                                   "Plotting type heatmap...", outputs.get('type_graph')),
+    }
+
+# Function: creates the stages that check the sessions of the 'prod' and 'goal' dataframes within
+#           the date range for rows that are left out of or misplaced on the report (see data_validator),
+#           they run alongside the rollups and nothing else waits for them
+# Inputs: start_date - datetime, end_date - datetime
+# Returns: dict of stages producing the 'prod_issues' and 'goal_issues' validation reports
+# Side Effects: none
+def validation_stages(start_date, end_date):
+    return {
+        'prod_issues': {'func': data_validator.validate_sessions, 'deps': ['prod'], 'args': (start_date, end_date),
+                        'label': "Checking data..."},
+        'goal_issues': {'func': data_validator.validate_sessions, 'deps': ['goal'],
+                        'args': (start_date, end_date, False)},
+    }
+
+# Function: creates the stage that renders one of the report's figures in the process pool,
+#           unless the same figure was already rendered from the same data (see report_cache)
+# Inputs: name - str (see graph.get_plot), dep - str (stage producing the figure's data), renderer - str,
+#         use_cache - bool, label - str, output - dict or None (how the figure is rendered and encoded,
+#         see graph.render_figure)
+# Returns: dict - stage
+# Side Effects: none
+def figure_stage(name, dep, renderer, use_cache, label, output=None):
+    stage = {'func': graph.render_figure, 'deps': [dep], 'args': (name, renderer, output), 'mode': 'process',
+             'label': label}
+    if use_cache:
+        stage.update(lookup=report_cache.load_figure, store=report_cache.store_figure)
+    return stage
+
+# Function: creates the stages that turn the 'prod' and 'goal' dataframes into the report's
+#           rendered figures, each dataframe's date range is rolled up once and shared by the
+#           heatmap and summary stages, and the three figures are rendered in the process pool
+#           unless the same figure was already rendered from the same data (see report_cache)
+# Inputs: start_date - datetime, end_date - datetime, renderer - str (one of graph.RENDERERS),
+#         use_cache - bool, outputs - dict of figure name to output dict (see figure_stage) or None
+# Returns: dict of stages, the figure stages are named after the keys of graph.FIGURE_PLOTS
+# Side Effects: none
+def graph_stages(start_date, end_date, renderer=graph.DEFAULT_RENDERER, use_cache=True, outputs=None):
+    outputs = outputs or {}
+    return dict(rollup_stages(start_date, end_date), **{
+        'p_heatmap': {'func': graph.heatmap_from_rollup, 'deps': ['prod_rollup'], 'args': (start_date, end_date)},
+        'g_heatmap': {'func': graph.heatmap_from_rollup, 'deps': ['goal_rollup'], 'args': (start_date, end_date)},
+        'performance': {'func': graph.delta_categorization, 'deps': ['g_heatmap', 'p_heatmap']},
+        'summary': {'func': graph.summary_from_rollups, 'deps': ['prod_rollup', 'goal_rollup'],
+                    'args': (start_date, end_date)},
+        'productivity_graph': figure_stage('productivity_graph', 'p_heatmap', renderer, use_cache,
+                                           "Plotting productivity heatmap...", outputs.get('productivity_graph')),
+        'performance_graph': figure_stage('performance_graph', 'performance', renderer, use_cache,
+                                          "Plotting performance heatmap...", outputs.get('performance_graph')),
+        'totals_graph': figure_stage('totals_graph', 'summary', renderer, use_cache, "Plotting totals bar chart...",
+                                     outputs.get('totals_graph')),
+    })
+
+# Function: creates the stages of the month/quarter/year reports. The range is rolled up into one
+#           contiguous days x 24 matrix which is shrunk down to a weekday by hour average and a
+#           calendar of daily totals, so the figures stay the same size however long the range is
+# Inputs: start_date - datetime, end_date - datetime, period - str ('month', 'quarter' or 'year'),
+#         renderer - str, use_cache - bool, outputs - dict or None (see graph_stages)
+# Returns: dict of stages, the figure stages are named after the keys of graph.PERIOD_PLOTS
+# Side Effects: none
+def period_stages(start_date, end_date, period, renderer=graph.DEFAULT_RENDERER, use_cache=True, outputs=None):
+    outputs = outputs or {}
+    return dict(rollup_stages(start_date, end_date), **{
+        'prod_hours': {'func': graph.hours_from_rollup, 'deps': ['prod_rollup'], 'args': (start_date, end_date)},
+        'weekday_hours': {'func': graph.weekday_hour_average, 'deps': ['prod_hours'], 'args': (start_date,)},
+        'calendar': {'func': graph.calendar_frame, 'deps': ['prod_hours'], 'args': (start_date,)},
+        'period_totals': {'func': graph.period_totals, 'deps': ['prod_rollup', 'goal_rollup'],
+                          'args': (start_date, end_date, graph.PERIOD_BUCKETS[period])},
+        'weekday_graph': figure_stage('weekday_graph', 'weekday_hours', renderer, use_cache,
+                                      "Plotting weekday heatmap...", outputs.get('weekday_graph')),
+        'calendar_graph': figure_stage('calendar_graph', 'calendar', renderer, use_cache,
+                                       "Plotting calendar heatmap...", outputs.get('calendar_graph')),
+        'period_totals_graph': figure_stage('period_totals_graph', 'period_totals', renderer, use_cache,
+                                            "Plotting totals bar chart...", outputs.get('period_totals_graph')),
+    })
+
+# Function: creates the stages that export the report to the formats besides its pdf (see
+#           report_export). They only depend on results every report computes anyway, the figures
+#           rendered for the pdf and the dataframes they were plotted from, so all the formats are
+#           written at the same time and nothing is computed twice. Only the svg drawings are
+#           plotted again, in the process pool
+# Inputs: formats - list of str (see report_export.EXPORT_FORMATS), figure_data - dict of figure name to
+#         the stage producing its data, tables - list of str (stages exported to json/csv, keys of
+#         report_export.EXPORT_TABLES), headings - tuple of str (see automated_report.get_headings),
+#         captions - list (see automated_report.CAPTIONS), base_path - str (see report_export.get_export_base),
+#         renderer - str (one of graph.RENDERERS)
+# Returns: dict of stages, the files of each format are the result of its 'export_<format>' stage
+# Side Effects: none
+def export_stages(formats, figure_data, tables, headings, captions, base_path, renderer=graph.DEFAULT_RENDERER):
+    figures = list(figure_data)
+    stages = {}
+    if 'png' in formats or 'html' in formats:
+        stages['figure_images'] = {'func': export.gather, 'deps': figures}
+        stages['png_images'] = {'func': export.encode_pngs, 'deps': ['figure_images'],
+                                'label': "Encoding png figures..."}
+    if 'png' in formats:
+        stages['export_png'] = {'func': export.write_pngs, 'deps': ['png_images'], 'args': (figures, base_path)}
+    if 'html' in formats:
+        stages['export_html'] = {'func': export.write_html, 'deps': ['png_images', 'activity_table'],
+                                 'args': (headings, captions, base_path + ".html"), 'label': "Saving HTML..."}
+
+    if 'json' in formats or 'csv' in formats:
+        stages['table_frames'] = {'func': export.gather, 'deps': tables}
+        stages['tables'] = {'func': export.collect_tables, 'deps': ['table_frames'], 'args': (tables,)}
+    if 'json' in formats:
+        stages['export_json'] = {'func': export.write_json, 'deps': ['tables'], 'args': (headings, base_path + ".json"),
+                                 'label': "Saving JSON..."}
+    if 'csv' in formats:
+        stages['export_csv'] = {'func': export.write_csv, 'deps': ['tables'], 'args': (base_path,),
+                                'label': "Saving CSV tables..."}
+
+    if 'svg' in formats:
+        for name, dep in figure_data.items():
+            stages[name + '_svg'] = {'func': export.write_svg, 'deps': [dep], 'mode': 'process',
+                                     'args': (name, renderer, f"{base_path}_{name}.svg"),
+                                     'label': "Plotting svg figures..."}
+        stages['export_svg'] = {'func': export.gather, 'deps': [name + '_svg' for name in figures]}
+    return stages
@@ -0,0 +1,104 @@
+import os, json, time, threading
+from contextlib import contextmanager
+
+# spans recorded by the stage currently running on each thread, None when profiling is off
+local = threading.local()
+
+# Function: starts collecting the spans recorded on the calling thread
+# Inputs: none
+# Returns: none
+# Side Effects: modifies the thread's span list
+def start_collecting():
+    local.spans = []
+
+# Function: stops collecting spans on the calling thread
+# Inputs: none
+# Returns: list of span dicts recorded since start_collecting
+# Side Effects: modifies the thread's span list
+def stop_collecting():
+    spans = getattr(local, 'spans', None)
+    local.spans = None
+    return spans or []
+
+# Function: measures a step within a pipeline stage when profiling is on, it does nothing
+#           otherwise. The yielded dict can be given a row count once it is known, e.g.
+#             with report_profiler.span('parse_times') as record: ... record['rows'] = len(df)
+# Inputs: name - str, rows - int or None
+# Returns: context manager yielding the span dict
+# Side Effects: appends the span to the thread's span list
+@contextmanager
+def span(name, rows=None):
+    record = {'name': name, 'rows': rows}
+    spans = getattr(local, 'spans', None)
+    if spans is None:
+        yield record
+        return
+
+    record['start'] = time.time()
+    clock, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - clock
+        record['cpu'] = time.thread_time() - cpu
+        spans.append(record)
+
+# Function: gets the number of rows of a stage's result (dataframes, arrays and rollups)
+# Inputs: result - any
+# Returns: int or None
+# Side Effects: none
+def count_rows(result):
+    if isinstance(result, dict) and 'count' in result:  # per day rollup
+        return len(result['count'])
+    shape = getattr(result, 'shape', None)
+    return shape[0] if shape else None
+
+# Function: gets the total time taken by the stages, from the first start to the last finish
+# Inputs: timings - dict of stage name to timing dict (see report_pipeline.run_stages)
+# Returns: float - seconds
+# Side Effects: none
+def total_seconds(timings):
+    return max((timing['start'] + timing['seconds'] for timing in timings.values()), default=0.0)
+
+# Function: creates the one line timing summary shown in the GUI, the total time followed by the
+#           slowest stages
+# Inputs: timings - dict, top - int (number of stages listed)
+# Returns: str
+# Side Effects: none
+def summarize(timings, top=3):
+    slowest = sorted(timings.items(), key=lambda item: item[1]['seconds'], reverse=True)[:top]
+    stages = ", ".join(f"{name} {timing['seconds']:.2f}s" for name, timing in slowest)
+    return f"{total_seconds(timings):.2f}s total, slowest: {stages}"
+
+# Function: converts the stage timings into Chrome's trace event format so the trace can be
+#           opened in chrome://tracing or Perfetto, stages and their spans become nested events
+# Inputs: timings - dict
+# Returns: dict
+# Side Effects: none
+def to_chrome_trace(timings):
+    events = []
+    for name, timing in timings.items():
+        ids = {'pid': timing.get('pid', 0), 'tid': timing.get('tid', 0)}
+        events.append(dict(ids, name=name, cat=timing['mode'], ph='X', ts=timing['start'] * 1e6,
+                           dur=timing['seconds'] * 1e6, args={'cpu': timing['cpu'], 'rows': timing['rows']}))
+        for record in timing.get('spans', []):
+            events.append(dict(ids, name=record['name'], cat='span', ph='X',
+                               ts=record['start'] * 1e6, dur=record['seconds'] * 1e6,
+                               args={'cpu': record['cpu'], 'rows': record['rows'], 'stage': name}))
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+# Function: saves the stage timings of a report as a json trace file
+# Inputs: timings - dict, path - str,
+#         trace_format - str ('json' for the timings as is, 'chrome' for Chrome's trace format)
+# Returns: none
+# Side Effects: creates/overwrites the trace file
+def write_trace(timings, path, trace_format='json'):
+    if trace_format == 'chrome':
+        trace = to_chrome_trace(timings)
+    else:
+        trace = {'total_seconds': total_seconds(timings), 'stages': timings}
+
+    tmp_path = path + f".tmp{os.getpid()}"
+    with open(tmp_path, "w") as my_file:
+        json.dump(trace, my_file, indent=1)
+    os.replace(tmp_path, path)
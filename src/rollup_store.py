@@ -0,0 +1,332 @@
+import os, json, hashlib, threading
+import numpy as np
+import pandas as pd
+import data_cache
+import report_profiler as profiler
+
+# the per day rollups are kept next to the parsed data cache, one file per source data file
+ROLLUP_DIR = os.path.join(data_cache.CACHE_DIR, "rollups")
+ROLLUP_VERSION = 1
+MINUTES_PER_DAY = 24 * 60
+
+# rollups already loaded/updated by this process, keyed the same way as the rollup files
+rollups = {}
+rollups_lock = threading.Lock()
+
+# Function: converts the Start/End timestamps of every session into integer minute
+#           offsets measured from midnight of the session's date, sessions whose End
+#           is earlier than their Start are treated as crossing midnight
+# Inputs: df - dataframe
+# Returns: tuple of numpy arrays (start minutes, end minutes)
+# Side Effects: none
+def session_minutes(df):
+    start, end = df['Start'].to_numpy(), df['End'].to_numpy()
+    start_min = (start - start.astype('datetime64[D]')).astype('timedelta64[m]').astype(np.int64)
+    end_min = (end - end.astype('datetime64[D]')).astype('timedelta64[m]').astype(np.int64)
+    end_min = np.where(end_min < start_min, end_min + MINUTES_PER_DAY, end_min)
+    return start_min, end_min
+
+# Function: extracts what the rollup needs from every row of a data frame, along with a
+#           fingerprint of the row used to find the rows that were added or removed later on
+# Inputs: df - dataframe with Date, Start, End and (optionally) Time columns
+# Returns: dict of equal length numpy arrays (fp, day, start, end, time, timed)
+# Side Effects: none
+def row_values(df):
+    df = df[df['Date'].notna()]
+    columns = [col for col in ('Date', 'Start', 'End', 'Time') if col in df]
+    start_min, end_min = session_minutes(df)
+
+    timed = ~(np.isnat(df['Start'].to_numpy()) | np.isnat(df['End'].to_numpy()))
+    return {
+        'fp': pd.util.hash_pandas_object(df[columns], index=False).to_numpy(dtype=np.uint64),
+        'day': df['Date'].to_numpy(dtype='datetime64[D]').astype(np.int64),
+        'start': np.where(timed, start_min, 0),
+        'end': np.where(timed, end_min, 0),
+        'time': np.nan_to_num(df['Time'].to_numpy(dtype=np.float64)) if 'Time' in df else np.zeros(len(df)),
+        'timed': timed,
+    }
+
+# Function: selects a subset of the rows returned by row_values
+# Inputs: rows - dict of numpy arrays, idx - numpy array of indices
+# Returns: dict of numpy arrays
+# Side Effects: none
+def take_rows(rows, idx):
+    return {key: values[idx] for key, values in rows.items()}
+
+# Function: creates a rollup that doesn't contain any rows yet
+# Inputs: none
+# Returns: dict
+# Side Effects: none
+def empty_rollup():
+    rows = {'fp': np.zeros(0, dtype=np.uint64), 'day': np.zeros(0, dtype=np.int64),
+            'start': np.zeros(0, dtype=np.int64), 'end': np.zeros(0, dtype=np.int64),
+            'time': np.zeros(0), 'timed': np.zeros(0, dtype=bool)}
+    return {'token': None, 'first_day': 0, 'bins': np.zeros((0, 24), dtype=np.int64), 'time': np.zeros(0),
+            'count': np.zeros(0, dtype=np.int64), 'has_time': False, 'int_time': False, 'rows': rows}
+
+# Function: accumulates the minutes worked within every hour of every day for a set of rows in
+#           one batched pass, each session adds +1/-1 to a flat minute level difference array
+#           which is summed back up into a days x 24 matrix. Sessions that cross midnight spill
+#           into the following day's row, so n_days should cover one day past the last row
+# Inputs: rows - dict of numpy arrays (see row_values), first_day - int (days since the epoch),
+#         n_days - int
+# Returns: numpy array with shape (n_days, 24)
+# Side Effects: none
+def bin_rows(rows, first_day, n_days):
+    day_idx = rows['day'][rows['timed']] - first_day
+    base = day_idx * MINUTES_PER_DAY
+
+    length = n_days * MINUTES_PER_DAY + 1
+    diff = (np.bincount(base + rows['start'][rows['timed']], minlength=length)
+            - np.bincount(base + rows['end'][rows['timed']], minlength=length))
+    minutes = np.cumsum(diff[:-1]).reshape(n_days, MINUTES_PER_DAY)
+
+    return minutes.reshape(n_days, 24, 60).sum(axis=2)
+
+# Function: adds (sign 1) or removes (sign -1) the work time of a set of rows to/from the rollup
+#           arrays, only the span of days covered by the rows is binned
+# Inputs: state - dict (bins/time/count are modified), rows - dict of numpy arrays, sign - int
+# Returns: none
+# Side Effects: modifies the arrays of state
+def apply_rows(state, rows, sign):
+    if len(rows['day']) == 0:
+        return
+
+    lo, hi = rows['day'].min(), rows['day'].max() + 2  # + 1 row for spill past midnight
+    offset = lo - state['first_day']
+    state['bins'][offset:offset + hi - lo] += sign * bin_rows(rows, lo, hi - lo)
+
+    day_idx = rows['day'] - state['first_day']
+    state['time'] += sign * np.bincount(day_idx, weights=rows['time'], minlength=len(state['time']))
+    state['count'] += sign * np.bincount(day_idx, minlength=len(state['count']))
+
+# Function: works out which rows were added and removed between two versions of the data by
+#           comparing their fingerprints, identical rows are matched up by how often they occur
+# Inputs: old_fp - numpy array, new_fp - numpy array
+# Returns: tuple of numpy arrays (indices of added rows in new, indices of removed rows in old)
+# Side Effects: none
+def diff_rows(old_fp, new_fp):
+    fps, inverse = np.unique(np.concatenate([old_fp, new_fp]), return_inverse=True)
+    old_inv, new_inv = inverse[:len(old_fp)], inverse[len(old_fp):]
+    delta = np.bincount(new_inv, minlength=len(fps)) - np.bincount(old_inv, minlength=len(fps))
+
+    # any row with a given fingerprint can stand in for the others since their values match
+    new_row = np.zeros(len(fps), dtype=np.int64)
+    new_row[new_inv] = np.arange(len(new_fp))
+    old_row = np.zeros(len(fps), dtype=np.int64)
+    old_row[old_inv] = np.arange(len(old_fp))
+
+    added, removed = delta > 0, delta < 0
+    return np.repeat(new_row[added], delta[added]), np.repeat(old_row[removed], -delta[removed])
+
+# Function: rolls up the rows of several groups (e.g. people) at once, every group gets its own
+#           block of days within the same difference array so all of them are binned in one pass
+#           over the rows rather than one pass per group
+# Inputs: df - dataframe, groups - numpy array of ints (group of every row, rows of group -1 are
+#         skipped), n_groups - int
+# Returns: list of dicts, one rollup per group (see empty_rollup) without the fingerprinted rows
+# Side Effects: none
+def grouped_rollups(df, groups, n_groups):
+    keep = df['Date'].notna().to_numpy() & (groups >= 0)
+    df, groups = df[keep], groups[keep]
+    if len(df) == 0:
+        return [dict(empty_rollup(), rows=None) for _ in range(n_groups)]
+
+    rows = row_values(df)
+    first_day = rows['day'].min()
+    n_days = rows['day'].max() - first_day + 2  # + 1 row for spill past midnight
+    rows['day'] = groups * n_days + rows['day'] - first_day
+
+    length = n_groups * n_days
+    bins = bin_rows(rows, 0, length).reshape(n_groups, n_days, 24)
+    time = np.bincount(rows['day'], weights=rows['time'], minlength=length).reshape(n_groups, n_days)
+    count = np.bincount(rows['day'], minlength=length).reshape(n_groups, n_days)
+
+    has_time = 'Time' in df
+    int_time = has_time and pd.api.types.is_integer_dtype(df['Time'])
+    return [{'token': None, 'first_day': int(first_day), 'bins': bins[group], 'time': time[group],
+             'count': count[group], 'has_time': has_time, 'int_time': int_time, 'rows': None}
+            for group in range(n_groups)]
+
+# Function: folds a new version of the data into a rollup, only the rows that changed are
+#           binned and the rollup is grown when the data covers new days
+# Inputs: state - dict (not modified), df - dataframe
+# Returns: dict - the updated rollup
+# Side Effects: none
+def fold(state, df):
+    rows = row_values(df)
+    added, removed = diff_rows(state['rows']['fp'], rows['fp'])
+    added, removed = take_rows(rows, added), take_rows(state['rows'], removed)
+
+    first_day, last_day = state['first_day'], state['first_day'] + len(state['count'])
+    if len(added['day']):
+        if len(state['count']) == 0:
+            first_day, last_day = added['day'].min(), added['day'].min()
+        first_day = min(first_day, added['day'].min())
+        last_day = max(last_day, added['day'].max() + 2)
+
+    offset = state['first_day'] - first_day
+    new_state = {
+        'token': None,
+        'first_day': int(first_day),
+        'bins': np.zeros((last_day - first_day, 24), dtype=np.int64),
+        'time': np.zeros(last_day - first_day),
+        'count': np.zeros(last_day - first_day, dtype=np.int64),
+        'has_time': 'Time' in df,
+        'int_time': 'Time' in df and pd.api.types.is_integer_dtype(df['Time']),
+        'rows': rows,
+    }
+    for key in ('bins', 'time', 'count'):
+        new_state[key][offset:offset + len(state[key])] = state[key]
+
+    apply_rows(new_state, removed, -1)
+    apply_rows(new_state, added, 1)
+    return new_state
+
+# Function: slices the rows of a rollup array covering the date range, days outside of the
+#           rollup are filled with zeros
+# Inputs: state - dict, key - str (bins, time or count), start_date - datetime, end_date - datetime
+# Returns: numpy array
+# Side Effects: none
+def slice_days(state, key, start_date, end_date):
+    start_day = pd.Timestamp(start_date).to_datetime64().astype('datetime64[D]').astype(np.int64)
+    n_days = (end_date - start_date).days + 1
+    values = state[key]
+
+    out = np.zeros((n_days,) + values.shape[1:], dtype=values.dtype)
+    lo = max(start_day, state['first_day'])
+    hi = min(start_day + n_days, state['first_day'] + len(values))
+    if lo < hi:
+        out[lo - start_day:hi - start_day] = values[lo - state['first_day']:hi - state['first_day']]
+    return out
+
+# Function: gets the minutes worked within every hour of every day of the date range
+# Inputs: state - dict, start_date - datetime, end_date - datetime
+# Returns: numpy array with shape (number of days, 24)
+# Side Effects: none
+def hour_bins(state, start_date, end_date):
+    return slice_days(state, 'bins', start_date, end_date).astype(int)
+
+# Function: gets the summed Time column and the number of rows of every day of the date range
+# Inputs: state - dict, start_date - datetime, end_date - datetime
+# Returns: tuple of numpy arrays (time totals, row counts)
+# Side Effects: raises KeyError if the data has no Time column
+def daily_totals(state, start_date, end_date):
+    if not state['has_time'] and state['count'].any():
+        raise KeyError('Time')
+
+    time = slice_days(state, 'time', start_date, end_date)
+    if state['int_time']:
+        time = np.rint(time).astype(np.int64)  # removed rows can leave float rounding residue
+    return time, slice_days(state, 'count', start_date, end_date)
+
+# Function: gets the path of the rollup file of a source data file, the fingerprinted rows are
+#           kept in a second file next to it (see get_rows_path)
+# Inputs: source - dict with path and (optionally) variant keys
+# Returns: str
+# Side Effects: none
+def get_rollup_path(source):
+    key = f"{source['path']}|{source.get('variant', '')}"
+    return os.path.join(ROLLUP_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npz")
+
+# Function: gets the path of the file holding the fingerprinted rows of a rollup, they are only
+#           needed when the source file changed so they aren't read along with the day totals
+# Inputs: path - str (see get_rollup_path)
+# Returns: str
+# Side Effects: none
+def get_rows_path(path):
+    return path[:-len(".npz")] + ".rows.npz"
+
+# Function: saves numpy arrays to a .npz file, the file is replaced in one step so readers
+#           never see half of it
+# Inputs: path - str, arrays - numpy arrays passed as keyword arguments
+# Returns: none
+# Side Effects: creates/overwrites the file
+def save_arrays(path, **arrays):
+    tmp_path = path + f".tmp{os.getpid()}.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+# Function: reads the day totals of a stored rollup, the rows are left unloaded (None)
+# Inputs: path - str
+# Returns: dict or None if the file does not exist or can't be read
+# Side Effects: reads the rollup file
+def read_rollup(path):
+    try:
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != ROLLUP_VERSION:
+                return None
+            return dict(meta, bins=data['bins'], time=data['time'], count=data['count'], rows=None)
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Function: reads the fingerprinted rows of a stored rollup
+# Inputs: path - str (see get_rollup_path), token - str (token of the rollup the rows belong to)
+# Returns: dict of numpy arrays or None if the file is missing or belongs to another rollup
+# Side Effects: reads the rows file
+def read_rows(path, token):
+    try:
+        with np.load(get_rows_path(path)) as data:
+            if str(data['token']) != token:
+                return None
+            return {key: data[key] for key in data.files if key != 'token'}
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Function: writes a rollup, the rows are written first so the day totals are never newer than them
+# Inputs: path - str, state - dict
+# Returns: none
+# Side Effects: creates/overwrites the rollup files
+def write_rollup(path, state):
+    meta = {'version': ROLLUP_VERSION, 'token': state['token'], 'first_day': state['first_day'],
+            'has_time': state['has_time'], 'int_time': state['int_time']}
+
+    os.makedirs(ROLLUP_DIR, exist_ok=True)
+    save_arrays(get_rows_path(path), token=np.array(state['token']), **state['rows'])
+    save_arrays(path, meta=np.array(json.dumps(meta)), bins=state['bins'], time=state['time'],
+                count=state['count'])
+
+# Function: checks whether a dataframe is the frame loaded from its data file, frames derived from
+#           it (e.g. one person's rows) carry the same source attrs but aren't marked as loaded
+# Inputs: df - dataframe
+# Returns: bool
+# Side Effects: none
+def is_source_frame(df):
+    return data_cache.is_loaded(df, 'source')
+
+# Function: gets the up to date rollup of a data frame. Frames loaded through data_cache carry
+#           the hash of their source file, when it matches the stored rollup the rollup is used
+#           as is, otherwise only the rows that changed since are folded in and the rollup files
+#           are refreshed. Frames without a source file (or derived from the loaded one) get a
+#           rollup built from scratch
+# Inputs: df - dataframe
+# Returns: dict
+# Side Effects: may read/write the rollup files of the source data file
+def get_rollup(df):
+    if not is_source_frame(df):
+        return fold(empty_rollup(), df)
+    source = df.attrs['source']
+
+    path = get_rollup_path(source)
+    token = f"{source['sha256']}|{','.join(map(str, df.columns))}"
+    with rollups_lock:
+        state = rollups.get(path) or read_rollup(path)
+        if state is not None and state['token'] == token:
+            rollups[path] = state
+            return state
+
+        if state is not None and state['rows'] is None:
+            state['rows'] = read_rows(path, state['token'])
+        if state is None or state['rows'] is None:
+            state = empty_rollup()
+
+        with profiler.span('fold_rollup', len(df)):
+            state = fold(state, df)
+        state['token'] = token
+        try:
+            write_rollup(path, state)
+        except OSError:
+            pass  # the rollup is still usable by this process
+        rollups[path] = state
+        return state
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import rollup_store
+
+# the descriptive columns every session is broken down by, in the order of the data files
+BREAKDOWN_COLUMNS = ['Subject', 'Type', 'Activity']
+# name given to sessions that leave a breakdown column empty
+MISSING_NAME = "(none)"
+
+# Function: splits every session into the clock hours it covers, sessions crossing midnight carry
+#           on into the hours of the next day
+# Inputs: day - numpy int64 array (day of every session, counted from the first day of the breakdown),
+#         start - numpy int64 array, end - numpy int64 array (minutes from midnight, see
+#         rollup_store.session_minutes)
+# Returns: tuple of numpy arrays (session of every piece, hour counted from the first day, minutes)
+# Side Effects: none
+def hour_pieces(day, start, end):
+    first_hour = start // 60
+    counts = np.where(end > start, (end - 1) // 60 - first_hour + 1, 0)
+    session = np.repeat(np.arange(len(start)), counts)
+    hour = first_hour[session] + np.arange(len(session)) - np.repeat(np.cumsum(counts) - counts, counts)
+    minutes = np.minimum(end[session], (hour + 1) * 60) - np.maximum(start[session], hour * 60)
+    return session, day[session] * 24 + hour, minutes
+
+# Function: sums the minutes of equal (row, column) cells, the cells are given as parallel arrays
+# Inputs: rows - numpy int64 array, cols - numpy int64 array, minutes - numpy array, width - int (columns per row)
+# Returns: tuple of numpy arrays (rows, cols, minutes) with one entry per distinct cell
+# Side Effects: none
+def sum_cells(rows, cols, minutes, width):
+    codes, keys = pd.factorize(rows * width + cols)
+    return keys // width, keys % width, np.bincount(codes, weights=minutes, minlength=len(keys))
+
+# Function: gets the minutes spent on every value of a breakdown column, by day and by hour, from
+#           the summed cells of the combinations it is part of
+# Inputs: codes - numpy int64 array (value of the column for every combination), names - numpy
+#         array of the column's values (as str), day_cells - tuple (combination, day, minutes arrays),
+#         hour_cells - tuple (combination, hour, minutes arrays), n_days - int
+# Returns: dict with names (list of str), minutes (numpy array) and by_day/by_hour (tuples of
+#          (row, day or hour, minutes) arrays, the row being the value's position in names) keys,
+#          ordered by most minutes first and without values that have none
+# Side Effects: none
+def fold_column(codes, names, day_cells, hour_cells, n_days):
+    hour_combos, hours, hour_minutes = hour_cells
+    minutes = np.bincount(codes[hour_combos], weights=hour_minutes, minlength=len(names))
+    order = np.argsort(-minutes, kind='stable')
+    order = order[minutes[order] > 0]
+    rank = np.empty(len(names), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    day_combos, days, day_minutes = day_cells
+    return {'names': list(names[order]), 'minutes': minutes[order],
+            'by_day': sum_cells(rank[codes[day_combos]], days, day_minutes, n_days),
+            'by_hour': sum_cells(rank[codes[hour_combos]], hours, hour_minutes, 24)}
+
+# Function: gets the minutes of the values with the most time as a dense matrix, the rest of the
+#           values are summed up into a last row named Other
+# Inputs: column - dict (see fold_column), key - str ('by_day' or 'by_hour'), top - int (rows kept),
+#         width - int (days of the breakdown or 24)
+# Returns: tuple (list of str, numpy array of rows x width)
+# Side Effects: none
+def top_rows(column, key, top, width):
+    names = column['names']
+    rows, cols, minutes = column[key]
+    if len(names) > top:
+        names, rows = names[:top - 1] + ['Other'], np.minimum(rows, top - 1)
+    matrix = np.bincount(rows * width + cols, weights=minutes, minlength=len(names) * width)
+    return names, matrix.reshape(len(names), width)
+
+# Function: breaks the minutes worked within the date range down by Subject, Type and Activity, by
+#           day and by hour of the day, for one or more groups (e.g. people) at once. The rows are
+#           only gone over once: every row is given the id of its (group, Subject, Type, Activity)
+#           combination, its minutes are split across the clock hours it covers and summed per
+#           combination and day and per combination and hour. Each column's breakdown is then
+#           folded from those sums, so many distinct values cost no extra passes over the rows and
+#           only the cells that have time are ever stored
+# Inputs: df - dataframe with the rows of the date range and the day before it (for sessions
+#         crossing midnight into the range), start_date - datetime, end_date - datetime, groups -
+#         numpy int64 array or None (group of every row, rows of group -1 are skipped), n_groups - int
+# Returns: list of dicts, one per group, with start_date, end_date, n_days, combos (dataframe of the
+#          Subject, Type, Activity combinations and their Minutes, most minutes first) and one dict
+#          per breakdown column (see fold_column)
+# Side Effects: none
+def build_breakdowns(df, start_date, end_date, groups=None, n_groups=1):
+    first_day = pd.Timestamp(start_date).to_datetime64().astype('datetime64[D]').astype(np.int64) - 1
+    n_days = (end_date - start_date).days + 1
+    groups = np.zeros(len(df), dtype=np.int64) if groups is None else groups
+
+    keep = df['Date'].notna().to_numpy() & df['Start'].notna().to_numpy() & df['End'].notna().to_numpy()
+    keep &= groups >= 0
+    df, groups = df[keep], groups[keep]
+
+    # one id per (group, Subject, Type, Activity) combination found in the rows
+    codes, names = [], []
+    for col in BREAKDOWN_COLUMNS:
+        if col in df:
+            col_codes, col_names = pd.factorize(df[col])
+            col_codes = np.where(col_codes < 0, len(col_names), col_codes)  # empty cells get their own name
+        else:
+            col_codes, col_names = np.zeros(len(df), dtype=np.int64), []
+        codes.append(col_codes.astype(np.int64))
+        names.append(np.array([str(name) for name in col_names] + [MISSING_NAME], dtype=object))
+    key = groups
+    for col_codes, col_names in zip(codes, names):
+        key = key * len(col_names) + col_codes
+    combo, combo_keys = pd.factorize(key)
+
+    # each combination's column values and group, recovered from its key
+    combo_codes = []
+    rest = np.asarray(combo_keys, dtype=np.int64)
+    for col_names in reversed(names):
+        combo_codes.insert(0, rest % len(col_names))
+        rest = rest // len(col_names)
+    combo_groups = rest
+
+    day = df['Date'].to_numpy(dtype='datetime64[D]').astype(np.int64) - first_day
+    start, end = rollup_store.session_minutes(df)
+    session, hour, minutes = hour_pieces(day, start, end)
+    piece_day = hour // 24
+    inside = (piece_day >= 1) & (piece_day <= n_days)  # the day before and the spill past the range are dropped
+    piece_combo, piece_day = combo[session[inside]], piece_day[inside] - 1
+    hour, minutes = hour[inside] % 24, minutes[inside]
+
+    day_cells = sum_cells(piece_combo, piece_day, minutes, n_days)
+    hour_cells = sum_cells(piece_combo, hour, minutes, 24)
+    combo_minutes = np.bincount(hour_cells[0], weights=hour_cells[2], minlength=len(combo_keys))
+
+    # the cells are sorted by group once so every group's cells are a slice
+    day_order, hour_order = (np.argsort(combo_groups[cells[0]], kind='stable') for cells in (day_cells, hour_cells))
+    day_cells = tuple(values[day_order] for values in day_cells)
+    hour_cells = tuple(values[hour_order] for values in hour_cells)
+    day_bounds = np.searchsorted(combo_groups[day_cells[0]], np.arange(n_groups + 1))
+    hour_bounds = np.searchsorted(combo_groups[hour_cells[0]], np.arange(n_groups + 1))
+
+    breakdowns = []
+    for group in range(n_groups):
+        group_days = tuple(values[day_bounds[group]:day_bounds[group + 1]] for values in day_cells)
+        group_hours = tuple(values[hour_bounds[group]:hour_bounds[group + 1]] for values in hour_cells)
+        breakdown = {'start_date': start_date, 'end_date': end_date, 'n_days': n_days}
+        for col, col_codes, col_names in zip(BREAKDOWN_COLUMNS, combo_codes, names):
+            breakdown[col] = fold_column(col_codes, col_names, group_days, group_hours, n_days)
+
+        in_group = np.flatnonzero((combo_groups == group) & (combo_minutes > 0))
+        in_group = in_group[np.argsort(-combo_minutes[in_group], kind='stable')]
+        combos = pd.DataFrame({col: col_names[col_codes[in_group]]
+                               for col, col_codes, col_names in zip(BREAKDOWN_COLUMNS, combo_codes, names)})
+        combos['Minutes'] = combo_minutes[in_group]
+        breakdown['combos'] = combos
+        breakdowns.append(breakdown)
+    return breakdowns
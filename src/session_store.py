@@ -0,0 +1,174 @@
+import os, re, sqlite3, hashlib
+from contextlib import closing
+from datetime import timedelta
+from urllib.parse import parse_qs
+import numpy as np
+import pandas as pd
+import data_cache
+import rollup_store
+
+# data paths starting with this are read from a sqlite database instead of a csv/xlsx file, e.g.
+# sqlite:///C:/data/sessions.db or sqlite:///sessions.db?table=goals for the goal data
+SCHEME = "sqlite:///"
+DEFAULT_TABLE = "sessions"
+# columns of a data file kept by the store, Owner is only needed for team data (see team_report)
+COLUMNS = ['Date', 'Subject', 'Type', 'Activity', 'Start', 'End', 'Time', 'Owner']
+OPTIONAL_COLUMNS = ['Time', 'Owner']
+# goal data gets its Time from the Start/End times (see graph.load_goal_data), this is the same in sql
+SESSION_MINUTES = "(strftime('%s', \"End\") - strftime('%s', \"Start\")) / 60.0"
+
+# Function: checks whether a data path points to a sqlite session store
+# Inputs: path - str
+# Returns: bool
+# Side Effects: none
+def is_store_path(path):
+    return path.startswith(SCHEME)
+
+# Function: splits a sqlite:/// path into the database file and the table holding the sessions
+# Inputs: path - str
+# Returns: tuple of str (database file path, table name)
+# Side Effects: raises ValueError if the table name isn't a plain identifier
+def parse_store_path(path):
+    db_path, _, query = path[len(SCHEME):].partition("?")
+    table = parse_qs(query).get('table', [DEFAULT_TABLE])[0]
+    if not re.fullmatch(r"[A-Za-z_]\w*", table):
+        raise ValueError(f"Invalid table name '{table}' in {path}")
+    return db_path, table
+
+# Function: opens the database of a session store, creating the table and its Date index when
+#           the store is being written to
+# Inputs: path - str (sqlite:/// path), create - bool
+# Returns: tuple (sqlite3.Connection, table name)
+# Side Effects: may create the database file, raises FileNotFoundError when reading a missing database
+def connect(path, create=False):
+    db_path, table = parse_store_path(path)
+    if not create and not os.path.isfile(db_path):
+        raise FileNotFoundError(f"No session store found at {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    if create:
+        with conn:
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+                             id INTEGER PRIMARY KEY, row_key TEXT NOT NULL UNIQUE, "Date" TEXT NOT NULL,
+                             "Subject" TEXT, "Type" TEXT, "Activity" TEXT, "Start" TEXT, "End" TEXT,
+                             "Time" NUMERIC, "Owner" TEXT)""")
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_date ON {table} ("Date")')
+    return conn, table
+
+# Function: converts a parsed data frame (see graph.datetime_preprocessing) into the rows stored in
+#           the database, each row gets a key made from its values and how many identical rows came
+#           before it, so importing the same sessions again doesn't add them twice
+# Inputs: df - dataframe
+# Returns: list of tuples (row_key followed by the COLUMNS values)
+# Side Effects: none
+def to_records(df):
+    df = df[df['Date'].notna()]
+    values = pd.DataFrame({
+        'Date': df['Date'].dt.strftime('%Y-%m-%d'),
+        'Start': df['Start'].dt.strftime('%H:%M:%S'),
+        'End': df['End'].dt.strftime('%H:%M:%S'),
+    })
+    for col in ('Subject', 'Type', 'Activity', 'Owner'):
+        values[col] = df[col].astype(object).where(df[col].notna(), None) if col in df else None
+    values['Time'] = df['Time'].astype(float).where(df['Time'].notna(), None) if 'Time' in df else None
+    values = values[COLUMNS].astype(object).where(values[COLUMNS].notna(), None)
+
+    records = []
+    seen = {}
+    for row in values.itertuples(index=False, name=None):
+        text = repr(row)
+        seen[text] = seen.get(text, 0) + 1
+        key = hashlib.sha1(f"{text}#{seen[text]}".encode("utf-8")).hexdigest()
+        records.append((key,) + row)
+    return records
+
+# Function: imports the sessions of a parsed data frame into a session store, sessions that were
+#           already imported (e.g. from an earlier version of the same file) are skipped
+# Inputs: path - str (sqlite:/// path), df - dataframe
+# Returns: tuple of ints (sessions added, sessions skipped)
+# Side Effects: creates/updates the database
+def import_frame(path, df):
+    records = to_records(df)
+    conn, table = connect(path, create=True)
+    with closing(conn):
+        before = conn.total_changes
+        with conn:
+            columns = ", ".join(f'"{col}"' for col in COLUMNS)
+            conn.executemany(f"INSERT OR IGNORE INTO {table} (row_key, {columns}) VALUES ({', '.join('?' * 9)})",
+                             records)
+        added = conn.total_changes - before
+    return added, len(records) - added
+
+# Function: converts the rows read from the database back into the frame parse_data_file creates
+# Inputs: df - dataframe of stored rows
+# Returns: dataframe sorted by date
+# Side Effects: none
+def from_rows(df):
+    df = df.drop(columns=[col for col in OPTIONAL_COLUMNS if df[col].isna().all()])
+    df['Start'] = pd.to_datetime(df['Start'], format='%H:%M:%S')
+    df['End'] = pd.to_datetime(df['End'], format='%H:%M:%S')
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Day_Name'] = df['Date'].dt.day_name()
+    return df
+
+# Function: reads the sessions of a session store, when a date range is passed the filtering is
+#           done by sql using the Date index so only the rows the report needs are fetched. The
+#           day before start_date is kept as well for sessions crossing midnight into the range
+# Inputs: path - str (sqlite:/// path), start_date - datetime or None, end_date - datetime or None
+# Returns: dataframe
+# Side Effects: reads the database
+def read_sessions(path, start_date=None, end_date=None):
+    columns = ", ".join(f'"{col}"' for col in COLUMNS) + ', id AS "Row"'  # rows are numbered by their id
+    conn, table = connect(path)
+    with closing(conn):
+        if start_date is None:
+            rows = pd.read_sql_query(f'SELECT {columns} FROM {table} ORDER BY "Date", id', conn)
+        else:
+            first_day = (start_date - timedelta(days=1)).strftime('%Y-%m-%d')
+            rows = pd.read_sql_query(f'SELECT {columns} FROM {table} WHERE "Date" BETWEEN ? AND ? ORDER BY "Date", id',
+                                     conn, params=(first_day, end_date.strftime('%Y-%m-%d')))
+
+    df = from_rows(rows)
+    df.attrs['store'] = {'path': path, 'start': None if start_date is None else pd.Timestamp(start_date),
+                         'end': None if end_date is None else pd.Timestamp(end_date)}
+    return data_cache.mark_loaded(df, 'store')
+
+# Function: checks whether a dataframe holds every row read from its session store, the daily totals
+#           summed by sql only match those rows and not the ones of a frame derived from it (which
+#           pandas gives the same store attrs, e.g. one person's rows)
+# Inputs: df - dataframe
+# Returns: bool
+# Side Effects: none
+def is_store_frame(df):
+    return data_cache.is_loaded(df, 'store')
+
+# Function: sums the Time of every day of the date range in sql
+# Inputs: path - str (sqlite:/// path), start_date - datetime, end_date - datetime,
+#         variant - str ('goal' sums the minutes between Start and End instead of the Time column)
+# Returns: dataframe with Date, Time and Count columns, one row per day that has sessions
+# Side Effects: reads the database
+def read_daily_time(path, start_date, end_date, variant=''):
+    time = SESSION_MINUTES if variant == 'goal' else '"Time"'
+    conn, table = connect(path)
+    with closing(conn):
+        return pd.read_sql_query(f'SELECT "Date", TOTAL({time}) AS Time, COUNT(*) AS Count FROM {table} '
+                                 f'WHERE "Date" BETWEEN ? AND ? GROUP BY "Date"', conn,
+                                 params=(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+
+# Function: gets the per day rollup of the rows read from a session store. The hours worked are
+#           binned from the fetched rows while the daily Time totals and row counts are summed by sql
+# Inputs: df - dataframe (rows of read_sessions within the range and the day before it), store - dict
+#         (df.attrs['store'] of the frame read), start_date - datetime, end_date - datetime
+# Returns: dict (see rollup_store)
+# Side Effects: reads the database
+def get_rollup(df, store, start_date, end_date):
+    state = rollup_store.fold(rollup_store.empty_rollup(), df[['Date', 'Start', 'End']])
+
+    totals = read_daily_time(store['path'], start_date - timedelta(days=1), end_date, store.get('variant', ''))
+    days = pd.to_datetime(totals['Date']).to_numpy(dtype='datetime64[D]').astype(np.int64) - state['first_day']
+    inside = (days >= 0) & (days < len(state['count']))  # sessions imported since the rows were read
+    state['time'][days[inside]] = totals['Time'].to_numpy()[inside]
+    state['count'][days[inside]] = totals['Count'].to_numpy()[inside]
+    state['has_time'] = 'Time' in df
+    state['int_time'] = 'Time' in df and pd.api.types.is_integer_dtype(df['Time'])
+    return state
@@ -0,0 +1,88 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import productivity_graphs as graph
+import automated_report as report
+
+# Function: creates the file name of one person's report by putting their name in front of the
+#           naming pattern, characters that aren't safe in a file name are replaced with _
+# Inputs: owner - str, naming_pattern - str
+# Returns: str
+# Side Effects: none
+def owner_naming_pattern(owner, naming_pattern):
+    return re.sub(r'[^\w\-]+', '_', owner).strip('_') + "_" + naming_pattern
+
+# Function: rolls up and breaks down (see graph.get_breakdown) the data of everyone in the date range
+#           in grouped passes over the productivity data (and one over the goal data if it has an
+#           Owner column too, otherwise everyone shares the same goals)
+# Inputs: prod_df - dataframe, goal_df - dataframe, start_date - datetime, end_date - datetime
+# Returns: dict of owner to dict with prod_rollup, goal_rollup and breakdown keys
+# Side Effects: raises KeyError if the productivity data has no Owner column
+def prepare_team(prod_df, goal_df, start_date, end_date):
+    if graph.OWNER_COLUMN not in prod_df:
+        raise KeyError(f"The productivity data has no {graph.OWNER_COLUMN} column")
+
+    owners = graph.get_owners(prod_df, start_date, end_date)
+    prod_rollups = graph.get_owner_rollups(prod_df, owners, start_date, end_date)
+    breakdowns = graph.get_owner_breakdowns(prod_df, owners, start_date, end_date)
+    if graph.OWNER_COLUMN in goal_df:
+        goal_rollups = graph.get_owner_rollups(goal_df, owners, start_date, end_date)
+    else:
+        shared = graph.get_range_rollup(goal_df, start_date, end_date)
+        goal_rollups = {owner: shared for owner in owners}
+
+    return {owner: {'prod_rollup': prod_rollups[owner], 'goal_rollup': goal_rollups[owner],
+                    'breakdown': breakdowns[owner]} for owner in owners}
+
+# Function: renders one person's report from their rollups
+# Inputs: owner - str, rollups - dict (see prepare_team), start_date - datetime.date, end_date - datetime.date,
+#         week_no - str, save_loc - str, naming_pattern - str, renderer - str, use_cache - bool,
+#         period - str (one of report_dates.PERIODS), profile - str (key of graph.OUTPUT_PROFILES),
+#         formats - list of str (see automated_report.render_report)
+# Returns: dict with owner, path and error keys
+# Side Effects: creates pdf file (and the other formats' files) and saves to save location
+def render_owner(owner, rollups, start_date, end_date, week_no, save_loc, naming_pattern, renderer, use_cache,
+                 period='week', profile=graph.DEFAULT_PROFILE, formats=('pdf',)):
+    result = {'owner': owner, 'path': None, 'error': None}
+    try:
+        result['path'] = report.render_report({}, rollups, start_date, end_date, week_no, save_loc,
+                                              owner_naming_pattern(owner, naming_pattern), None, True, None,
+                                              renderer, use_cache=use_cache, owner=owner, period=period,
+                                              profile=profile, formats=formats)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+# Function: loads a data file shared by a team once and generates one report per person named in
+#           its Owner column. Everyone's hour matrices and totals come from a single grouped pass
+#           over the data and the reports are rendered concurrently, their figures sharing the
+#           pipeline's process pool (whose size doesn't depend on max_workers)
+# Inputs: start_date - datetime.date, end_date - datetime.date, week_no - str, save_loc - str,
+#         prod_path - str, goal_path - str, naming_pattern - str, max_workers - int or None
+#         (reports rendered at once), progress - function called with (finished count, total count,
+#         result dict) or None, renderer - str (one of graph.RENDERERS), use_cache - bool,
+#         period - str (one of report_dates.PERIODS, week_no is the period's label for longer reports),
+#         profile - str (key of graph.OUTPUT_PROFILES), formats - list of str (see automated_report.render_report)
+# Returns: list of result dicts (see render_owner) ordered by owner
+# Side Effects: opens data files, creates and saves pdf files, may start worker processes
+def generate_team(start_date, end_date, week_no, save_loc, prod_path, goal_path, naming_pattern,
+                  max_workers=None, progress=None, renderer=graph.DEFAULT_RENDERER, use_cache=True, period='week',
+                  profile=graph.DEFAULT_PROFILE, formats=('pdf',)):
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date, datetime.min.time())
+    prod_df, goal_df = graph.load_data(prod_path, goal_path, start, end)
+    team = prepare_team(prod_df, goal_df, start, end)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(team))) as executor:
+        futures = [executor.submit(render_owner, owner, rollups, start_date, end_date, week_no, save_loc,
+                                   naming_pattern, renderer, use_cache, period, profile, formats)
+                   for owner, rollups in team.items()]
+
+        for future in as_completed(futures):
+            results.append(future.result())
+            if progress:
+                progress(len(results), len(team), results[-1])
+
+    results.sort(key=lambda result: result['owner'])
+    return results
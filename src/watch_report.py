@@ -0,0 +1,206 @@
+import os, csv, time, shutil, hashlib, tempfile, threading
+from datetime import datetime
+import numpy as np
+import productivity_graphs as graph
+import automated_report as report
+import report_dates
+import rollup_store
+import session_store
+
+# how often the data files are checked for changes
+POLL_SECONDS = 1.0
+# how long the data files have to stay unchanged before a report is generated, so a burst of
+# saves only regenerates the report once
+DEBOUNCE_SECONDS = 2.0
+# an xlsx file is a zip archive whose end record is written last and sits within the last
+# 22 + 65535 (longest archive comment) bytes of the file
+XLSX_END_RECORD = b'PK\x05\x06'
+XLSX_TAIL_BYTES = 22 + 65535
+# bytes read from the end of a csv file to find its last row
+CSV_TAIL_BYTES = 64 * 1024
+
+# Function: counts the fields of a csv line
+# Inputs: line - bytes
+# Returns: int
+# Side Effects: none
+def count_fields(line):
+    return len(next(csv.reader([line.decode('utf-8-sig', errors='replace')]), []))
+
+# Function: checks whether the last row of a csv file has as many fields as its header, a file that
+#           is still being written (or was cut off) usually stops part way through a row
+# Inputs: my_file - binary file object, size - int (bytes in the file)
+# Returns: bool
+# Side Effects: moves the file position
+def has_complete_rows(my_file, size):
+    my_file.seek(0)
+    header = my_file.readline()
+    my_file.seek(max(0, size - CSV_TAIL_BYTES))
+    lines = [line for line in my_file.read().splitlines() if line.strip()]
+    return not lines or count_fields(lines[-1]) == count_fields(header)
+
+# Function: gets the size and modification time of a file, which change whenever it is saved.
+#           For a session store it is the database file's, which changes with every import
+# Inputs: path - str
+# Returns: tuple of ints or None if the file does not exist
+# Side Effects: none
+def get_signature(path):
+    if session_store.is_store_path(path):
+        path = session_store.parse_store_path(path)[0]
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+# Function: checks whether a data file looks completely written. Empty files are skipped, an
+#           xlsx file must end with its zip end record, which is still missing while it is saved, and
+#           the last row of a csv file must have as many fields as its header. A csv cut off exactly at
+#           the end of a row can't be told apart from a complete one, for those (and writers pausing
+#           between rows) the watcher relies on the file's size and modification time staying the same
+#           for the debounce time. Imports into a session store are committed in one transaction so
+#           they are always complete
+# Inputs: path - str
+# Returns: bool
+# Side Effects: reads the end of the file
+def is_complete(path):
+    if session_store.is_store_path(path):
+        return True
+    try:
+        with open(path, "rb") as my_file:
+            size = my_file.seek(0, os.SEEK_END)
+            if size == 0:
+                return False
+            if ".csv" in path:
+                return has_complete_rows(my_file, size)
+            if ".xlsx" not in path:
+                return True
+            my_file.seek(max(0, size - XLSX_TAIL_BYTES))
+            return XLSX_END_RECORD in my_file.read()
+    except OSError:
+        return False
+
+# Function: gets the date range and week number (or period label) of the report being watched,
+#           which is the period containing the pinned day or today
+# Inputs: settings - dict, period - str (one of report_dates.PERIODS), day - datetime.date or None
+# Returns: tuple (start date, end date, week_no)
+# Side Effects: none
+def get_watched_range(settings, period, day=None):
+    start_date, end_date = report_dates.calc_period_range(period, day or datetime.now().date())
+    if period == 'week':
+        return start_date, end_date, report_dates.calc_week_num(settings['starting_week'], start_date)
+    return start_date, end_date, report_dates.calc_period_label(period, start_date)
+
+# Function: reloads the data files that changed since they were last loaded, the dataframes of
+#           unchanged files are kept in memory between reports
+# Inputs: state - dict (see watch_reports), prod_path - str, goal_path - str, signatures - dict of path to signature
+# Returns: tuple of dataframes (productivity data, goal data)
+# Side Effects: opens data files, reads/writes the data cache, modifies state
+def load_frames(state, prod_path, goal_path, signatures):
+    for path, load in ((prod_path, graph.datetime_preprocessing), (goal_path, graph.load_goal_data)):
+        signature, df = state['frames'].get(path, (None, None))
+        if df is None or signature != signatures[path]:
+            state['frames'][path] = (signatures[path], load(path))
+    return state['frames'][prod_path][1], state['frames'][goal_path][1]
+
+# Function: hashes the hour matrices and daily totals of the date range, which is everything the
+#           report shows, so edits to other weeks of the data files don't regenerate the report
+# Inputs: prod_rollup - dict, goal_rollup - dict (see rollup_store), start_date - datetime, end_date - datetime
+# Returns: str
+# Side Effects: none
+def range_fingerprint(prod_rollup, goal_rollup, start_date, end_date):
+    sha = hashlib.sha256()
+    for rollup in (prod_rollup, goal_rollup):
+        sha.update(np.ascontiguousarray(rollup_store.hour_bins(rollup, start_date, end_date)).tobytes())
+        for values in rollup_store.daily_totals(rollup, start_date, end_date):
+            sha.update(np.ascontiguousarray(values).tobytes())
+    return sha.hexdigest()
+
+# Function: renders the report into a temporary folder within the save location and moves it into
+#           place in one step, so a pdf viewer never opens a half written report
+# Inputs: initial - dict of pipeline results (see automated_report.render_report), start_date - datetime,
+#         end_date - datetime, week_no - str, save_loc - str, naming_pattern - str, renderer - str,
+#         use_cache - bool, period - str, profile - str (key of graph.OUTPUT_PROFILES)
+# Returns: str - path of the saved pdf file
+# Side Effects: creates pdf file and saves to save location, may start worker processes
+def write_atomic(initial, start_date, end_date, week_no, save_loc, naming_pattern, renderer, use_cache, period,
+                 profile=graph.DEFAULT_PROFILE):
+    tmp_dir = tempfile.mkdtemp(prefix=".report", dir=save_loc)
+    try:
+        tmp_path = report.render_report({}, initial, start_date, end_date, week_no, tmp_dir, naming_pattern, None,
+                                        True, None, renderer, use_cache=use_cache, period=period,
+                                        profile=profile)
+        path = os.path.join(save_loc, os.path.basename(tmp_path))
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return path
+
+# Function: regenerates the watched report if the data within its date range changed since the
+#           report was last generated
+# Inputs: state - dict (see watch_reports), settings - dict, signatures - dict of path to signature,
+#         watched - tuple (see get_watched_range), renderer - str, use_cache - bool, period - str, profile - str
+# Returns: str - path of the saved pdf file, or None if the report was already up to date
+# Side Effects: opens data files, may create pdf file and save to save location, modifies state
+def refresh_report(state, settings, signatures, watched, renderer, use_cache, period,
+                   profile=graph.DEFAULT_PROFILE):
+    start_date, end_date, week_no = watched
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date, datetime.min.time())
+
+    prod_df, goal_df = load_frames(state, settings['prod_path'], settings['goal_path'], signatures)
+    prod_rollup = graph.get_range_rollup(prod_df, start, end)
+    goal_rollup = graph.get_range_rollup(goal_df, start, end)
+    fingerprint = (watched, range_fingerprint(prod_rollup, goal_rollup, start, end))
+    if fingerprint == state['fingerprint']:
+        return None
+
+    initial = {'prod': prod_df, 'goal': goal_df, 'prod_rollup': prod_rollup, 'goal_rollup': goal_rollup}
+    path = write_atomic(initial, start_date, end_date, week_no, settings['save_path'], settings['naming_pattern'],
+                        renderer, use_cache, period, profile)
+    state['fingerprint'] = fingerprint
+    return path
+
+# Function: watches the productivity and goal data files and regenerates the report of the current
+#           week (or month/quarter/year) whenever they change. Saves are debounced, files that are
+#           still being written are skipped until they are complete, and the report is only
+#           regenerated when the data within its date range changed. The loaded data, rollups and
+#           figure rendering processes stay warm between reports
+# Inputs: settings - dict, period - str (one of report_dates.PERIODS), day - datetime.date or None (watches
+#         the period containing this day instead of today's), renderer - str (one of graph.RENDERERS),
+#         use_cache - bool, poll_interval - float (seconds), debounce - float (seconds), progress - function
+#         called with a dict with week_no, path, error and seconds keys after every attempt or None,
+#         stop_event - threading.Event or None (set it to stop watching), profile - str (key of graph.OUTPUT_PROFILES)
+# Returns: none, runs until stop_event is set
+# Side Effects: opens data files, creates and saves pdf files, may start worker processes
+def watch_reports(settings, period='week', day=None, renderer=graph.DEFAULT_RENDERER, use_cache=True,
+                  poll_interval=POLL_SECONDS, debounce=DEBOUNCE_SECONDS, progress=None, stop_event=None,
+                  profile=graph.DEFAULT_PROFILE):
+    stop_event = stop_event or threading.Event()
+    paths = [settings['prod_path'], settings['goal_path']]
+    state = {'frames': {}, 'fingerprint': None}
+
+    pending = {path: get_signature(path) for path in paths}
+    changed_at = time.monotonic() - debounce  # the first report doesn't wait
+    loaded = None  # signatures of the files the last attempt used
+    while not stop_event.is_set():
+        signatures = {path: get_signature(path) for path in paths}
+        if signatures != pending:
+            pending, changed_at = signatures, time.monotonic()
+
+        watched = get_watched_range(settings, period, day)
+        settled = time.monotonic() - changed_at >= debounce and all(is_complete(path) for path in paths)
+        if settled and (signatures != loaded or watched != state.get('watched')):
+            loaded, state['watched'] = signatures, watched
+            result = {'week_no': watched[2], 'path': None, 'error': None}
+            started = time.perf_counter()
+            try:
+                result['path'] = refresh_report(state, settings, signatures, watched, renderer, use_cache, period,
+                                                profile)
+            except Exception as e:  # e.g. a file saved with bad data, retried on its next save
+                state['frames'].clear()
+                result['error'] = str(e)
+            result['seconds'] = time.perf_counter() - started
+            if progress:
+                progress(result)
+
+        stop_event.wait(poll_interval)